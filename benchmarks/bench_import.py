@@ -0,0 +1,49 @@
+"""Measures how long `import clickshot` takes in a fresh interpreter.
+
+The modules that clickshot only imports when they're first used are timed too,
+to show what importing them up front would cost.
+
+    python benchmarks/bench_import.py [--repeat 20]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from typing import List
+
+DEFERRED_MODULES = ["pkg_resources", "asyncio", "numpy", "cv2", "mss"]
+
+
+def time_import(statement: str, repeat: int) -> float:
+    script = (
+        "import time; start = time.perf_counter(); "
+        f"{statement}; print(time.perf_counter() - start)"
+    )
+    timings = [
+        float(subprocess.check_output([sys.executable, "-c", script]))
+        for _ in range(repeat)
+    ]
+    return statistics.median(timings)
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    report("import clickshot", time_import("import clickshot", args.repeat))
+
+    for module in DEFERRED_MODULES:
+        report(f"  deferred {module}", time_import(f"import {module}", args.repeat))
+
+    # Modules share dependencies, so they're timed together for the total
+    all_modules = ", ".join(DEFERRED_MODULES)
+    report("  deferred total", time_import(f"import {all_modules}", args.repeat))
+
+
+def report(name: str, seconds: float) -> None:
+    print(f"{name:<24}{seconds * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,203 @@
+"""Benchmarks the locate hot path on synthetic screens, without a display.
+
+    python benchmarks/bench_locate.py [--quick] [--output results.json]
+        [--compare benchmarks/baseline.json] [--tolerance 0.25]
+
+Covers converting a screen grab, decoding a template, matching a template and
+a full Locater.locate. Results are written as JSON. With --compare, any
+benchmark that's slower than the baseline by more than the tolerance is
+reported and the exit status is 1. Baselines are only meaningful on the machine
+they were recorded on.
+"""
+import argparse
+import json
+from pathlib import Path
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import cv2
+from mss.screenshot import ScreenShot
+import numpy
+
+from clickshot import Config, Rect
+from clickshot.image import Image
+from clickshot.locater import Locater
+from clickshot.screen_grabber import ScreenGrabber
+from clickshot.template_cache import TemplateCache
+
+SCREENS = {
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+    "dual-1080p": (3840, 1080),
+}
+TEMPLATES = {
+    "small": (24, 16),
+    "medium": (64, 48),
+    "large": (160, 120),
+}
+QUICK_SCREENS = ["1080p"]
+QUICK_TEMPLATES = ["medium"]
+
+Results = Dict[str, Dict[str, float]]
+
+
+# Stands in for mss, returning the same BGRA pixels for every grab
+class FakeScreen:
+    def __init__(self, screen: numpy.ndarray) -> None:
+        height, width = screen.shape[:2]
+        bgra = cv2.cvtColor(screen, cv2.COLOR_BGR2BGRA)
+        self.raw = bytearray(bgra.tobytes())
+        self.monitors = [{"left": 0, "top": 0, "width": width, "height": height}]
+
+    def grab(self, monitor: Dict[str, int]) -> ScreenShot:
+        full = self.monitors[0]
+        if monitor == full:
+            return ScreenShot(self.raw, monitor)
+
+        rows = numpy.frombuffer(self.raw, numpy.uint8).reshape(
+            full["height"], full["width"], 4
+        )
+        bottom = monitor["top"] + monitor["height"]
+        right = monitor["left"] + monitor["width"]
+        cropped = rows[monitor["top"]:bottom, monitor["left"]:right]
+        return ScreenShot(bytearray(cropped.tobytes()), monitor)
+
+    def close(self) -> None:
+        pass
+
+
+def make_screen(width: int, height: int) -> numpy.ndarray:
+    # Smooth noise, so that templates have a single clear match at every scale
+    random = numpy.random.RandomState(0)
+    noise = random.randint(0, 256, (height // 8, width // 8, 3)).astype(numpy.uint8)
+    return cv2.resize(noise, (width, height), interpolation=cv2.INTER_LINEAR)
+
+
+def template_rect(screen: numpy.ndarray, size: Tuple[int, int]) -> Rect:
+    height, width = screen.shape[:2]
+    return Rect(left=width * 2 // 3, top=height // 2, width=size[0], height=size[1])
+
+
+def fake_grabber(grabber: ScreenGrabber, screen: numpy.ndarray) -> ScreenGrabber:
+    grabber._get_backend()._screen = FakeScreen(screen)
+    return grabber
+
+
+def measure(method: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    method()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        method()
+        timings.append(time.perf_counter() - start)
+    return {
+        "median_s": statistics.median(timings),
+        "min_s": min(timings),
+        "repeat": repeat,
+    }
+
+
+def run(screens: List[str], templates: List[str], repeat: int) -> Results:
+    results: Results = {}
+
+    def record(name: str, method: Callable[[], Any]) -> None:
+        results[name] = measure(method, repeat)
+        print(f"{name:<40}{results[name]['median_s'] * 1000:10.2f} ms", flush=True)
+
+    with tempfile.TemporaryDirectory() as image_dir:
+        for screen_name in screens:
+            screen = make_screen(*SCREENS[screen_name])
+            grabber = fake_grabber(ScreenGrabber(), screen)
+            record(f"grab/{screen_name}", grabber.grab)
+
+            gray_grabber = fake_grabber(ScreenGrabber(grayscale=True), screen)
+            record(f"grab-gray/{screen_name}", gray_grabber.grab)
+
+            for template_name in templates:
+                rect = template_rect(screen, TEMPLATES[template_name])
+                path = Path(image_dir) / f"{screen_name}-{template_name}.png"
+                template = Image(screen).crop(rect)
+                cv2.imwrite(str(path), template.data)
+                name = f"{screen_name}/{template_name}"
+
+                record(f"load/{name}", lambda: Image.load(path))
+                record(f"match/{name}", lambda: Image(screen).match_template(template))
+                for engine in ["spatial", "fft"]:
+                    record(
+                        f"match-{engine}/{name}",
+                        lambda: Image(screen).match_template(template, engine=engine),
+                    )
+                record(
+                    f"match-pyramid/{name}",
+                    lambda: Image(screen).match_template(template, pyramid_levels=2),
+                )
+
+                # Without hints every attempt searches the whole screen
+                for label, config in [
+                    ("locate", Config(hint_padding_pixels=None)),
+                    ("locate-hint", Config()),
+                ]:
+                    config = config._replace(skip_unchanged_frames=False)
+                    locater = Locater(config, templates=TemplateCache())
+                    fake_grabber(locater._grabber, screen)
+                    record(f"{label}/{name}", lambda: locater.locate(path, None))
+                    locater.close()
+            grabber.close()
+            gray_grabber.close()
+
+    return results
+
+
+# Compares the fastest runs, which are the least affected by other processes
+def compare(results: Results, baseline: Results, tolerance: float) -> List[str]:
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        ratio = result["min_s"] / baseline[name]["min_s"]
+        if ratio > 1 + tolerance:
+            regressions.append(f"{name}: {ratio:.2f}x slower than baseline")
+    return regressions
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="only 1080p, medium")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    parser.add_argument("--compare", type=Path, help="baseline results to compare")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    screens = QUICK_SCREENS if args.quick else list(SCREENS)
+    templates = QUICK_TEMPLATES if args.quick else list(TEMPLATES)
+    results = run(screens, templates, args.repeat)
+
+    if args.output is not None:
+        report = {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": numpy.__version__,
+            "machine": platform.machine(),
+            "results": results,
+        }
+        args.output.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text())["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(regression)
+        if regressions:
+            return 1
+        print(f"No regressions against {args.compare}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,24 +1,67 @@
-import pkg_resources
-
-__version__ = pkg_resources.get_distribution(__package__).version
+import importlib
+import sys
+from typing import Any
 
 from .config import Config
 from .element import ElementConfig
 from .exceptions import ElementNotFoundError
-from .keyboard import Keyboard, Key, KeyCode
-from .mouse import Mouse, Button
 from .region import Region
+from .retry import PollPolicy
 from .types import Rect
 
+# pynput connects to the display when it's imported, so these are only imported
+# when they're first used
+_lazy_attributes = {
+    "Keyboard": ".keyboard",
+    "Key": ".keyboard",
+    "KeyCode": ".keyboard",
+    "Mouse": ".mouse",
+    "Button": ".mouse",
+}
+
+
+def _get_version() -> str:
+    try:
+        from importlib.metadata import version
+    except ImportError:  # Python < 3.8
+        from pkg_resources import get_distribution
+
+        return get_distribution(__name__).version
+
+    return version(__name__)
+
+
+if sys.version_info >= (3, 7):
+
+    def __getattr__(name: str) -> Any:
+        if name == "__version__":
+            value = _get_version()
+        elif name in _lazy_attributes:
+            module = importlib.import_module(_lazy_attributes[name], __name__)
+            value = getattr(module, name)
+        else:
+            raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+        globals()[name] = value
+        return value
+
+
+else:  # Modules can't have __getattr__ before Python 3.7
+    __version__ = _get_version()
+    from .keyboard import Keyboard, Key, KeyCode  # noqa: F401
+    from .mouse import Mouse, Button  # noqa: F401
+
+
 __all__ = [
-    Config,
-    ElementConfig,
-    ElementNotFoundError,
-    Keyboard,
-    Key,
-    KeyCode,
-    Mouse,
-    Button,
-    Region,
-    Rect,
+    "Config",
+    "ElementConfig",
+    "ElementNotFoundError",
+    "Keyboard",
+    "Key",
+    "KeyCode",
+    "Mouse",
+    "Button",
+    "PollPolicy",
+    "Region",
+    "Rect",
 ]
@@ -0,0 +1,151 @@
+import atexit
+import os
+from pathlib import Path
+import queue
+import threading
+from typing import Dict, List, NamedTuple, Optional, Set, Union
+import warnings
+
+from .image import Image
+from .lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+
+# OpenCV's default, which is the fastest level that still compresses
+DEFAULT_PNG_COMPRESSION = 1
+
+
+class UniqueNames:
+    """Hands out paths that aren't taken yet, as name.png, name_2.png, name_3.png
+    and so on.
+
+    Each directory is listed once, when it's first used. After that, paths are
+    reserved in memory without touching the disk, so files created by other
+    processes in the meantime aren't noticed.
+    """
+
+    def __init__(self) -> None:
+        self._taken: Dict[Path, Set[str]] = {}
+        # Next number to try for each path that's already been reserved
+        self._counts: Dict[Path, int] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, path: Union[Path, str]) -> Path:
+        path = Path(path)
+        with self._lock:
+            taken = self._taken.get(path.parent)
+            if taken is None:
+                taken = _list_dir(path.parent)
+                self._taken[path.parent] = taken
+
+            name = path.name
+            count = self._counts.get(path, 2)
+            while name in taken:
+                name = f"{path.stem}_{count}{path.suffix}"
+                count += 1
+
+            taken.add(name)
+            self._counts[path] = count
+            return path.with_name(name)
+
+
+class _Job(NamedTuple):
+    image: Image
+    path: Path
+    params: List[int]
+
+
+class ArtifactWriter:
+    """Writes images on a background thread, so that a failing test doesn't wait
+    for a full screenshot to be encoded.
+
+    The path is reserved straight away, so it can be reported before the image
+    is written. `flush` waits for every queued image to be written.
+    """
+
+    def __init__(self) -> None:
+        self.names = UniqueNames()
+        self.written = 0
+        self._queue: "queue.Queue[Optional[_Job]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def save(
+        self,
+        image: Image,
+        path: Union[Path, str],
+        png_compression: int = DEFAULT_PNG_COMPRESSION,
+    ) -> Path:
+        unique_path = self.names.reserve(path)
+
+        params = []
+        if unique_path.suffix.lower() == ".png":
+            params = [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+
+        # Screen grabs are written into reused buffers, so they're copied before
+        # the next grab can overwrite them
+        copy = Image(image.data.copy())
+        self._queue.put(_Job(copy, unique_path, params))
+        self._start()
+        return unique_path
+
+    def flush(self) -> None:
+        self._queue.join()
+
+    def close(self) -> None:
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="clickshot-artifacts", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+
+            try:
+                _write(job)
+                self.written += 1
+            except Exception as e:
+                warnings.warn(f"Couldn't write {job.path}: {e}")
+            finally:
+                self._queue.task_done()
+
+
+# Path of a failure screenshot of name in directory. The format is a suffix,
+# which the leading dot can be left off.
+def screenshot_path(directory: Union[Path, str], name: str, format: str) -> Path:
+    if format and not format.startswith("."):
+        format = "." + format
+    return (Path(directory) / name).with_suffix(format)
+
+
+def _write(job: _Job) -> None:
+    job.path.parent.mkdir(parents=True, exist_ok=True)
+    if not cv2.imwrite(str(job.path), job.image.data, job.params):
+        raise OSError(f"unsupported format {job.path.suffix!r}")
+
+
+def _list_dir(directory: Path) -> Set[str]:
+    try:
+        with os.scandir(directory) as entries:
+            return {entry.name for entry in entries}
+    except FileNotFoundError:
+        return set()
+
+
+# Shared by every element, and flushed before the interpreter exits
+artifact_writer = ArtifactWriter()
+atexit.register(artifact_writer.flush)
@@ -0,0 +1,148 @@
+import os
+import threading
+from typing import Callable, Dict, List, Optional, TYPE_CHECKING
+
+from .lazy import lazy_import
+from .snapshot import frame_snapshot
+
+if TYPE_CHECKING:
+    from mss.base import ScreenShot
+    from .mouse import Mouse
+
+try:
+    from typing import Protocol
+except ImportError:  # Python < 3.8
+    Protocol = object  # type: ignore
+
+mss = lazy_import("mss")
+
+Monitor = Dict[str, int]
+
+
+# Anything that grabs the screen like mss does. monitors[0] is the whole virtual
+# screen, and grabs are raw BGRA pixels.
+class Screen(Protocol):
+    @property
+    def monitors(self) -> List[Monitor]:
+        ...
+
+    def grab(self, monitor: Monitor) -> "ScreenShot":
+        ...
+
+    def close(self) -> None:
+        ...
+
+
+# Opens the screen for a display, which is None for the default one
+ScreenFactory = Callable[[Optional[str]], Screen]
+
+_backends: Dict[Optional[str], "Backend"] = {}
+_backends_lock = threading.Lock()
+_screen_factory: Optional[ScreenFactory] = None
+
+
+# The screen grabber and mouse controller for a display.
+# Each of them opens its own display connection, so they're shared by every
+# Element on the display and only created when they're first used. Backends are
+# reference counted, and closed once the last user releases them.
+class Backend:
+    def __init__(self, display: Optional[str]) -> None:
+        self.display = display
+        self.references = 0
+        self._screen: Optional[Screen] = None
+        self._mouse: Optional["Mouse"] = None
+        # mss instances can't be used from several threads at once
+        self._lock = threading.RLock()
+
+    @property
+    def mouse(self) -> "Mouse":
+        with self._lock:
+            if self._mouse is None:
+                # pynput connects to the display when it's imported
+                from .mouse import Mouse
+
+                self._mouse = Mouse()
+            return self._mouse
+
+    @property
+    def monitors(self) -> List[Monitor]:
+        with self._lock:
+            return self._get_screen().monitors
+
+    def grab(self, monitor: Monitor) -> "ScreenShot":
+        with self._lock:
+            return self._get_screen().grab(monitor)
+
+    def close(self) -> None:
+        with self._lock:
+            self.close_screen()
+            self._mouse = None
+
+    # The screen is opened again when it's next used
+    def close_screen(self) -> None:
+        with self._lock:
+            if self._screen is not None:
+                self._screen.close()
+            self._screen = None
+
+    def _get_screen(self) -> Screen:
+        if self._screen is None:
+            if _screen_factory is not None:
+                self._screen = _screen_factory(self.display)
+            else:
+                self._screen = open_mss(self.display)
+        return self._screen
+
+
+def open_mss(display: Optional[str]) -> Screen:
+    if display is None:
+        return mss.mss()
+    return mss.mss(display=display)
+
+
+def acquire(display: Optional[str] = None) -> Backend:
+    if display is None:
+        display = os.environ.get("DISPLAY")
+
+    with _backends_lock:
+        backend = _backends.get(display)
+        if backend is None:
+            backend = Backend(display)
+            _backends[display] = backend
+        backend.references += 1
+        return backend
+
+
+def release(backend: Backend) -> None:
+    with _backends_lock:
+        backend.references -= 1
+        if backend.references > 0:
+            return
+
+        if _backends.get(backend.display) is backend:
+            del _backends[backend.display]
+    backend.close()
+
+
+# Grabs the screen with factory from now on, instead of mss, for instance to
+# record or replay the screen (see `clickshot.recording`). None goes back to mss.
+# Screens that are already open are closed, and opened again with the factory.
+def use_screen(factory: Optional[ScreenFactory]) -> None:
+    global _screen_factory
+
+    with _backends_lock:
+        _screen_factory = factory
+        backends = list(_backends.values())
+
+    for backend in backends:
+        backend.close_screen()
+    frame_snapshot.invalidate()
+
+
+def close_all() -> None:
+    with _backends_lock:
+        backends = list(_backends.values())
+        _backends.clear()
+
+    for backend in backends:
+        backend.close()
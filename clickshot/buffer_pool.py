@@ -0,0 +1,76 @@
+from collections import OrderedDict
+import threading
+from typing import Any, NamedTuple, Tuple, TYPE_CHECKING
+import weakref
+
+from .lazy import lazy_import
+
+if TYPE_CHECKING:
+    import numpy
+else:
+    numpy = lazy_import("numpy")
+
+DEFAULT_MAX_BUFFERS = 16
+
+Shape = Tuple[int, ...]
+
+_pools: "weakref.WeakSet[BufferPool]" = weakref.WeakSet()
+
+
+class PoolStats(NamedTuple):
+    buffers: int
+    allocations: int
+    current_bytes: int
+
+
+class BufferPool:
+    """Reusable output arrays, keyed by shape and dtype.
+
+    A buffer returned by `get` is handed out again by the next `get` for the same
+    shape and dtype, so callers must be done with it by then. Only the most
+    recently used `max_buffers` shapes are kept.
+    """
+
+    def __init__(self, max_buffers: int = DEFAULT_MAX_BUFFERS) -> None:
+        self.max_buffers = max_buffers
+        self.allocations = 0
+        self.current_bytes = 0
+        self._buffers: "OrderedDict[Tuple[Shape, str], numpy.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        _pools.add(self)
+
+    def get(self, shape: Shape, dtype: Any = "uint8") -> "numpy.ndarray":
+        key = (tuple(shape), numpy.dtype(dtype).str)
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is not None:
+                self._buffers.move_to_end(key)
+                return buffer
+
+            buffer = numpy.empty(shape, dtype)
+            self._buffers[key] = buffer
+            self.allocations += 1
+            self.current_bytes += buffer.nbytes
+
+            while len(self._buffers) > self.max_buffers:
+                _, evicted = self._buffers.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+
+            return buffer
+
+    def stats(self) -> PoolStats:
+        return PoolStats(
+            buffers=len(self._buffers),
+            allocations=self.allocations,
+            current_bytes=self.current_bytes,
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buffers.clear()
+            self.current_bytes = 0
+
+
+# Bytes held by every pool that's still alive, to check memory use is steady
+def total_bytes() -> int:
+    return sum(pool.current_bytes for pool in list(_pools))
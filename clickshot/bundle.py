@@ -0,0 +1,216 @@
+"""Packs a directory of template images into a single pre-decoded bundle.
+
+    python -m clickshot.bundle IMAGE_DIR [IMAGE_DIR ...]
+
+writes IMAGE_DIR/templates.bundle, which TemplateCache then prefers to decoding
+the PNGs. Run it again whenever the templates change; templates that no longer
+match their PNG are decoded from the PNG instead.
+"""
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+import struct
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING, Union
+
+from .fft import squared_norm
+from .image import Image
+from .lazy import lazy_import
+
+if TYPE_CHECKING:
+    import numpy
+else:
+    numpy = lazy_import("numpy")
+
+BUNDLE_NAME = "templates.bundle"
+
+# Number of pyramid levels to calculate in advance, if the templates are big enough
+DEFAULT_PYRAMID_LEVELS = 3
+
+# The file starts with MAGIC and the length of the JSON header, followed by the
+# header itself. Arrays follow, each aligned to ALIGNMENT bytes. Array offsets in
+# the header are relative to the first aligned byte after the header.
+MAGIC = b"CLKBNDL1"
+ALIGNMENT = 64
+_PREFIX = struct.Struct("<8sQ")
+
+_bundles: Dict[Path, "TemplateBundle"] = {}
+_bundles_lock = threading.Lock()
+
+
+class TemplateBundle:
+    """Pre-decoded templates, memory-mapped from a bundle file.
+
+    Every process that maps the same bundle shares its pages. Each template is
+    stored in colour and grayscale, with any pyramid levels and the sum of its
+    squared pixel values.
+    """
+
+    def __init__(self, path: Union[Path, str]) -> None:
+        self.path = Path(path)
+        stat = os.stat(self.path)
+        self.signature = (stat.st_mtime_ns, stat.st_size)
+
+        with open(self.path, "rb") as f:
+            magic, header_size = _PREFIX.unpack(f.read(_PREFIX.size))
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} is not a template bundle")
+            header = json.loads(f.read(header_size).decode("utf-8"))
+
+        self._data_start = _align(_PREFIX.size + header_size)
+        self._templates: Dict[str, Dict[str, Any]] = header["templates"]
+        self._data = numpy.memmap(self.path, dtype=numpy.uint8, mode="r")
+
+        # PNG signatures that have been checked against the bundle, by name
+        self._verified: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._templates
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    # Returns the named template, or None if it isn't in the bundle or the PNG at
+    # source has changed since the bundle was compiled
+    def get(
+        self, name: str, grayscale: bool = False, source: Optional[Path] = None
+    ) -> Optional[Image]:
+        entry = self._templates.get(name)
+        if entry is None:
+            return None
+        if source is not None and not self._is_current(name, entry, source):
+            return None
+
+        kind = "gray" if grayscale else "colour"
+        levels = entry[kind]
+        image = Image(self._array(levels["1"]))
+        image.norm = entry["norms"][kind]
+        for scale, array in levels.items():
+            if scale != "1":
+                image.pyramid[int(scale)] = Image(self._array(array))
+        return image
+
+    def _is_current(self, name: str, entry: Dict[str, Any], source: Path) -> bool:
+        try:
+            stat = os.stat(source)
+        except FileNotFoundError:
+            # Bundles can be shipped without the PNGs
+            return True
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            if self._verified.get(name) == signature:
+                return True
+
+        if stat.st_size != entry["size"] or _hash_file(source) != entry["sha1"]:
+            return False
+
+        with self._lock:
+            self._verified[name] = signature
+        return True
+
+    def _array(self, array: Dict[str, Any]) -> "numpy.ndarray":
+        dtype = numpy.dtype(array["dtype"])
+        shape = tuple(array["shape"])
+        start = self._data_start + array["offset"]
+        end = start + dtype.itemsize * int(numpy.prod(shape))
+        return self._data[start:end].view(dtype).reshape(shape)
+
+
+# Returns the bundle in directory, or None if there isn't one. Bundles are
+# opened once, and again if the file changes.
+def find_bundle(directory: Union[Path, str]) -> Optional[TemplateBundle]:
+    path = Path(directory) / BUNDLE_NAME
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    with _bundles_lock:
+        bundle = _bundles.get(path)
+        if bundle is None or bundle.signature != signature:
+            bundle = TemplateBundle(path)
+            _bundles[path] = bundle
+        return bundle
+
+
+def compile_bundle(
+    image_dir: Union[Path, str], pyramid_levels: int = DEFAULT_PYRAMID_LEVELS
+) -> Path:
+    image_dir = Path(image_dir)
+    templates: Dict[str, Dict[str, Any]] = {}
+    arrays: List["numpy.ndarray"] = []
+    offset = 0
+
+    def add(data: "numpy.ndarray") -> Dict[str, Any]:
+        nonlocal offset
+        data = numpy.ascontiguousarray(data)
+        array = {"offset": offset, "shape": list(data.shape), "dtype": data.dtype.str}
+        arrays.append(data)
+        offset = _align(offset + data.nbytes)
+        return array
+
+    for png in sorted(image_dir.glob("*.png")):
+        colour = Image.load(png)
+        gray = colour.to_grayscale()
+        scale = colour.max_pyramid_scale(pyramid_levels)
+
+        entry: Dict[str, Any] = {
+            "size": png.stat().st_size,
+            "sha1": _hash_file(png),
+            "norms": {
+                "colour": squared_norm(colour.data),
+                "gray": squared_norm(gray.data),
+            },
+        }
+        for kind, image in [("colour", colour), ("gray", gray)]:
+            levels = {"1": add(image.data)}
+            for level in range(1, scale.bit_length()):
+                levels[str(2 ** level)] = add(image._downscale(2 ** level).data)
+            entry[kind] = levels
+        templates[png.name] = entry
+
+    header = json.dumps({"version": 1, "templates": templates}).encode("utf-8")
+
+    # Written alongside and then renamed, so readers never see a partial bundle
+    path = image_dir / BUNDLE_NAME
+    partial_path = path.with_name(path.name + ".partial")
+    with open(partial_path, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, len(header)))
+        f.write(header)
+        for data in arrays:
+            f.write(b"\0" * (_align(f.tell()) - f.tell()))
+            f.write(data.tobytes())
+
+    os.replace(partial_path, path)
+    return path
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _hash_file(path: Path) -> str:
+    return hashlib.sha1(Path(path).read_bytes()).hexdigest()
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m clickshot.bundle", description=__doc__.splitlines()[0]
+    )
+    parser.add_argument("image_dirs", nargs="+", metavar="IMAGE_DIR")
+    parser.add_argument("--pyramid-levels", type=int, default=DEFAULT_PYRAMID_LEVELS)
+    args = parser.parse_args(argv)
+
+    for image_dir in args.image_dirs:
+        path = compile_bundle(image_dir, args.pyramid_levels)
+        print(f"{path}: {len(TemplateBundle(path))} templates")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
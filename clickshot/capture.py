@@ -0,0 +1,159 @@
+from collections import deque
+import os
+import threading
+import time
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from .image import Image
+from .screen_grabber import ScreenGrabber
+
+Monitor = Dict[str, int]
+
+DEFAULT_BUFFER_FRAMES = 8
+
+_services: Dict[Tuple[Optional[str], float, int], "CaptureService"] = {}
+_services_lock = threading.Lock()
+
+
+class Frame(NamedTuple):
+    # time.monotonic() when the grab started
+    timestamp: float
+    image: Image
+    monitor: Monitor
+
+
+class CaptureService:
+    """Grabs the whole screen at a fixed rate on a background thread.
+
+    The most recent `buffer_frames` frames are kept, so that callers can check
+    for something that appeared briefly between their own polls. The thread is
+    started when frames are first asked for.
+    """
+
+    def __init__(
+        self,
+        fps: float,
+        buffer_frames: int = DEFAULT_BUFFER_FRAMES,
+        display: Optional[str] = None,
+    ) -> None:
+        self.fps = fps
+        self.grabs = 0
+        self.references = 0
+        self._key: Tuple[Optional[str], float, int] = (display, fps, buffer_frames)
+        self._frames: Deque[Frame] = deque(maxlen=buffer_frames)
+        self._error: Optional[Exception] = None
+        self._grabber = ScreenGrabber(display=display)
+        self._condition = threading.Condition()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        with self._condition:
+            if self._thread is not None:
+                return
+
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="clickshot-capture", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._condition:
+            thread = self._thread
+            self._thread = None
+        if thread is None:
+            return
+
+        self._stopping.set()
+        thread.join()
+        with self._condition:
+            self._frames.clear()
+
+    def close(self) -> None:
+        self.stop()
+        self._grabber.close()
+
+    # Returns the newest frame, waiting up to timeout_seconds for the first one.
+    # Re-raises the error if the last grab failed.
+    def latest(self, timeout_seconds: Optional[float] = None) -> Optional[Frame]:
+        if timeout_seconds is None:
+            timeout_seconds = max(1.0, 2 / self.fps)
+
+        self.start()
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._frames or self._error is not None, timeout_seconds
+            )
+            if self._error is not None:
+                raise self._error
+            return self._frames[-1] if self._frames else None
+
+    # Returns the buffered frames grabbed after timestamp, oldest first
+    def frames_since(self, timestamp: float) -> List[Frame]:
+        self.start()
+        with self._condition:
+            return [frame for frame in self._frames if frame.timestamp > timestamp]
+
+    def _run(self) -> None:
+        interval = 1 / self.fps
+        while not self._stopping.is_set():
+            started = time.monotonic()
+            try:
+                image, monitor = self._grabber.grab_frame()
+            except Exception as e:
+                with self._condition:
+                    self._error = e
+                    self._condition.notify_all()
+            else:
+                with self._condition:
+                    self._error = None
+                    self._frames.append(Frame(started, image, monitor))
+                    self.grabs += 1
+                    self._condition.notify_all()
+
+            self._stopping.wait(max(interval - (time.monotonic() - started), 0))
+
+
+# Services are shared by every Locater with the same settings on a display,
+# and stopped once the last one releases them
+def acquire(
+    fps: float,
+    buffer_frames: int = DEFAULT_BUFFER_FRAMES,
+    display: Optional[str] = None,
+) -> CaptureService:
+    if display is None:
+        display = os.environ.get("DISPLAY")
+
+    key = (display, fps, buffer_frames)
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = CaptureService(fps, buffer_frames, display)
+            _services[key] = service
+        service.references += 1
+        return service
+
+
+def release(service: CaptureService) -> None:
+    with _services_lock:
+        service.references -= 1
+        if service.references > 0:
+            return
+
+        if _services.get(service._key) is service:
+            del _services[service._key]
+    service.close()
+
+
+def close_all() -> None:
+    with _services_lock:
+        services = list(_services.values())
+        _services.clear()
+
+    for service in services:
+        service.close()
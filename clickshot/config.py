@@ -1,4 +1,8 @@
-from typing import NamedTuple
+from typing import NamedTuple, Optional
+
+from .artifacts import DEFAULT_PNG_COMPRESSION
+from .fft import MAX_CACHED_BYTES
+from .retry import PollPolicy
 
 
 class Config(NamedTuple):
@@ -6,4 +10,61 @@ class Config(NamedTuple):
     screenshot_dir: str = ""
 
     # Default time to wait for an element to become visible
-    timeout_seconds: int = 30
+    timeout_seconds: float = 30
+
+    # How often to check for an element while waiting for it
+    poll_policy: PollPolicy = PollPolicy()
+
+    # How long a screen grab can be shared between elements before it's refreshed.
+    # Mouse and keyboard actions also refresh it. Zero disables sharing.
+    frame_ttl_seconds: float = 0.0
+
+    # Grab the screen continuously on a background thread at this rate, and keep
+    # the last capture_buffer_frames frames. Waits then also check the frames
+    # grabbed since they started, to catch elements that are only briefly
+    # visible. Zero grabs the screen on demand instead.
+    capture_fps: float = 0.0
+    capture_buffer_frames: int = 8
+
+    # Number of times to halve the screenshot and template to find candidate
+    # locations before matching at full resolution. Speeds up matching on large
+    # screens. Zero always matches at full resolution.
+    match_pyramid_levels: int = 0
+
+    # Elements are first searched for within this many pixels of where they were
+    # last found, before searching the whole region. None always searches the
+    # whole region.
+    hint_padding_pixels: Optional[int] = 32
+
+    # Skip matching a template again if the screen hasn't changed since it was
+    # last not found
+    skip_unchanged_frames: bool = True
+
+    # Number of threads to split each full-resolution template match across
+    match_workers: int = 1
+
+    # Match grayscale copies of the screenshot and templates, which is faster.
+    # With verify_colour, the best grayscale match is then checked in colour.
+    grayscale: bool = False
+    verify_colour: bool = True
+
+    # Screenshots of failures are written in the background in this format, with
+    # or without the leading dot. PNG compression ranges from 0, the fastest, to
+    # 9, the smallest.
+    screenshot_format: str = ".png"
+    screenshot_png_compression: int = DEFAULT_PNG_COMPRESSION
+
+    # How templates are matched: "spatial" uses OpenCV's matchTemplate, "fft"
+    # multiplies cached template spectra, and "auto" picks FFTs for templates
+    # that are big enough to benefit
+    match_engine: str = "auto"
+
+    # SQLite database to remember where elements were found across runs, so the
+    # first search in a new process can start near the last location. An empty
+    # path disables it.
+    location_cache_path: str = ""
+
+    # Memory for the template spectra that FFT matches reuse, shared by every
+    # element with the same limit. A colour template searched for across a full
+    # HD screen takes 25 MB. Zero caches nothing.
+    spectrum_cache_bytes: int = MAX_CACHED_BYTES
@@ -1,22 +1,39 @@
+import contextlib
+import functools
 from pathlib import Path
 import time
-from typing import NamedTuple, Optional, Tuple, TYPE_CHECKING
+from typing import Iterator, List, NamedTuple, Optional, Tuple, TYPE_CHECKING
 import warnings
 
+from . import backend as backends
+from .artifacts import artifact_writer, screenshot_path
+from .backend import Backend
 from .exceptions import ElementNotFoundError
-from .locater import Locater
-from .mouse import Mouse, Button
-from .retry import retry_with_timeout, RetryAbort
+from .lazy import lazy_import
+from .locater import HintStats, Locater
+from .metrics import metrics
+from .retry import (
+    retry_with_timeout,
+    retry_with_timeout_async,
+    RetryAbort,
+    RetryStats,
+)
 from .types import Rect
 
 if TYPE_CHECKING:
+    from .mouse import Button, Mouse
     from .region import Region
 
+asyncio = lazy_import("asyncio")
+
 
 class ElementConfig(NamedTuple):
     name: str
     click_offset: Optional[Tuple[int, int]] = None
 
+    # Overrides Config.grayscale for this element
+    grayscale: Optional[bool] = None
+
 
 class Element:
     def __init__(self, element_config: ElementConfig, region: "Region") -> None:
@@ -34,17 +51,39 @@ class Element:
         else:
             self.click_offset = element_config.click_offset
 
-        self._locater = Locater()
-        self._mouse = Mouse()
+        self.last_retry_stats: Optional[RetryStats] = None
+
+        locater_config = self.config
+        if element_config.grayscale is not None:
+            locater_config = self.config._replace(grayscale=element_config.grayscale)
+        self._locater = Locater(locater_config)
+        # The mouse and screen are shared, and connected to when first used
+        self._backend: Optional[Backend] = backends.acquire()
+
+    @property
+    def _mouse(self) -> "Mouse":
+        if self._backend is None:
+            raise RuntimeError(f"{self} is closed")
+        return self._backend.mouse
+
+    def close(self) -> None:
+        if self._backend is not None:
+            self._locater.close()
+            backends.release(self._backend)
+            self._backend = None
+
+    @property
+    def hint_stats(self) -> HintStats:
+        return self._locater.hint_stats
 
     def __str__(self) -> str:
         return f"<Element name='{self.name}'>"
 
     def click(
         self,
-        button: Button = Button.left,
+        button: Optional["Button"] = None,
         count: int = 1,
-        timeout_seconds: Optional[int] = None,
+        timeout_seconds: Optional[float] = None,
     ) -> None:
         if timeout_seconds is None:
             timeout_seconds = self.config.timeout_seconds
@@ -57,61 +96,185 @@ class Element:
             self.save_last_screenshot()
             raise
 
-        self._mouse.position = (x + self.click_offset[0], y + self.click_offset[1])
-        time.sleep(0.01)
-        self._mouse.click(button=button, count=count)
+        self._click_at(x, y, button, count)
         print("Done")
 
-    def is_visible(self, timeout_seconds: int = 0) -> bool:
+    def is_visible(self, timeout_seconds: float = 0) -> bool:
         try:
-            self._locate_centre_with_retry(timeout_seconds)
+            self._locate_centre_with_retry(timeout_seconds, since=time.monotonic())
             return True
         except ElementNotFoundError:
             return False
 
-    def wait_until_visible(self, timeout_seconds: Optional[int] = None,) -> None:
+    # Every place the element is visible, in reading order, for lists, grids and
+    # repeated icons. Waits up to timeout_seconds for at least one to appear.
+    def locate_all(self, timeout_seconds: float = 0) -> List[Rect]:
+        self._move_away_from_failsafe()
+
+        try:
+            return retry_with_timeout(
+                self._locate_occurrences,
+                timeout_seconds,
+                policy=self.config.poll_policy,
+            )
+        except ElementNotFoundError:
+            return []
+
+    def wait_until_visible(self, timeout_seconds: Optional[float] = None,) -> None:
         if timeout_seconds is None:
             timeout_seconds = self.config.timeout_seconds
 
         print(f"Waiting for {self.full_name}: ", end="", flush=True)
 
         try:
-            self._locate_centre_with_retry(timeout_seconds)
+            self._locate_centre_with_retry(timeout_seconds, since=time.monotonic())
         except Exception:
             self.save_last_screenshot()
             raise
 
         print("Done")
 
-    def _locate_centre_with_retry(self, timeout_seconds: int) -> Tuple[int, int]:
+    # The async methods don't print progress, since concurrent waits would garble
+    # the output. Grabs and matches run in the default executor, and concurrent
+    # waits share screen grabs.
+    async def click_async(
+        self,
+        button: Optional["Button"] = None,
+        count: int = 1,
+        timeout_seconds: Optional[float] = None,
+    ) -> None:
+        if timeout_seconds is None:
+            timeout_seconds = self.config.timeout_seconds
+
+        loop = asyncio.get_event_loop()
+        try:
+            x, y = await self._locate_centre_with_retry_async(timeout_seconds)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await loop.run_in_executor(None, self.save_last_screenshot)
+            raise
+
+        await loop.run_in_executor(None, self._click_at, x, y, button, count)
+
+    async def is_visible_async(self, timeout_seconds: float = 0) -> bool:
+        try:
+            await self._locate_centre_with_retry_async(
+                timeout_seconds, since=time.monotonic()
+            )
+            return True
+        except ElementNotFoundError:
+            return False
+
+    async def wait_until_visible_async(
+        self, timeout_seconds: Optional[float] = None
+    ) -> None:
+        if timeout_seconds is None:
+            timeout_seconds = self.config.timeout_seconds
+
+        try:
+            await self._locate_centre_with_retry_async(
+                timeout_seconds, since=time.monotonic()
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self.save_last_screenshot)
+            raise
+
+    def _click_at(
+        self, x: int, y: int, button: Optional["Button"], count: int
+    ) -> None:
+        if button is None:
+            from .mouse import Button
+
+            button = Button.left
+
+        with metrics.timer("mouse_seconds"):
+            self._mouse.position = (x + self.click_offset[0], y + self.click_offset[1])
+            time.sleep(0.01)
+            self._mouse.click(button=button, count=count)
+
+    def _move_away_from_failsafe(self) -> None:
         # Ensure the mouse isn't in the abort position
         if self._mouse.position == (0, 0):
             self._mouse.position = (10, 10)
 
-        rect = retry_with_timeout(self._locate, timeout_seconds, log=True)
+    # Waits pass since, so that with background capture they also find elements
+    # that were only visible between attempts. Clicks only use the latest frame,
+    # since the element needs to still be there.
+    def _locate_centre_with_retry(
+        self, timeout_seconds: float, since: Optional[float] = None
+    ) -> Tuple[int, int]:
+        self._move_away_from_failsafe()
+
+        self.last_retry_stats = RetryStats()
+        with _measure_wait(self.last_retry_stats):
+            rect = retry_with_timeout(
+                functools.partial(self._locate, since=since),
+                timeout_seconds,
+                log=True,
+                policy=self.config.poll_policy,
+                stats=self.last_retry_stats,
+            )
+        return self._find_centre(rect)
+
+    async def _locate_centre_with_retry_async(
+        self, timeout_seconds: float, since: Optional[float] = None
+    ) -> Tuple[int, int]:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._move_away_from_failsafe)
+
+        self.last_retry_stats = RetryStats()
+        with _measure_wait(self.last_retry_stats):
+            rect = await retry_with_timeout_async(
+                functools.partial(self._locate, shared_frame=True, since=since),
+                timeout_seconds,
+                policy=self.config.poll_policy,
+                stats=self.last_retry_stats,
+            )
         return self._find_centre(rect)
 
-    def _locate(self) -> Rect:
+    def _locate(
+        self, shared_frame: bool = False, since: Optional[float] = None
+    ) -> Rect:
+        try:
+            return self._locater.locate(
+                self.image_path, self.boundary, shared_frame=shared_frame, since=since
+            )
+        except Exception as e:
+            self._abort_if_failsafe(e)
+            raise e
+
+    def _locate_occurrences(self) -> List[Rect]:
         try:
-            return self._locater.locate(self.image_path, self.boundary)
+            rects = self._locater.locate_occurrences(self.image_path, self.boundary)
+            if not rects:
+                raise ElementNotFoundError
+            return rects
         except Exception as e:
-            # Abort if mouse pointer gets moved to (0, 0)
-            if self._mouse.position == (0, 0):
-                warnings.warn("Aborted - mouse pointer moved to (0, 0)")
-                raise RetryAbort(e)
-            else:
-                raise e
+            self._abort_if_failsafe(e)
+            raise e
+
+    # Abort if mouse pointer gets moved to (0, 0)
+    def _abort_if_failsafe(self, exception: Exception) -> None:
+        if self._mouse.position == (0, 0):
+            warnings.warn("Aborted - mouse pointer moved to (0, 0)")
+            raise RetryAbort(exception)
 
     def save_last_screenshot(self) -> None:
         screenshot = self._locater.last_screenshot
         if screenshot is None:
             return
 
-        screenshot_path = (
-            Path(self.config.screenshot_dir) / self.full_name
-        ).with_suffix(".png")
+        path = screenshot_path(
+            self.config.screenshot_dir, self.full_name, self.config.screenshot_format
+        )
 
-        unique_screenshot_path = screenshot.save(screenshot_path)
+        unique_screenshot_path = artifact_writer.save(
+            screenshot, path, self.config.screenshot_png_compression
+        )
 
         print(f"Expected Image: {self.image_path}")
         print(f"Screenshot: {unique_screenshot_path}")
@@ -119,3 +282,20 @@ class Element:
     @staticmethod
     def _find_centre(rect: Rect) -> Tuple[int, int]:
         return (rect.left + rect.width // 2, rect.top + rect.height // 2)
+
+
+# Records the attempts made by a wait, and how long it took if the element was
+# found
+@contextlib.contextmanager
+def _measure_wait(stats: RetryStats) -> Iterator[None]:
+    start = time.monotonic()
+    try:
+        yield
+    except ElementNotFoundError:
+        metrics.increment("waits_timed_out_total")
+        raise
+    else:
+        metrics.observe("time_to_found_seconds", time.monotonic() - start)
+    finally:
+        metrics.increment("waits_total")
+        metrics.observe("wait_attempts", stats.attempts)
@@ -0,0 +1,264 @@
+"""Normalised squared difference template matching, computed with FFTs.
+
+The squared difference between a template T and the window of the image I at
+each location expands to sum(T²) - 2·sum(T·I) + sum(I²). The cross-correlation
+sum(T·I) is calculated for every location at once by multiplying spectra, and
+sum(I²) comes from a box filter. The template's spectrum and sum(T²) only depend
+on the template and the image size, so they're calculated once and cached. The
+image's spectrum is kept for matching the next template against it, leaving one
+inverse transform per match.
+"""
+from collections import OrderedDict
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, TYPE_CHECKING
+import weakref
+
+from .lazy import lazy_import
+
+if TYPE_CHECKING:
+    import numpy
+else:
+    numpy = lazy_import("numpy")
+cv2 = lazy_import("cv2")
+
+# Spectra take as much memory as a float32 copy of the padded image per channel:
+# 25 MB for a full HD colour screen and 100 MB for a 4K one. This fits about ten
+# templates searched for across a full HD screen, and many more in smaller
+# regions.
+MAX_CACHED_BYTES = 256 << 20
+
+_CacheKey = Tuple[int, int, int, int]
+# Weak reference to an image, with the size and spectra of its channels
+_ImageEntry = Tuple[Any, Tuple[int, int], List["numpy.ndarray"]]
+
+_caches: Dict[int, "SpectrumCache"] = {}
+_caches_lock = threading.Lock()
+
+
+class Spectrum(NamedTuple):
+    # Padded size of the transforms, which fits the whole image
+    dft_shape: Tuple[int, int]
+    template_shape: Tuple[int, int]
+    # One spectrum per channel, in OpenCV's packed format
+    channels: List["numpy.ndarray"]
+    # Sum of the template's squared pixel values
+    norm: float
+
+    @property
+    def nbytes(self) -> int:
+        return _nbytes(self.channels)
+
+
+class SpectrumCache:
+    """Template spectra, with the least recently used dropped beyond
+    `max_bytes`.
+
+    The spectra of the last image searched are kept too, within the same limit,
+    so that matching several templates against the same image only transforms
+    it once.
+    """
+
+    def __init__(self, max_bytes: int = MAX_CACHED_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._spectra: "OrderedDict[_CacheKey, Tuple[Any, Spectrum]]" = OrderedDict()
+        self._image: Optional[_ImageEntry] = None
+        self._lock = threading.Lock()
+
+    # Returns the spectrum of template for images of image_shape. Templates are
+    # held weakly, and identified by their id, so an entry is only reused while
+    # the same template is still alive.
+    def get(
+        self,
+        template: Any,
+        data: "numpy.ndarray",
+        image_shape: Tuple[int, ...],
+        norm: Optional[float] = None,
+    ) -> Spectrum:
+        # Images with the same padded size share spectra
+        key = (id(template), *dft_shape(image_shape), _channels(data))
+        with self._lock:
+            entry = self._spectra.get(key)
+            if entry is not None and entry[0]() is template:
+                self._spectra.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        spectrum = template_spectrum(data, image_shape, norm)
+        with self._lock:
+            self.misses += 1
+            self._store(key, (weakref.ref(template), spectrum))
+        return spectrum
+
+    # Returns the spectra of the channels of image, padded to the spectrum's size
+    def image_spectra(
+        self, image: Any, data: "numpy.ndarray", spectrum: Spectrum
+    ) -> List["numpy.ndarray"]:
+        with self._lock:
+            entry = self._image
+            if (
+                entry is not None
+                and entry[0]() is image
+                and entry[1] == spectrum.dft_shape
+            ):
+                return entry[2]
+
+        channels = channel_spectra(data, spectrum.dft_shape)
+        with self._lock:
+            if self._image is not None:
+                self.nbytes -= _nbytes(self._image[2])
+                self._image = None
+            nbytes = _nbytes(channels)
+            if nbytes <= self.max_bytes:
+                self._image = (weakref.ref(image), spectrum.dft_shape, channels)
+                self.nbytes += nbytes
+                self._drop_spectra()
+        return channels
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spectra.clear()
+            self._image = None
+            self.nbytes = 0
+
+    def _store(self, key: _CacheKey, entry: Tuple[Any, Spectrum]) -> None:
+        replaced = self._spectra.pop(key, None)
+        if replaced is not None:
+            self.nbytes -= replaced[1].nbytes
+
+        nbytes = entry[1].nbytes
+        if nbytes > self.max_bytes:
+            return
+        self._spectra[key] = entry
+        self.nbytes += nbytes
+        self._drop_spectra()
+
+    # Drops the least recently used template spectra until the limit is met
+    def _drop_spectra(self) -> None:
+        while self.nbytes > self.max_bytes and self._spectra:
+            _, dropped = self._spectra.popitem(last=False)
+            self.nbytes -= dropped[1].nbytes
+
+
+# Returns the cache with a limit of max_bytes, shared by every Locater that uses
+# the same limit
+def shared_cache(max_bytes: int) -> SpectrumCache:
+    with _caches_lock:
+        cache = _caches.get(max_bytes)
+        if cache is None:
+            cache = SpectrumCache(max_bytes)
+            _caches[max_bytes] = cache
+        return cache
+
+
+def template_spectrum(
+    data: "numpy.ndarray", image_shape: Tuple[int, ...], norm: Optional[float] = None
+) -> Spectrum:
+    if norm is None:
+        norm = squared_norm(data)
+    shape = dft_shape(image_shape)
+    return Spectrum(shape, data.shape[:2], channel_spectra(data, shape), norm)
+
+
+# Transforms each channel of data, padded with zeros to shape
+def channel_spectra(
+    data: "numpy.ndarray", shape: Tuple[int, int]
+) -> List["numpy.ndarray"]:
+    height, width = data.shape[:2]
+    padded = numpy.zeros(shape, numpy.float32)
+    channels = []
+    for channel in _split(data):
+        padded[:height, :width] = channel
+        channels.append(cv2.dft(padded))
+    return channels
+
+
+# Size of the transforms for images of image_shape, which is at least as big and
+# quick to transform
+def dft_shape(image_shape: Tuple[int, ...]) -> Tuple[int, int]:
+    return (
+        cv2.getOptimalDFTSize(image_shape[0]),
+        cv2.getOptimalDFTSize(image_shape[1]),
+    )
+
+
+def squared_norm(data: "numpy.ndarray") -> float:
+    values = data.astype(numpy.float64)
+    return float(numpy.sum(values * values))
+
+
+# Matches like cv2.matchTemplate with TM_SQDIFF_NORMED, including scoring
+# windows with no contrast as 1. The spectra of data's channels are calculated
+# unless they're given.
+def match(
+    data: "numpy.ndarray",
+    spectrum: Spectrum,
+    image_channels: Optional[List["numpy.ndarray"]] = None,
+) -> "numpy.ndarray":
+    height, width = data.shape[:2]
+    template_height, template_width = spectrum.template_shape
+    rows = height - template_height + 1
+    columns = width - template_width + 1
+
+    if image_channels is None:
+        image_channels = channel_spectra(data, spectrum.dft_shape)
+    correlation = None
+    for channel, template_channel in zip(image_channels, spectrum.channels):
+        product = cv2.mulSpectrums(channel, template_channel, 0, conjB=True)
+        if correlation is None:
+            correlation = product
+        else:
+            cv2.add(correlation, product, dst=correlation)
+
+    cross = cv2.idft(correlation, flags=cv2.DFT_REAL_OUTPUT | cv2.DFT_SCALE)
+    result = cross[:rows, :columns]
+
+    # Sum of the image's squared values in the window at each location. Colour
+    # images are filtered as one wide channel, so the channels are summed too.
+    channels = _channels(data)
+    values = numpy.ascontiguousarray(data).reshape(height, width * channels)
+    window = (template_width * channels, template_height)
+    # OpenCV sums 8-bit squares in 32-bit integers, which overflow for big windows
+    if values.dtype != numpy.uint8 or window[0] * window[1] * 255 ** 2 >= 2 ** 31:
+        values = values.astype(numpy.float32)
+    window_norms = cv2.sqrBoxFilter(
+        values,
+        cv2.CV_32F,
+        window,
+        anchor=(0, 0),
+        normalize=False,
+        borderType=cv2.BORDER_CONSTANT,
+    )[:rows, 0:columns * channels:channels]
+
+    # Calculated in place, since each temporary map costs as much as a step
+    result *= -2
+    result += spectrum.norm
+    result += window_norms
+    window_norms *= spectrum.norm
+    numpy.sqrt(window_norms, out=window_norms)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        result /= window_norms
+    # Dividing by zero gives inf or nan, which fmin turns into 1. Rounding errors
+    # leave exact matches slightly below 0.
+    numpy.fmin(result, 1, out=result)
+    return numpy.maximum(result, 0, out=result)
+
+
+def _nbytes(channels: List["numpy.ndarray"]) -> int:
+    return sum(channel.nbytes for channel in channels)
+
+
+def _channels(data: "numpy.ndarray") -> int:
+    return 1 if data.ndim == 2 else data.shape[2]
+
+
+def _split(data: "numpy.ndarray") -> List["numpy.ndarray"]:
+    if data.ndim == 2:
+        return [data]
+    return cv2.split(data)
+
+
+# Shared by every template, unless a Locater is configured with another limit
+spectrum_cache = shared_cache(MAX_CACHED_BYTES)
@@ -1,19 +1,64 @@
 from pathlib import Path
-from typing import Union
-
-import cv2
-import numpy
+import threading
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING, Union
 
+from . import fft
+from .buffer_pool import BufferPool
 from .exceptions import ElementNotFoundError
+from .lazy import lazy_import
+from .metrics import metrics
 from .types import Rect
 
+if TYPE_CHECKING:
+    from concurrent.futures import ThreadPoolExecutor
+    import numpy
+else:
+    numpy = lazy_import("numpy")
+cv2 = lazy_import("cv2")
+futures = lazy_import("concurrent.futures")
+
+# Smallest template dimension worth matching at a reduced pyramid level
+MIN_PYRAMID_TEMPLATE_SIZE = 8
+
+# Number of best coarse matches that are checked at full resolution
+PYRAMID_CANDIDATES = 8
+
+# Fewest rows of match results worth calculating on a separate thread
+MIN_BAND_ROWS = 16
+
+# With the "auto" engine, templates with at least this many pixels are matched
+# with FFTs, by number of channels. Measured with benchmarks/bench_locate.py:
+# OpenCV matches colour templates much more slowly than grayscale ones, so FFTs
+# win for colour at almost any size, but only for bigger grayscale templates.
+FFT_MIN_TEMPLATE_AREA = {1: 64 * 48, 3: 8 * 8}
+
+# Fewest match locations worth using FFTs for, since each new image size means
+# calculating the template's spectrum again
+FFT_MIN_RESULT_AREA = 32 * 32
+
+MATCH_ENGINES = ("auto", "spatial", "fft")
+
+Match = Tuple[float, Tuple[int, int]]
+
+_executors: Dict[int, "ThreadPoolExecutor"] = {}
+_executors_lock = threading.Lock()
+
+# Match result maps are reused per thread, since bands are matched concurrently
+_result_pools = threading.local()
+
 
 class Image:
-    def __init__(self, data: numpy.array) -> None:
+    def __init__(self, data: "numpy.ndarray") -> None:
         self.data = data
         self.height = data.shape[0]
         self.width = data.shape[1]
 
+        # Downscaled copies by scale, if they've been calculated in advance
+        self.pyramid: Dict[int, Image] = {}
+
+        # Sum of the squared pixel values, if it's been calculated in advance
+        self.norm: Optional[float] = None
+
     @classmethod
     def load(cls, path: Union[Path, str]) -> "Image":
         Path(path).resolve(strict=True)
@@ -28,16 +73,208 @@ class Image:
 
         return unique_path
 
-    def match_template(self, template: "Image", threshold: float = 0.001) -> Rect:
-        result = cv2.matchTemplate(self.data, template.data, cv2.TM_SQDIFF_NORMED)
-        minVal, _, minLoc, _ = cv2.minMaxLoc(result)
+    def to_grayscale(self) -> "Image":
+        return Image(cv2.cvtColor(self.data, cv2.COLOR_BGR2GRAY))
+
+    def crop(self, rect: Rect) -> "Image":
+        bottom = rect.top + rect.height
+        right = rect.left + rect.width
+        return Image(self.data[rect.top:bottom, rect.left:right])
+
+    def match_template(
+        self,
+        template: "Image",
+        threshold: float = 0.001,
+        pyramid_levels: int = 0,
+        workers: int = 1,
+        engine: str = "auto",
+        spectra: Optional[fft.SpectrumCache] = None,
+    ) -> Rect:
+        match = None
+        if pyramid_levels > 0:
+            match = self._match_coarse_to_fine(
+                template, pyramid_levels, engine, spectra
+            )
 
+        # Fall back to a full search if the coarse search didn't find anything
+        if match is None or match[0] > threshold:
+            match = self._match(template, workers, engine, spectra)
+
+        minVal, minLoc = match
+        metrics.observe("match_score", minVal)
         if minVal > threshold:
             raise ElementNotFoundError
         return Rect(
             left=minLoc[0], top=minLoc[1], width=template.width, height=template.height,
         )
 
+    # Finds every location that matches the template, in reading order. Matches
+    # that overlap a better match are left out.
+    def match_template_all(
+        self,
+        template: "Image",
+        threshold: float = 0.001,
+        engine: str = "auto",
+        spectra: Optional[fft.SpectrumCache] = None,
+    ) -> List[Rect]:
+        if template.width > self.width or template.height > self.height:
+            return []
+
+        result = self._match_result(template, engine, spectra)
+        metrics.observe("match_score", cv2.minMaxLoc(result)[0])
+
+        # A match has to be the best score within a template's width and height
+        # in every direction, so no two matches can overlap, unless they tie
+        kernel = numpy.ones(
+            (2 * template.height - 1, 2 * template.width - 1), numpy.uint8
+        )
+        best = cv2.erode(result, kernel)
+        tops, lefts = numpy.nonzero((result <= threshold) & (result == best))
+
+        # Of tied matches that overlap, only the first in reading order is kept
+        if len(tops) > 1:
+            order = numpy.full(result.shape, numpy.inf, numpy.float32)
+            order[tops, lefts] = numpy.arange(len(tops))
+            first = cv2.erode(order, kernel)
+            kept = first[tops, lefts] == order[tops, lefts]
+            tops, lefts = tops[kept], lefts[kept]
+
+        return [
+            Rect(left=left, top=top, width=template.width, height=template.height)
+            for top, left in zip(tops.tolist(), lefts.tolist())
+        ]
+
+    def _match(
+        self,
+        template: "Image",
+        workers: int = 1,
+        engine: str = "auto",
+        spectra: Optional[fft.SpectrumCache] = None,
+    ) -> Match:
+        bands = min(workers, (self.height - template.height + 1) // MIN_BAND_ROWS)
+        if bands > 1:
+            return self._match_bands(template, bands, engine, spectra)
+
+        result = self._match_result(template, engine, spectra)
+        minVal, _, minLoc, _ = cv2.minMaxLoc(result)
+        return minVal, minLoc
+
+    # The squared difference at each location. Spatial matches write into a
+    # buffer that's reused by the next match of the same size on this thread.
+    # FFT matches use the shared spectrum cache unless they're given another.
+    def _match_result(
+        self,
+        template: "Image",
+        engine: str = "auto",
+        spectra: Optional[fft.SpectrumCache] = None,
+    ) -> "numpy.ndarray":
+        shape = (self.height - template.height + 1, self.width - template.width + 1)
+        if min(shape) > 0 and _use_fft(template, shape, engine):
+            if spectra is None:
+                spectra = fft.spectrum_cache
+            spectrum = spectra.get(
+                template, template.data, self.data.shape, template.norm
+            )
+            channels = spectra.image_spectra(self, self.data, spectrum)
+            return fft.match(self.data, spectrum, channels)
+
+        pooled = None
+        if min(shape) > 0:
+            pooled = _get_result_pool().get(shape, numpy.float32)
+
+        return cv2.matchTemplate(
+            self.data, template.data, cv2.TM_SQDIFF_NORMED, result=pooled
+        )
+
+    # Splits the search into horizontal bands and matches them in parallel.
+    # OpenCV releases the GIL, so the bands run on separate cores. Neighbouring
+    # bands overlap by the template height less one, so each location is matched
+    # exactly once.
+    def _match_bands(
+        self,
+        template: "Image",
+        bands: int,
+        engine: str,
+        spectra: Optional[fft.SpectrumCache],
+    ) -> Match:
+        rows = self.height - template.height + 1
+        bounds = numpy.linspace(0, rows, bands + 1).astype(int)
+
+        def match_band(band: int) -> Match:
+            top, bottom = int(bounds[band]), int(bounds[band + 1])
+            band_bottom = bottom + template.height - 1
+            band_image = Image(self.data[top:band_bottom])
+            minVal, minLoc = band_image._match(
+                template, engine=engine, spectra=spectra
+            )
+            return minVal, (minLoc[0], minLoc[1] + top)
+
+        matches = list(_get_executor(bands).map(match_band, range(bands)))
+
+        # Bands are in row order, so ties go to the first location like minMaxLoc
+        return min(matches, key=lambda match: match[0])
+
+    # Finds candidate locations in downscaled copies of the images, then matches
+    # at full resolution in a small window around each of them.
+    def _match_coarse_to_fine(
+        self,
+        template: "Image",
+        levels: int,
+        engine: str = "auto",
+        spectra: Optional[fft.SpectrumCache] = None,
+    ) -> Optional[Match]:
+        scale = template.max_pyramid_scale(levels)
+        if scale == 1:
+            return None
+
+        # Not pooled, since the windows below may reuse a buffer of the same shape
+        result = cv2.matchTemplate(
+            self._downscale(scale).data,
+            template._downscale(scale).data,
+            cv2.TM_SQDIFF_NORMED,
+        )
+        scores = result.ravel()
+        count = min(PYRAMID_CANDIDATES, scores.size)
+        candidates = numpy.argpartition(scores, count - 1)[:count]
+
+        best: Optional[Match] = None
+        for index in candidates[numpy.argsort(scores[candidates])]:
+            y, x = divmod(int(index), result.shape[1])
+            left = max(x * scale - scale, 0)
+            top = max(y * scale - scale, 0)
+            window = Rect(
+                left=left,
+                top=top,
+                width=min(x * scale + scale + template.width, self.width) - left,
+                height=min(y * scale + scale + template.height, self.height) - top,
+            )
+            if window.width < template.width or window.height < template.height:
+                continue
+
+            minVal, minLoc = self.crop(window)._match(
+                template, engine=engine, spectra=spectra
+            )
+            if best is None or minVal < best[0]:
+                best = (minVal, (window.left + minLoc[0], window.top + minLoc[1]))
+
+        return best
+
+    # Largest power of two, up to 2 ** levels, that leaves a template big enough
+    # to match at a reduced pyramid level
+    def max_pyramid_scale(self, levels: int) -> int:
+        scale = 2 ** levels
+        size = min(self.width, self.height)
+        while scale > 1 and size < scale * MIN_PYRAMID_TEMPLATE_SIZE:
+            scale //= 2
+        return scale
+
+    def _downscale(self, scale: int) -> "Image":
+        if scale in self.pyramid:
+            return self.pyramid[scale]
+
+        size = (self.width // scale, self.height // scale)
+        return Image(cv2.resize(self.data, size, interpolation=cv2.INTER_AREA))
+
     @staticmethod
     def _find_unique_path(path: Path) -> Path:
         if not path.exists():
@@ -52,3 +289,35 @@ class Image:
             if not unique_path.exists():
                 return unique_path
             count += 1
+
+
+def _use_fft(template: Image, result_shape: Tuple[int, int], engine: str) -> bool:
+    if engine not in MATCH_ENGINES:
+        raise ValueError(f"Unknown match engine {engine!r}")
+    if engine != "auto":
+        return engine == "fft"
+
+    channels = 1 if template.data.ndim == 2 else template.data.shape[2]
+    min_area = FFT_MIN_TEMPLATE_AREA.get(channels)
+    return (
+        min_area is not None
+        and template.width * template.height >= min_area
+        and result_shape[0] * result_shape[1] >= FFT_MIN_RESULT_AREA
+    )
+
+
+def _get_executor(workers: int) -> "ThreadPoolExecutor":
+    with _executors_lock:
+        if workers not in _executors:
+            _executors[workers] = futures.ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="clickshot-match"
+            )
+        return _executors[workers]
+
+
+def _get_result_pool() -> BufferPool:
+    pool = getattr(_result_pools, "pool", None)
+    if pool is None:
+        pool = BufferPool()
+        _result_pools.pool = pool
+    return pool
@@ -1,4 +1,21 @@
-from pynput.keyboard import Controller as Keyboard
+from typing import Union
+
+from pynput.keyboard import Controller
 from pynput.keyboard import Key, KeyCode
 
+from .snapshot import frame_snapshot
+
+
+# Typing is likely to change the screen, so the shared screen snapshot is
+# invalidated after every key event.
+class Keyboard(Controller):
+    def press(self, key: Union[Key, KeyCode, str]) -> None:
+        super().press(key)
+        frame_snapshot.invalidate()
+
+    def release(self, key: Union[Key, KeyCode, str]) -> None:
+        super().release(key)
+        frame_snapshot.invalidate()
+
+
 __all__ = [Keyboard, Key, KeyCode]
@@ -0,0 +1,27 @@
+import importlib
+from types import ModuleType
+from typing import Any, Optional
+
+
+# Stands in for a module that's slow to import, and imports it when one of its
+# attributes is first used. Patching attributes of the stand-in only affects the
+# module that uses it.
+class LazyModule:
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._module: Optional[ModuleType] = None
+
+    def __getattr__(self, name: str) -> Any:
+        module = self._module
+        if module is None:
+            # The import lock makes this safe to race between threads
+            module = importlib.import_module(self._name)
+            self._module = module
+        return getattr(module, name)
+
+    def __repr__(self) -> str:
+        return f"<LazyModule {self._name!r}>"
+
+
+def lazy_import(name: str) -> Any:
+    return LazyModule(name)
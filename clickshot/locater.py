@@ -1,19 +1,350 @@
 from pathlib import Path
-from typing import Optional, Union
+from typing import Dict, Iterable, List, Optional, Set, Tuple, TYPE_CHECKING, Union
+import zlib
 
+from . import capture as captures
+from . import fft
+from .capture import CaptureService
+from .config import Config
+from .exceptions import ElementNotFoundError
 from .image import Image
+from .lazy import lazy_import
+from .metrics import metrics
 from .screen_grabber import ScreenGrabber
+from .snapshot import frame_snapshot
+from .template_cache import template_cache, TemplateCache
 from .types import Rect
 
+if TYPE_CHECKING:
+    import numpy
 
-class Locater:
+    from . import location_cache
+    from .location_cache import LocationCache
+else:
+    numpy = lazy_import("numpy")
+    # Only used if the location cache is enabled, and imports sqlite3
+    location_cache = lazy_import("clickshot.location_cache")
+
+
+# Boundary, shape and checksum of a frame
+_FrameDigest = Tuple[Optional[Rect], Tuple[int, ...], int]
+
+
+class HintStats:
     def __init__(self) -> None:
+        # Number of matches found near the last known location
+        self.hits = 0
+        # Number of times the last known location had to be abandoned
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        attempts = self.hits + self.misses
+        return self.hits / attempts if attempts else 0.0
+
+    def __repr__(self) -> str:
+        return f"<HintStats hits={self.hits} misses={self.misses}>"
+
+
+class Locater:
+    def __init__(
+        self, config: Optional[Config] = None, templates: Optional[TemplateCache] = None
+    ) -> None:
+        if config is None:
+            config = Config()
+
         self.last_screenshot: Optional[Image] = None
-        self._grabber = ScreenGrabber()
+        self._config = config
+        self._hints: Dict[str, Rect] = {}
+        self.hint_stats = HintStats()
+
+        # Locations stored by earlier runs, which are looked up once per template
+        # and screen geometry, and updated whenever an element moves
+        self._locations: Optional["LocationCache"] = None
+        if config.location_cache_path:
+            self._locations = location_cache.open_cache(config.location_cache_path)
+        self._geometry: Optional[str] = None
+        self._looked_up: Set[Tuple[str, str]] = set()
+
+        # Templates that weren't found in the last frame, which don't need to be
+        # matched again until the screen changes. Every element has a Locater of
+        # its own, so only a checksum of the last frame is kept.
+        self._last_frame: Optional[_FrameDigest] = None
+        self._failures: Dict[str, Image] = {}
+        self.skipped_matches = 0
+
+        # Grayscale matches are checked against the colour screenshot, unless
+        # verify_colour is off, in which case the screen is grabbed in grayscale
+        self._grabber = ScreenGrabber(
+            frame_ttl_seconds=config.frame_ttl_seconds,
+            grayscale=config.grayscale and not config.verify_colour,
+        )
+
+        if templates is None:
+            templates = template_cache
+        self._templates = templates
+        self._spectra = fft.shared_cache(config.spectrum_cache_bytes)
+
+        # Frames from the background capture thread, if enabled. Frames up to
+        # _checked_until have already been searched by the current wait.
+        self._capture: Optional[CaptureService] = None
+        if config.capture_fps > 0:
+            self._capture = captures.acquire(
+                config.capture_fps, config.capture_buffer_frames
+            )
+        self._checked_since: Optional[float] = None
+        self._checked_until = 0.0
+
+    def close(self) -> None:
+        self._grabber.close()
+        if self._capture is not None:
+            captures.release(self._capture)
+            self._capture = None
+
+    def locate(
+        self,
+        image_path: Union[Path, str],
+        boundary: Optional[Rect],
+        shared_frame: bool = False,
+        since: Optional[float] = None,
+    ) -> Rect:
+        # With background capture, every frame grabbed since the wait started is
+        # searched, newest first
+        if self._capture is not None and since is not None:
+            return self._locate_since(self._capture, image_path, boundary, since)
+
+        screenshot = self._grab(boundary, shared_frame)
+        return self._match(screenshot, self._search_image(screenshot), image_path)
+
+    def locate_all(
+        self, image_paths: Iterable[Union[Path, str]], boundary: Optional[Rect]
+    ) -> Dict[Union[Path, str], Rect]:
+        screenshot = self._grab(boundary, shared_frame=False)
+        search_image = self._search_image(screenshot)
+
+        found = {}
+        for image_path in image_paths:
+            try:
+                found[image_path] = self._match(screenshot, search_image, image_path)
+            except ElementNotFoundError:
+                pass
+
+        return found
+
+    # Every location of the template in one grab, in reading order
+    def locate_occurrences(
+        self, image_path: Union[Path, str], boundary: Optional[Rect]
+    ) -> List[Rect]:
+        screenshot = self._grab(boundary, shared_frame=False)
+        search_image = self._search_image(screenshot)
+
+        with metrics.timer("template_load_seconds"):
+            template = self._templates.load(
+                image_path, grayscale=self._config.grayscale
+            )
+        with metrics.timer("match_seconds"):
+            rects = search_image.match_template_all(
+                template, engine=self._config.match_engine, spectra=self._spectra
+            )
+
+        if self._config.grayscale and self._config.verify_colour:
+            rects = [
+                rect
+                for rect in rects
+                if self._is_colour_match(screenshot, rect, image_path)
+            ]
 
-    def locate(self, image_path: Union[Path, str], boundary: Optional[Rect]) -> Rect:
-        screenshot = self._grabber.grab(boundary)
+        return rects
+
+    def _locate_since(
+        self,
+        capture: CaptureService,
+        image_path: Union[Path, str],
+        boundary: Optional[Rect],
+        since: float,
+    ) -> Rect:
+        # Later attempts of the same wait only need to search newer frames
+        if since != self._checked_since:
+            self._checked_since = since
+            self._checked_until = since
+
+        frames = capture.frames_since(self._checked_until)
+        if not frames:
+            return self.locate(image_path, boundary)
+        self._checked_until = frames[-1].timestamp
+
+        for frame in reversed(frames):
+            with metrics.timer("grab_seconds"):
+                screenshot = self._grabber.crop_frame(
+                    frame.image, frame.monitor, boundary
+                )
+            screenshot = self._use_screenshot(screenshot, boundary)
+            try:
+                return self._match(
+                    screenshot, self._search_image(screenshot), image_path
+                )
+            except ElementNotFoundError:
+                pass
+
+        raise ElementNotFoundError
+
+    def _grab(self, boundary: Optional[Rect], shared_frame: bool) -> Image:
+        with metrics.timer("grab_seconds"):
+            frame = self._capture.latest() if self._capture is not None else None
+            # Frames captured before the last mouse or keyboard action may not
+            # show its effect yet, so the screen is grabbed instead
+            if frame is not None and frame.timestamp <= frame_snapshot.invalidated_at:
+                frame = None
+            if frame is not None:
+                screenshot = self._grabber.crop_frame(
+                    frame.image, frame.monitor, boundary
+                )
+            elif shared_frame:
+                screenshot = self._grabber.grab_shared(boundary)
+            else:
+                screenshot = self._grabber.grab(boundary)
+        return self._use_screenshot(screenshot, boundary)
+
+    def _use_screenshot(self, screenshot: Image, boundary: Optional[Rect]) -> Image:
         self.last_screenshot = screenshot
+        if self._locations is not None:
+            self._geometry = location_cache.geometry(
+                boundary, screenshot.width, screenshot.height
+            )
+
+        if self._config.skip_unchanged_frames:
+            digest = (boundary, screenshot.data.shape, _checksum(screenshot.data))
+            if digest != self._last_frame:
+                self._failures.clear()
+                self._last_frame = digest
+
+        return screenshot
+
+    def _search_image(self, screenshot: Image) -> Image:
+        if self._config.grayscale and screenshot.data.ndim == 3:
+            return screenshot.to_grayscale()
+        return screenshot
+
+    def _match(
+        self, screenshot: Image, search_image: Image, image_path: Union[Path, str]
+    ) -> Rect:
+        with metrics.timer("template_load_seconds"):
+            template = self._templates.load(
+                image_path, grayscale=self._config.grayscale
+            )
+
+        # Don't bother matching again if nothing has changed since the last failure
+        if self._failures.get(str(image_path)) is template:
+            self.skipped_matches += 1
+            raise ElementNotFoundError
+
+        try:
+            rect = self._match_with_hint(search_image, template, image_path)
+            if self._config.grayscale and self._config.verify_colour:
+                self._verify_colour(screenshot, rect, image_path)
+            return rect
+        except ElementNotFoundError:
+            if self._config.skip_unchanged_frames:
+                self._failures[str(image_path)] = template
+            raise
+
+    def _match_with_hint(
+        self, screenshot: Image, template: Image, image_path: Union[Path, str]
+    ) -> Rect:
+        # Search around where the template was last found first, since
+        # elements usually stay in the same place
+        hint = self._hints.get(str(image_path))
+        if hint is None:
+            hint = self._stored_location(image_path)
+        if hint is not None and self._config.hint_padding_pixels is not None:
+            window = _pad(hint, self._config.hint_padding_pixels, screenshot)
+            if window.width >= template.width and window.height >= template.height:
+                try:
+                    rect = self._match_template(screenshot.crop(window), template)
+                except ElementNotFoundError:
+                    self.hint_stats.misses += 1
+                else:
+                    self.hint_stats.hits += 1
+                    rect = rect._replace(
+                        left=rect.left + window.left, top=rect.top + window.top
+                    )
+                    self._remember_location(image_path, rect)
+                    return rect
+
+        rect = self._match_template(screenshot, template)
+        self._remember_location(image_path, rect)
+        return rect
+
+    def _stored_location(self, image_path: Union[Path, str]) -> Optional[Rect]:
+        if self._locations is None or self._geometry is None:
+            return None
+        key = (str(image_path), self._geometry)
+        if key in self._looked_up:
+            return None
+        self._looked_up.add(key)
+
+        # Templates are named after their element
+        rect = self._locations.get(Path(image_path).stem, Path(image_path), key[1])
+        if rect is not None:
+            self._hints[str(image_path)] = rect
+        return rect
+
+    def _remember_location(self, image_path: Union[Path, str], rect: Rect) -> None:
+        if (
+            self._locations is not None
+            and self._geometry is not None
+            and self._hints.get(str(image_path)) != rect
+        ):
+            self._locations.put(
+                Path(image_path).stem, Path(image_path), self._geometry, rect
+            )
+        self._hints[str(image_path)] = rect
+
+    # Checks the winning grayscale match in colour, to rule out false positives
+    def _verify_colour(
+        self, screenshot: Image, rect: Rect, image_path: Union[Path, str]
+    ) -> None:
+        with metrics.timer("template_load_seconds"):
+            template = self._templates.load(image_path)
+        with metrics.timer("match_seconds"):
+            screenshot.crop(rect).match_template(template)
+
+    def _is_colour_match(
+        self, screenshot: Image, rect: Rect, image_path: Union[Path, str]
+    ) -> bool:
+        try:
+            self._verify_colour(screenshot, rect, image_path)
+            return True
+        except ElementNotFoundError:
+            return False
+
+    def _match_template(self, screenshot: Image, template: Image) -> Rect:
+        with metrics.timer("match_seconds"):
+            return screenshot.match_template(
+                template,
+                pyramid_levels=self._config.match_pyramid_levels,
+                workers=self._config.match_workers,
+                engine=self._config.match_engine,
+                spectra=self._spectra,
+            )
+
+
+# CRC-32 of the pixels, which takes about as long as comparing them with a copy
+# of the last frame
+def _checksum(data: "numpy.ndarray") -> int:
+    if data.flags.c_contiguous:
+        return zlib.crc32(data.data)
+
+    # Crops of a shared frame are only contiguous a row at a time
+    checksum = 0
+    for row in data:
+        checksum = zlib.crc32(numpy.ascontiguousarray(row).data, checksum)
+    return checksum
+
 
-        template = Image.load(image_path)
-        return screenshot.match_template(template)
+def _pad(rect: Rect, padding: int, image: Image) -> Rect:
+    left = max(rect.left - padding, 0)
+    top = max(rect.top - padding, 0)
+    right = min(rect.left + rect.width + padding, image.width)
+    bottom = min(rect.top + rect.height + padding, image.height)
+    return Rect(left=left, top=top, width=right - left, height=bottom - top)
@@ -0,0 +1,199 @@
+"""Remembers where elements were found, across runs.
+
+Locations are stored in an SQLite database, keyed by the element's name, a
+hash of its template and the geometry of the screenshot it was found in. A new
+process can then search near the stored location first, on its very first
+lookup. Editing a template changes its hash, so locations found with the old
+template are no longer used.
+"""
+import hashlib
+import os
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple, Union
+import warnings
+
+from .types import Rect
+
+# Least recently stored locations are dropped beyond this
+DEFAULT_MAX_ENTRIES = 10000
+
+# How long to wait for another process to finish writing
+BUSY_TIMEOUT_SECONDS = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS locations (
+    name TEXT NOT NULL,
+    template_hash TEXT NOT NULL,
+    geometry TEXT NOT NULL,
+    left INTEGER NOT NULL,
+    top INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (name, template_hash, geometry)
+);
+CREATE INDEX IF NOT EXISTS locations_updated ON locations (updated);
+"""
+
+_caches: Dict[Path, "LocationCache"] = {}
+_caches_lock = threading.Lock()
+
+
+class LocationCache:
+    """Element locations in an SQLite database, shared between processes.
+
+    The database uses write-ahead logging, so readers don't block the writer,
+    and concurrent writers wait for each other. Errors are reported as
+    warnings rather than raised, since the cache only speeds up searches.
+    """
+
+    def __init__(
+        self, path: Union[Path, str], max_entries: int = DEFAULT_MAX_ENTRIES
+    ) -> None:
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        # Template hashes, with the modification time and size they were
+        # calculated for
+        self._hashes: Dict[Path, Tuple[Tuple[int, int], str]] = {}
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(
+            str(self.path),
+            timeout=BUSY_TIMEOUT_SECONDS,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def get(self, name: str, template_path: Path, geometry: str) -> Optional[Rect]:
+        template_hash = self.template_hash(template_path)
+        if template_hash is None:
+            return None
+
+        try:
+            with self._lock:
+                row = self._connection.execute(
+                    "SELECT left, top, width, height FROM locations"
+                    " WHERE name = ? AND template_hash = ? AND geometry = ?",
+                    (name, template_hash, geometry),
+                ).fetchone()
+        except sqlite3.Error as e:
+            warnings.warn(f"Couldn't read {self.path}: {e}")
+            return None
+
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return Rect(left=row[0], top=row[1], width=row[2], height=row[3])
+
+    def put(self, name: str, template_path: Path, geometry: str, rect: Rect) -> None:
+        template_hash = self.template_hash(template_path)
+        if template_hash is None:
+            return
+
+        try:
+            with self._lock:
+                self._put(name, template_hash, geometry, rect)
+        except sqlite3.Error as e:
+            warnings.warn(f"Couldn't write {self.path}: {e}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM locations"
+            ).fetchone()[0]
+
+    # Returns a hash of the template's contents, or None if it doesn't exist.
+    # Templates are only hashed again if they change on disk.
+    def template_hash(self, path: Path) -> Optional[str]:
+        path = Path(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            cached = self._hashes.get(path)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+
+        template_hash = hashlib.sha1(path.read_bytes()).hexdigest()
+        with self._lock:
+            self._hashes[path] = (signature, template_hash)
+        return template_hash
+
+    def _put(self, name: str, template_hash: str, geometry: str, rect: Rect) -> None:
+        connection = self._connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            # Locations found with older versions of the template won't be used
+            # again
+            connection.execute(
+                "DELETE FROM locations"
+                " WHERE name = ? AND geometry = ? AND template_hash != ?",
+                (name, geometry, template_hash),
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO locations VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    name,
+                    template_hash,
+                    geometry,
+                    rect.left,
+                    rect.top,
+                    rect.width,
+                    rect.height,
+                    time.time(),
+                ),
+            )
+            connection.execute(
+                "DELETE FROM locations WHERE rowid IN (SELECT rowid FROM locations"
+                " ORDER BY updated DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+
+# Returns the cache at path, shared by every Locater in the process. Returns None
+# if the database can't be opened.
+def open_cache(path: Union[Path, str]) -> Optional[LocationCache]:
+    path = Path(path).absolute()
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            try:
+                cache = LocationCache(path)
+            except (OSError, sqlite3.Error) as e:
+                warnings.warn(f"Couldn't open location cache {path}: {e}")
+                return None
+            _caches[path] = cache
+        return cache
+
+
+# Describes the area a screenshot was grabbed from, which locations are only
+# valid for
+def geometry(boundary: Optional[Rect], width: int, height: int) -> str:
+    if boundary is None:
+        origin = "screen"
+    else:
+        origin = f"{boundary.left},{boundary.top}"
+    return f"{origin} {width}x{height}"
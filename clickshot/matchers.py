@@ -7,7 +7,7 @@ EVENTUAL_TIMEOUT_SECONDS = 30
 
 
 class _Visible(BaseMatcher):
-    def __init__(self, timeout_seconds: int = 0):
+    def __init__(self, timeout_seconds: float = 0):
         self.timeout_seconds = timeout_seconds
 
     def _matches(self, element: Element) -> bool:
@@ -31,5 +31,5 @@ def visible() -> BaseMatcher:
     return _Visible()
 
 
-def eventually_visible(within_seconds: int = EVENTUAL_TIMEOUT_SECONDS) -> BaseMatcher:
+def eventually_visible(within_seconds: float = EVENTUAL_TIMEOUT_SECONDS) -> BaseMatcher:
     return _Visible(within_seconds)
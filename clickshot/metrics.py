@@ -0,0 +1,250 @@
+"""Counters and histograms for the time spent in each phase of a wait.
+
+Nothing is recorded until a sink is added to the shared `metrics`:
+
+    from clickshot.metrics import metrics, MetricsRegistry
+
+    registry = MetricsRegistry()
+    metrics.add_sink(registry)
+
+Durations are recorded for screen grabs (grab_seconds), template loads
+(template_load_seconds), template matches (match_seconds) and mouse actions
+(mouse_seconds), along with the score of each match (match_score). Each wait
+records its attempts (wait_attempts), how long it took to find the element
+(time_to_found_seconds) and whether it timed out (waits_total,
+waits_timed_out_total).
+"""
+import atexit
+import bisect
+import contextlib
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Union
+import warnings
+
+try:
+    from typing import Protocol
+except ImportError:  # Python < 3.8
+    Protocol = object  # type: ignore
+
+# Upper bounds of the histogram buckets. Durations are in seconds, and match
+# scores are squared differences normalised to between 0 and 1.
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+SCORE_BUCKETS = (0.0001, 0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500)
+
+BUCKETS: Dict[str, Sequence[float]] = {
+    "match_score": SCORE_BUCKETS,
+    "wait_attempts": COUNT_BUCKETS,
+}
+
+# Added to the metric names in the Prometheus text format
+PROMETHEUS_PREFIX = "clickshot_"
+
+
+class MetricsSink(Protocol):
+    def increment(self, name: str, amount: float) -> None:
+        ...
+
+    def observe(self, name: str, value: float) -> None:
+        ...
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = DURATION_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        # Observations in each bucket, with a final one for everything larger
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def __repr__(self) -> str:
+        return f"<Histogram count={self.count} mean={self.mean:.6g}>"
+
+
+class MetricsRegistry:
+    """Keeps every counter and histogram in memory."""
+
+    def __init__(self) -> None:
+        self.counters: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0.0) + amount
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = Histogram(BUCKETS.get(name, DURATION_BUCKETS))
+                self.histograms[name] = histogram
+            histogram.observe(value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def to_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                name = PROMETHEUS_PREFIX + name
+                lines += [f"# TYPE {name} counter", f"{name} {value:g}"]
+
+            for name, histogram in sorted(self.histograms.items()):
+                name = PROMETHEUS_PREFIX + name
+                lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{le="{bound:g}"}} {cumulative}')
+                lines += [
+                    f'{name}_bucket{{le="+Inf"}} {histogram.count}',
+                    f"{name}_sum {histogram.sum:g}",
+                    f"{name}_count {histogram.count}",
+                ]
+
+        return "".join(line + "\n" for line in lines)
+
+
+class PrometheusFileSink(MetricsRegistry):
+    """Keeps metrics in memory and writes them to a file in the Prometheus text
+    format, for node_exporter's textfile collector.
+
+    The file is rewritten at most every `min_interval_seconds`, by `flush`, and
+    before the interpreter exits, so the end of a run isn't lost.
+    """
+
+    def __init__(
+        self, path: Union[Path, str], min_interval_seconds: float = 10.0
+    ) -> None:
+        super().__init__()
+        self.path = Path(path)
+        self.min_interval_seconds = min_interval_seconds
+        self._last_write: Optional[float] = None
+        # Held while the file is written, so threads don't write the partial
+        # file at the same time. Separate from the registry's lock, which
+        # to_prometheus takes.
+        self._write_lock = threading.Lock()
+        atexit.register(self.flush)
+
+    # Writes the file one last time, and stops writing it at exit
+    def close(self) -> None:
+        atexit.unregister(self.flush)
+        self.flush()
+
+    def increment(self, name: str, amount: float = 1.0) -> None:
+        super().increment(name, amount)
+        self._write_if_due()
+
+    def observe(self, name: str, value: float) -> None:
+        super().observe(name, value)
+        self._write_if_due()
+
+    def flush(self) -> None:
+        with self._write_lock:
+            self._write()
+
+    def _write_if_due(self) -> None:
+        # Measurements don't wait for another thread's write, which includes
+        # them or leaves them to the next one
+        if not self._write_lock.acquire(blocking=False):
+            return
+        try:
+            last_write = self._last_write
+            if last_write is None or (
+                time.monotonic() - last_write >= self.min_interval_seconds
+            ):
+                self._write()
+        finally:
+            self._write_lock.release()
+
+    def _write(self) -> None:
+        self._last_write = time.monotonic()
+
+        # Written alongside and then renamed, so the collector never sees a
+        # partial file
+        partial_path = self.path.with_name(self.path.name + ".partial")
+        try:
+            partial_path.write_text(self.to_prometheus())
+            os.replace(partial_path, self.path)
+        except OSError as e:
+            warnings.warn(f"Couldn't write metrics to {self.path}: {e}")
+
+
+class CallbackSink:
+    """Passes each measurement to callback(kind, name, value), where kind is
+    "counter" or "histogram"."""
+
+    def __init__(self, callback: Callable[[str, str, float], None]) -> None:
+        self.callback = callback
+
+    def increment(self, name: str, amount: float = 1.0) -> None:
+        self.callback("counter", name, amount)
+
+    def observe(self, name: str, value: float) -> None:
+        self.callback("histogram", name, value)
+
+
+class Metrics:
+    """Sends measurements to every sink that's been added."""
+
+    def __init__(self) -> None:
+        self._sinks: List[MetricsSink] = []
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._sinks)
+
+    def add_sink(self, sink: MetricsSink) -> None:
+        with self._lock:
+            # Replaced rather than appended to, so it can be iterated unlocked
+            self._sinks = self._sinks + [sink]
+
+    def remove_sink(self, sink: MetricsSink) -> None:
+        with self._lock:
+            self._sinks = [s for s in self._sinks if s is not sink]
+
+    def increment(self, name: str, amount: float = 1.0) -> None:
+        for sink in self._sinks:
+            sink.increment(name, amount)
+
+    def observe(self, name: str, value: float) -> None:
+        for sink in self._sinks:
+            sink.observe(name, value)
+
+    # Records how long the block took, whether or not it raised
+    @contextlib.contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        if not self._sinks:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+
+# Shared by every Locater and Element in the process
+metrics = Metrics()
@@ -1,4 +1,35 @@
-from pynput.mouse import Controller as Mouse
+from typing import Tuple
+
+from pynput.mouse import Controller
 from pynput.mouse import Button
 
+from .snapshot import frame_snapshot
+
+
+# Any button or wheel action is likely to change the screen, as is moving the
+# pointer over something with a hover effect, so the shared screen snapshot is
+# invalidated afterwards.
+class Mouse(Controller):
+    @property
+    def position(self) -> Tuple[int, int]:
+        return Controller.position.fget(self)
+
+    @position.setter
+    def position(self, position: Tuple[int, int]) -> None:
+        Controller.position.fset(self, position)
+        frame_snapshot.invalidate()
+
+    def press(self, button: Button) -> None:
+        super().press(button)
+        frame_snapshot.invalidate()
+
+    def release(self, button: Button) -> None:
+        super().release(button)
+        frame_snapshot.invalidate()
+
+    def scroll(self, dx: int, dy: int) -> None:
+        super().scroll(dx, dy)
+        frame_snapshot.invalidate()
+
+
 __all__ = [Mouse, Button]
@@ -0,0 +1,378 @@
+"""Records the screen, and replays recordings in place of it.
+
+    from clickshot import recording
+
+    recording.record("recordings/login")  # while running against a display
+    recording.replay("recordings/login")  # later, without one
+
+Elements and regions are used as normal in between. A recording is a directory
+holding recording.json, which lists the monitors, and frames.jsonl, with the
+time of each frame. Frames are stored as PNGs, or with video=True, in a single
+lossless video (frames.avi), which is smaller.
+"""
+import atexit
+import bisect
+import json
+import os
+from pathlib import Path
+import queue
+import threading
+import time
+from typing import Any, Dict, IO, List, Optional, Tuple, TYPE_CHECKING, Union
+import warnings
+
+from . import backend as backends
+from .backend import Monitor, Screen
+from .lazy import lazy_import
+
+if TYPE_CHECKING:
+    from mss.screenshot import ScreenShot
+    import numpy
+else:
+    numpy = lazy_import("numpy")
+cv2 = lazy_import("cv2")
+mss_screenshot = lazy_import("mss.screenshot")
+
+RECORDING_NAME = "recording.json"
+FRAMES_NAME = "frames.jsonl"
+VIDEO_NAME = "frames.avi"
+
+# HuffYUV is lossless, so replayed frames match templates exactly, and is fast
+# enough to encode while recording
+VIDEO_FOURCC = "HFYU"
+# Only used for the video's metadata, since frames are replayed at the times in
+# frames.jsonl
+VIDEO_FPS = 10.0
+
+# Full frames waiting to be written, which bounds the memory used while the
+# writer is slower than the screen is grabbed
+MAX_QUEUED_FRAMES = 4
+
+_recording: Optional["Recording"] = None
+
+
+class Recording:
+    """Writes frames of the whole screen into a recording directory.
+
+    Frames are written on a background thread. Frames that haven't changed
+    since the last one aren't queued at all, since replays show the last frame
+    until the next one. At most `max_queued_frames` wait to be written; while
+    the writer is behind, new frames are dropped and counted in `dropped`.
+    """
+
+    def __init__(
+        self,
+        path: Union[Path, str],
+        video: bool = False,
+        max_queued_frames: int = MAX_QUEUED_FRAMES,
+    ) -> None:
+        self.path = Path(path)
+        self.video = video
+        self.frames = 0
+        self.dropped = 0
+        self._start = time.monotonic()
+        self._monitors: Optional[List[Monitor]] = None
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._index: IO[str] = open(self.path / FRAMES_NAME, "w")
+
+        self._queue: "queue.Queue[Optional[Tuple[float, numpy.ndarray]]]" = (
+            queue.Queue(max_queued_frames)
+        )
+        # The last frame that was queued, which new frames are compared with
+        self._last_frame: Optional["numpy.ndarray"] = None
+        self._writer: Any = None
+        self._video_size: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = threading.Thread(
+            target=self._run, name="clickshot-recording", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    # Records the monitors of the screen being recorded, the first time it's
+    # opened
+    def start(self, monitors: List[Monitor]) -> None:
+        with self._lock:
+            if self._monitors is not None:
+                return
+            self._monitors = monitors
+        recording = {
+            "version": 1,
+            "monitors": monitors,
+            "format": "video" if self.video else "png",
+        }
+        (self.path / RECORDING_NAME).write_text(json.dumps(recording, indent=2))
+
+    # Queues a grab of the whole screen, in BGRA
+    def add(self, bgra: "numpy.ndarray") -> None:
+        timestamp = time.monotonic() - self._start
+        with self._lock:
+            last_frame = self._last_frame
+            if (
+                last_frame is not None
+                and last_frame.shape[:2] == bgra.shape[:2]
+                and numpy.array_equal(last_frame, bgra[:, :, :3])
+            ):
+                return
+
+            frame = cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR)
+            try:
+                self._queue.put_nowait((timestamp, frame))
+            except queue.Full:
+                self.dropped += 1
+                return
+            self._last_frame = frame
+
+    # Waits for every queued frame to be written
+    def flush(self) -> None:
+        self._queue.join()
+
+    def close(self) -> None:
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None:
+            return
+
+        self._queue.put(None)
+        thread.join()
+        if self._writer is not None:
+            self._writer.release()
+        self._index.close()
+        atexit.unregister(self.close)
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._write(*job)
+            except Exception as e:
+                warnings.warn(f"Couldn't record frame in {self.path}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, timestamp: float, frame: "numpy.ndarray") -> None:
+        entry: Dict[str, Any] = {"time": round(timestamp, 6)}
+        if self.video:
+            height, width = frame.shape[:2]
+            if self._writer is None:
+                self._writer = cv2.VideoWriter(
+                    str(self.path / VIDEO_NAME),
+                    cv2.VideoWriter_fourcc(*VIDEO_FOURCC),
+                    VIDEO_FPS,
+                    (width, height),
+                )
+                self._video_size = (width, height)
+            if self._video_size != (width, height) or not self._writer.isOpened():
+                raise OSError(f"can't write {width}x{height} frames to the video")
+            self._writer.write(frame)
+            entry["frame"] = self.frames
+        else:
+            name = f"{self.frames:06d}.png"
+            if not cv2.imwrite(
+                str(self.path / name), frame, [cv2.IMWRITE_PNG_COMPRESSION, 1]
+            ):
+                raise OSError(f"can't write {name}")
+            entry["file"] = name
+
+        self._index.write(json.dumps(entry) + "\n")
+        self._index.flush()
+        self.frames += 1
+
+
+class RecordingScreen:
+    """Passes grabs through to another screen, adding a grab of the whole
+    screen to the recording each time.
+
+    Screens are opened again whenever a display's backend is, so several
+    screens can add to the same recording over its lifetime.
+    """
+
+    def __init__(self, screen: Screen, recording: Recording) -> None:
+        self.recording = recording
+        self._screen = screen
+        recording.start(screen.monitors)
+
+    @property
+    def monitors(self) -> List[Monitor]:
+        return self._screen.monitors
+
+    def grab(self, monitor: Monitor) -> "ScreenShot":
+        screen_monitor = self._screen.monitors[0]
+        pixels = self._screen.grab(screen_monitor)
+
+        bgra = numpy.frombuffer(pixels.raw, numpy.uint8).reshape(
+            pixels.height, pixels.width, 4
+        )
+        self.recording.add(bgra)
+        return _crop(bgra, screen_monitor, monitor)
+
+    # Closes the screen, leaving the recording open
+    def close(self) -> None:
+        self._screen.close()
+
+
+class ReplayScreen:
+    """Serves the frames of a recording instead of grabbing the screen.
+
+    In real time, each grab gets the frame that was on the screen as long after
+    the start of the recording as it is after the first grab. Otherwise, each
+    grab gets the next frame, which makes waits reproducible regardless of how
+    long matching takes. The last frame is repeated once the recording ends.
+    """
+
+    def __init__(self, path: Union[Path, str], realtime: bool = True) -> None:
+        self.path = Path(path)
+        self.realtime = realtime
+        self.grabs = 0
+
+        recording = json.loads((self.path / RECORDING_NAME).read_text())
+        self._monitors: List[Monitor] = recording["monitors"]
+        self._video = recording["format"] == "video"
+
+        with open(self.path / FRAMES_NAME) as f:
+            self._frames = [json.loads(line) for line in f if line.strip()]
+        if not self._frames:
+            raise ValueError(f"{self.path} has no frames")
+        self._times = [frame["time"] for frame in self._frames]
+
+        self._start: Optional[float] = None
+        self._index = -1
+        self._frame: Optional["numpy.ndarray"] = None
+        self._capture: Any = None
+        # Index of the next frame the video will read
+        self._capture_index = 0
+        self._lock = threading.Lock()
+
+    @property
+    def monitors(self) -> List[Monitor]:
+        return self._monitors
+
+    def grab(self, monitor: Monitor) -> "ScreenShot":
+        with self._lock:
+            frame = self._load(self._next_index())
+        return _crop(frame, self._monitors[0], monitor)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._capture is not None:
+                self._capture.release()
+                self._capture = None
+
+    def _next_index(self) -> int:
+        self.grabs += 1
+        if not self.realtime:
+            return min(self.grabs, len(self._frames)) - 1
+
+        now = time.monotonic()
+        if self._start is None:
+            self._start = now
+        return max(bisect.bisect_right(self._times, now - self._start) - 1, 0)
+
+    def _load(self, index: int) -> "numpy.ndarray":
+        if index == self._index and self._frame is not None:
+            return self._frame
+
+        entry = self._frames[index]
+        if self._video:
+            frame = self._read_video(entry["frame"])
+        else:
+            frame = cv2.imread(str(self.path / entry["file"]), cv2.IMREAD_COLOR)
+            if frame is None:
+                raise FileNotFoundError(self.path / entry["file"])
+
+        self._index = index
+        self._frame = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
+        return self._frame
+
+    # Replays mostly move forwards, so the video is only sought when going back
+    def _read_video(self, frame_number: int) -> "numpy.ndarray":
+        if self._capture is None:
+            self._capture = cv2.VideoCapture(str(self.path / VIDEO_NAME))
+            self._capture_index = 0
+        if frame_number < self._capture_index:
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            self._capture_index = frame_number
+
+        while True:
+            ok, frame = self._capture.read()
+            if not ok:
+                raise OSError(f"can't read frame {frame_number} of the video")
+            self._capture_index += 1
+            if self._capture_index > frame_number:
+                return frame
+
+
+# Records every grab of the display from now on into path, while still grabbing
+# it. Other displays are grabbed as normal.
+def record(
+    path: Union[Path, str], video: bool = False, display: Optional[str] = None
+) -> Recording:
+    global _recording
+
+    if display is None:
+        display = os.environ.get("DISPLAY")
+    recording = Recording(path, video)
+
+    def open_screen(screen_display: Optional[str]) -> Screen:
+        screen = backends.open_mss(screen_display)
+        if screen_display != display:
+            return screen
+        return RecordingScreen(screen, recording)
+
+    _finish_recording()
+    _recording = recording
+    backends.use_screen(open_screen)
+    return recording
+
+
+# Replays the recording in path instead of grabbing a display
+def replay(path: Union[Path, str], realtime: bool = True) -> ReplayScreen:
+    _finish_recording()
+    screen = ReplayScreen(path, realtime)
+    # Backends open their screen again after being released, which continues
+    # the same replay
+    backends.use_screen(lambda display: screen)
+    return screen
+
+
+# Goes back to grabbing the display, finishing any recording
+def stop() -> None:
+    backends.use_screen(None)
+    _finish_recording()
+
+
+def _finish_recording() -> None:
+    global _recording
+
+    recording = _recording
+    _recording = None
+    if recording is not None:
+        recording.close()
+
+
+# Grabs monitor out of a frame of the whole screen, in the form mss grabs it
+def _crop(
+    frame: "numpy.ndarray", screen_monitor: Monitor, monitor: Monitor
+) -> "ScreenShot":
+    # Frames of HiDPI screens are at a higher resolution than the monitors
+    scale = frame.shape[1] / screen_monitor["width"]
+    left = round((monitor["left"] - screen_monitor["left"]) * scale)
+    top = round((monitor["top"] - screen_monitor["top"]) * scale)
+    width = round(monitor["width"] * scale)
+    height = round(monitor["height"] * scale)
+    if (
+        left < 0
+        or top < 0
+        or left + width > frame.shape[1]
+        or top + height > frame.shape[0]
+    ):
+        raise ValueError(f"{monitor} is outside the recorded screen")
+
+    data = frame[top:top + height, left:left + width]
+    return mss_screenshot.ScreenShot(
+        data.tobytes(), monitor, mss_screenshot.Size(width, height)
+    )
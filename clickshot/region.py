@@ -1,10 +1,16 @@
-import inspect
+import functools
 from pathlib import Path
 import platform
-from typing import Dict, List, Optional
+import sys
+from types import FrameType
+from typing import Dict, Iterable, List, Optional
 
+from .artifacts import artifact_writer, screenshot_path
 from .config import Config
 from .element import Element, ElementConfig
+from .exceptions import ElementNotFoundError
+from .locater import Locater
+from .retry import retry_with_timeout
 from .types import Rect
 
 
@@ -14,48 +20,156 @@ class Region:
         self._boundary = boundary
         self._config = config
         self._elements: Dict[str, Element] = {}
-
-        if self._config.image_dir == "":
-            self._config = self._config._replace(
-                image_dir=_get_image_dir(inspect.stack())
-            )
-        if self._config.screenshot_dir == "":
-            self._config = self._config._replace(
-                screenshot_dir=_get_screenshot_dir(inspect.stack())
-            )
+        self._locater: Optional[Locater] = None
+
+        if self._config.image_dir == "" or self._config.screenshot_dir == "":
+            calling_dir = _get_calling_dir(sys._getframe(1))
+            if self._config.image_dir == "":
+                self._config = self._config._replace(
+                    image_dir=_get_image_dir(calling_dir)
+                )
+            if self._config.screenshot_dir == "":
+                self._config = self._config._replace(
+                    screenshot_dir=_get_screenshot_dir(calling_dir)
+                )
 
     def configure(self, element_configs: List[ElementConfig]) -> "Region":
         self._elements = {e.name: Element(e, self) for e in element_configs}
         return self
 
+    # Releases the display connections once no other Region is using them. Not
+    # called close, since elements are attributes and "close" is a common name.
+    def release_backends(self) -> None:
+        for element in self._elements.values():
+            element.close()
+        if self._locater is not None:
+            self._locater.close()
+            self._locater = None
+
+    def locate_all(
+        self, names: Iterable[str], timeout_seconds: float = 0
+    ) -> Dict[str, Rect]:
+        found: Dict[str, Rect] = {}
+        try:
+            self._locate_all_with_retry(names, found, timeout_seconds, log=False)
+        except ElementNotFoundError:
+            pass
+        return found
+
+    # Number of places the named element is visible, waiting up to
+    # timeout_seconds for at least one. Region methods are named so that they
+    # don't hide elements with common names, like "count".
+    def count_visible(self, name: str, timeout_seconds: float = 0) -> int:
+        return len(getattr(self, name).locate_all(timeout_seconds))
+
+    def wait_all(
+        self, names: Iterable[str], timeout_seconds: Optional[float] = None
+    ) -> Dict[str, Rect]:
+        if timeout_seconds is None:
+            timeout_seconds = self._config.timeout_seconds
+
+        names = list(names)
+        full_names = ", ".join(f"{self._name}-{name}" for name in names)
+        print(f"Waiting for {full_names}: ", end="", flush=True)
+
+        found: Dict[str, Rect] = {}
+        try:
+            self._locate_all_with_retry(names, found, timeout_seconds, log=True)
+        except Exception:
+            self._save_last_screenshot([n for n in names if n not in found])
+            raise
+
+        print("Done")
+        return found
+
+    def _save_last_screenshot(self, names: Iterable[str]) -> None:
+        if self._locater is None or self._locater.last_screenshot is None:
+            return
+
+        path = screenshot_path(
+            self._config.screenshot_dir, self._name, self._config.screenshot_format
+        )
+        unique_screenshot_path = artifact_writer.save(
+            self._locater.last_screenshot,
+            path,
+            self._config.screenshot_png_compression,
+        )
+
+        for name in names:
+            print(f"Expected Image: {getattr(self, name).image_path}")
+        print(f"Screenshot: {unique_screenshot_path}")
+
+    def _locate_all_with_retry(
+        self,
+        names: Iterable[str],
+        found: Dict[str, Rect],
+        timeout_seconds: float,
+        log: bool,
+    ) -> None:
+        if self._locater is None:
+            self._locater = Locater(self._config)
+        locater = self._locater
+        elements = [getattr(self, name) for name in names]
+        if not elements:
+            return
+        # Every element shares the display's mouse, so any of them can check it
+        # for the failsafe
+        elements[0]._move_away_from_failsafe()
+
+        # Grab the region once per attempt, and match every element still missing
+        def locate_missing() -> None:
+            try:
+                missing = {e.image_path: e for e in elements if e.name not in found}
+                results = locater.locate_all(missing.keys(), self._boundary)
+                for image_path, rect in results.items():
+                    found[missing[image_path].name] = rect
+
+                not_found = [e.name for e in elements if e.name not in found]
+                if not_found:
+                    raise ElementNotFoundError(f"Not found: {', '.join(not_found)}")
+            except Exception as e:
+                elements[0]._abort_if_failsafe(e)
+                raise e
+
+        retry_with_timeout(
+            locate_missing, timeout_seconds, log=log, policy=self._config.poll_policy
+        )
+
     def __getattr__(self, name: str) -> Element:
         if name not in self._elements:
             self._elements[name] = Element(ElementConfig(name), self)
         return self._elements[name]
 
 
-def _get_image_dir(stack: List[inspect.FrameInfo]) -> str:
-    image_dir = _get_calling_dir(stack) / "images"
+def _get_image_dir(calling_dir: Path) -> str:
+    return _find_image_dir(calling_dir, platform.system(), platform.release())
+
+
+# Regions are often created in bulk from the same file, so the directory probing
+# is only done once per file. Image directories created afterwards won't be used.
+@functools.lru_cache(maxsize=None)
+def _find_image_dir(calling_dir: Path, system: str, release: str) -> str:
+    image_dir = calling_dir / "images"
 
-    if platform.system().lower() == "darwin":
-        mac_release_dir = image_dir / f"{platform.system()}-{platform.mac_ver()[0]}"
+    if system.lower() == "darwin":
+        mac_release_dir = image_dir / f"{system}-{platform.mac_ver()[0]}"
         if mac_release_dir.exists():
             return str(mac_release_dir)
 
-    release_dir = image_dir / f"{platform.system()}-{platform.release()}"
+    release_dir = image_dir / f"{system}-{release}"
     if release_dir.exists():
         return str(release_dir)
 
-    system_dir = image_dir / platform.system()
+    system_dir = image_dir / system
     if system_dir.exists():
         return str(system_dir)
 
     return str(image_dir)
 
 
-def _get_screenshot_dir(stack: List[inspect.FrameInfo]) -> str:
-    return str(_get_calling_dir(stack) / "screenshots")
+def _get_screenshot_dir(calling_dir: Path) -> str:
+    return str(calling_dir / "screenshots")
 
 
-def _get_calling_dir(stack: List[inspect.FrameInfo]) -> Path:
-    return Path(stack[1].filename).parent
+def _get_calling_dir(frame: FrameType) -> Path:
+    return Path(frame.f_code.co_filename).parent
@@ -1,37 +1,154 @@
 import time
-from typing import Any, Callable
+from typing import Any, Callable, NamedTuple, Optional, TYPE_CHECKING
 import warnings
 
+from .lazy import lazy_import
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+asyncio = lazy_import("asyncio")
+
+
+class PollPolicy(NamedTuple):
+    # Time to wait after a failed attempt before trying again
+    interval_seconds: float = 0.0
+
+    # Each successive wait is multiplied by this, up to max_interval_seconds
+    backoff: float = 1.0
+    max_interval_seconds: Optional[float] = None
+
+    # Minimum time between the start of one attempt and the start of the next.
+    # By default, quick attempts are spaced out to 20 a second, so that waiting
+    # doesn't keep a core busy. Slower attempts follow each other immediately.
+    min_tick_seconds: float = 0.05
+
+    def delay(self, failures: int) -> float:
+        delay = self.interval_seconds * self.backoff ** (failures - 1)
+        if self.max_interval_seconds is not None:
+            delay = min(delay, self.max_interval_seconds)
+        return delay
+
+
+class RetryStats:
+    def __init__(self) -> None:
+        self.attempts = 0
+        # Attempts that failed and had to be repeated
+        self.failures = 0
+        self.sleep_seconds = 0.0
+        self.elapsed_seconds = 0.0
+
+    def __repr__(self) -> str:
+        return (
+            f"<RetryStats attempts={self.attempts} failures={self.failures} "
+            f"sleep_seconds={self.sleep_seconds:.3f} "
+            f"elapsed_seconds={self.elapsed_seconds:.3f}>"
+        )
+
 
 def retry_with_timeout(
-    method: Callable, timeout_seconds: int, log: bool = False
+    method: Callable,
+    timeout_seconds: float,
+    log: bool = False,
+    policy: Optional[PollPolicy] = None,
+    stats: Optional[RetryStats] = None,
 ) -> Any:
-    emitted_warning = False
-    start_time = time.monotonic()
-    logger = RetryLogger()
+    attempts = _Attempts(timeout_seconds, log, policy, stats)
 
     while True:
-        now = time.monotonic()
-        if log:
-            logger.update(now - start_time)
-
+        attempts.start()
         try:
             return method()
+        except Exception as e:
+            delay = attempts.failed(e)
 
-        except RetryAbort as e:
-            if log:
-                print("\n")
-            raise e.exception
+        if delay > 0:
+            time.sleep(delay)
+
+
+async def retry_with_timeout_async(
+    method: Callable,
+    timeout_seconds: float,
+    log: bool = False,
+    policy: Optional[PollPolicy] = None,
+    stats: Optional[RetryStats] = None,
+    executor: Optional["Executor"] = None,
+) -> Any:
+    loop = asyncio.get_event_loop()
+    attempts = _Attempts(timeout_seconds, log, policy, stats)
 
+    while True:
+        attempts.start()
+        try:
+            return await loop.run_in_executor(executor, method)
         except Exception as e:
-            if now - start_time >= timeout_seconds:
-                if log:
-                    print("\n")
-                raise
-
-            if not emitted_warning and isinstance(e, FileNotFoundError):
-                warnings.warn(str(e))
-                emitted_warning = True
+            delay = attempts.failed(e)
+
+        await asyncio.sleep(delay)
+
+
+# Keeps track of the attempts made by a retry loop, and decides how long to wait
+# before the next one
+class _Attempts:
+    def __init__(
+        self,
+        timeout_seconds: float,
+        log: bool,
+        policy: Optional[PollPolicy],
+        stats: Optional[RetryStats],
+    ) -> None:
+        self.timeout_seconds = timeout_seconds
+        self.log = log
+        self.policy = PollPolicy() if policy is None else policy
+        self.stats = RetryStats() if stats is None else stats
+
+        self.emitted_warning = False
+        self.start_time = time.monotonic()
+        self.attempt_time = self.start_time
+        self.logger = RetryLogger()
+
+    def start(self) -> None:
+        self.attempt_time = time.monotonic()
+        self.stats.elapsed_seconds = self.attempt_time - self.start_time
+        self.stats.attempts += 1
+        if self.log:
+            self.logger.update(self.attempt_time - self.start_time)
+
+    # Returns how long to wait before the next attempt, or raises if there
+    # shouldn't be one
+    def failed(self, exception: Exception) -> float:
+        if isinstance(exception, RetryAbort):
+            if self.log:
+                print("\n")
+            raise exception.exception
+
+        if self.attempt_time - self.start_time >= self.timeout_seconds:
+            if self.log:
+                print("\n")
+            raise exception
+
+        if not self.emitted_warning and isinstance(exception, FileNotFoundError):
+            warnings.warn(str(exception))
+            self.emitted_warning = True
+
+        self.stats.failures += 1
+        return self._delay()
+
+    def _delay(self) -> float:
+        delay = self.policy.delay(self.stats.failures)
+        if delay <= 0 and self.policy.min_tick_seconds <= 0:
+            return 0.0
+
+        now = time.monotonic()
+        delay = max(delay, self.attempt_time + self.policy.min_tick_seconds - now)
+
+        # Don't sleep past the deadline, so the final attempt happens on time
+        delay = min(delay, self.start_time + self.timeout_seconds - now)
+        if delay <= 0:
+            return 0.0
+
+        self.stats.sleep_seconds += delay
+        return delay
 
 
 class RetryLogger:
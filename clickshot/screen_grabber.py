@@ -1,30 +1,183 @@
-from typing import Optional
-
-import cv2
-from mss import mss
-import numpy
+from typing import Dict, Optional, Tuple, TYPE_CHECKING
 
+from . import backend as backends
+from .backend import Backend
+from .buffer_pool import BufferPool
 from .image import Image
+from .lazy import lazy_import
+from .snapshot import frame_snapshot
 from .types import Rect
 
+if TYPE_CHECKING:
+    import numpy
+else:
+    numpy = lazy_import("numpy")
+cv2 = lazy_import("cv2")
+
 
 class ScreenGrabber:
-    def __init__(self) -> None:
-        self._mss = mss()
+    def __init__(
+        self,
+        frame_ttl_seconds: float = 0.0,
+        grayscale: bool = False,
+        display: Optional[str] = None,
+    ) -> None:
+        self._backend: Optional[Backend] = backends.acquire(display)
+        self._frame_ttl_seconds = frame_ttl_seconds
+        self._grayscale = grayscale
+        self.buffers = BufferPool()
+
+    def close(self) -> None:
+        if self._backend is not None:
+            backends.release(self._backend)
+            self._backend = None
 
     def grab(self, rect: Optional[Rect] = None) -> Image:
+        if self._frame_ttl_seconds > 0:
+            return self.grab_shared(rect)
+
+        return self._grab_monitor(self._get_monitor(rect))
+
+    # Crops rect out of the shared snapshot of the whole screen. Even with a zero
+    # TTL, callers in other threads waiting on the same grab will share it.
+    def grab_shared(self, rect: Optional[Rect] = None) -> Image:
+        frame, frame_monitor = frame_snapshot.get(
+            self._frame_ttl_seconds, self.grab_frame
+        )
+        return self.crop_frame(frame, frame_monitor, rect)
+
+    # Grabs the whole virtual screen in colour, into a buffer of its own so that
+    # it can be kept after later grabs. Frames of HiDPI screens scaled by a whole
+    # number are kept at their native size, and only the parts that are cropped
+    # out of them are resized.
+    def grab_frame(self) -> Tuple[Image, Dict[str, int]]:
+        monitor = self._get_backend().monitors[0]
+        image = self._grab_monitor(monitor, grayscale=False, reuse=False, native=True)
+        return image, monitor
+
+    # Crops rect out of a frame from grab_frame, or grabs it directly if the frame
+    # doesn't cover it
+    def crop_frame(
+        self, frame: Image, frame_monitor: Dict[str, int], rect: Optional[Rect] = None
+    ) -> Image:
+        cropped = _crop(frame, frame_monitor, rect)
+        if cropped is None:
+            return self._grab_monitor(self._get_monitor(rect))
+
+        # Frames are always in colour
+        if self._grayscale:
+            gray = self.buffers.get(cropped.data.shape[:2])
+            return Image(cv2.cvtColor(cropped.data, cv2.COLOR_BGR2GRAY, dst=gray))
+        return cropped
+
+    def _get_backend(self) -> Backend:
+        if self._backend is None:
+            raise RuntimeError("ScreenGrabber is closed")
+        return self._backend
+
+    def _get_monitor(self, rect: Optional[Rect]) -> Dict[str, int]:
         if rect is None:
-            monitor = self._mss.monitors[0]
-        else:
-            monitor = rect._asdict()
+            return self._get_backend().monitors[0]
+        return rect._asdict()
 
-        rgba_screenshot = numpy.array(self._mss.grab(monitor))
-        rgb_screenshot = cv2.cvtColor(rgba_screenshot, cv2.COLOR_RGBA2RGB)
+    # Converts the raw grab without copying it first. Unless reuse is False, the
+    # result is written into a buffer from this grabber's pool, which the next
+    # grab of the same size will overwrite. With native, grabs that _crop can
+    # resize a part of at a time aren't resized.
+    def _grab_monitor(
+        self,
+        monitor: Dict[str, int],
+        grayscale: Optional[bool] = None,
+        reuse: bool = True,
+        native: bool = False,
+    ) -> Image:
+        if grayscale is None:
+            grayscale = self._grayscale
 
+        pixels = self._get_backend().grab(monitor)
+        rgba_screenshot = numpy.frombuffer(pixels.raw, numpy.uint8).reshape(
+            pixels.height, pixels.width, 4
+        )
+
+        channels: Tuple[int, ...] = ()
+        code = cv2.COLOR_BGRA2GRAY
+        if not grayscale:
+            channels = (3,)
+            code = cv2.COLOR_RGBA2RGB
+        rgb_screenshot = cv2.cvtColor(
+            rgba_screenshot,
+            code,
+            dst=self._buffer((pixels.height, pixels.width, *channels), reuse),
+        )
+
+        # Grabs of HiDPI monitors are resized to the logical size, which templates
+        # are cut at. Matching them at the native size against upscaled templates
+        # doesn't give exact matches.
         expected_shape = (monitor["height"], monitor["width"])
-        if rgb_screenshot.shape[:2] != expected_shape:
+        if rgb_screenshot.shape[:2] != expected_shape and not (
+            native and _scale(rgb_screenshot.shape, monitor) is not None
+        ):
             return Image(
-                cv2.resize(rgb_screenshot, (monitor["width"], monitor["height"]))
+                cv2.resize(
+                    rgb_screenshot,
+                    (monitor["width"], monitor["height"]),
+                    dst=self._buffer((*expected_shape, *channels), reuse),
+                )
             )
 
         return Image(rgb_screenshot)
+
+    def _buffer(self, shape: Tuple[int, ...], reuse: bool) -> "numpy.ndarray":
+        if not reuse:
+            return numpy.empty(shape, numpy.uint8)
+        return self.buffers.get(shape)
+
+
+# Returns rect within the frame at the logical size, or None if the frame doesn't
+# cover it. Frames at the logical size are cropped without copying.
+def _crop(
+    frame: Image, monitor: Dict[str, int], rect: Optional[Rect]
+) -> Optional[Image]:
+    if rect is None:
+        relative_rect = Rect(
+            top=0, left=0, width=monitor["width"], height=monitor["height"]
+        )
+    else:
+        relative_rect = Rect(
+            top=rect.top - monitor["top"],
+            left=rect.left - monitor["left"],
+            width=rect.width,
+            height=rect.height,
+        )
+    if (
+        relative_rect.top < 0
+        or relative_rect.left < 0
+        or relative_rect.top + relative_rect.height > monitor["height"]
+        or relative_rect.left + relative_rect.width > monitor["width"]
+    ):
+        return None
+
+    scale = _scale(frame.data.shape, monitor)
+    if scale is None:
+        return frame if rect is None else frame.crop(relative_rect)
+
+    # Each logical pixel is resized from its own block of native pixels, so
+    # resizing a crop gives exactly the same pixels as cropping the resized frame
+    native = frame.crop(
+        Rect(
+            top=relative_rect.top * scale,
+            left=relative_rect.left * scale,
+            width=relative_rect.width * scale,
+            height=relative_rect.height * scale,
+        )
+    )
+    return Image(cv2.resize(native.data, (relative_rect.width, relative_rect.height)))
+
+
+# Returns how many times bigger than the monitor a HiDPI grab is, if it's a whole
+# number bigger than one in both directions
+def _scale(shape: Tuple[int, ...], monitor: Dict[str, int]) -> Optional[int]:
+    scale = shape[1] // monitor["width"]
+    if scale > 1 and shape[:2] == (monitor["height"] * scale, monitor["width"] * scale):
+        return scale
+    return None
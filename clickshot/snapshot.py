@@ -0,0 +1,44 @@
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from .image import Image
+
+Monitor = Dict[str, int]
+
+
+# The most recent grab of the whole virtual screen.
+# Grabbers with a non-zero frame_ttl_seconds crop their boundary out of this frame
+# instead of grabbing the screen themselves. Mouse and keyboard actions invalidate
+# it, since they're likely to change what's on the screen.
+class FrameSnapshot:
+    def __init__(self) -> None:
+        self._image: Optional[Image] = None
+        self._monitor: Monitor = {}
+        self._timestamp = 0.0
+        # time.monotonic() of the last invalidation, which frames grabbed earlier
+        # may not reflect
+        self.invalidated_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(
+        self, max_age_seconds: float, grab: Callable[[], Tuple[Image, Monitor]]
+    ) -> Tuple[Image, Monitor]:
+        requested = time.monotonic()
+        with self._lock:
+            # A grab that finished after this request is always fresh enough, so
+            # concurrent callers share a single grab
+            if self._image is None or self._timestamp < requested - max_age_seconds:
+                self._image, self._monitor = grab()
+                self._timestamp = time.monotonic()
+
+            return self._image, self._monitor
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._image = None
+            self.invalidated_at = time.monotonic()
+
+
+# Shared by every ScreenGrabber in the process
+frame_snapshot = FrameSnapshot()
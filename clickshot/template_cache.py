@@ -0,0 +1,128 @@
+from collections import OrderedDict
+import os
+from pathlib import Path
+import threading
+from typing import NamedTuple, Optional, Tuple, Union
+
+from .bundle import find_bundle, TemplateBundle
+from .image import Image
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    current_bytes: int
+
+
+Signature = Tuple[Optional[Tuple[int, int]], Optional[Tuple[int, int]]]
+
+# Path and grayscale
+_Key = Tuple[str, bool]
+
+
+class _Entry(NamedTuple):
+    # Modification time and size of the PNG and the bundle, if there is one, when
+    # the template was loaded
+    signature: Signature
+    image: Image
+
+
+class TemplateCache:
+    """Decoded template images, keyed by path.
+
+    Each lookup stats the file, so templates that are edited on disk are decoded
+    again. The least recently used templates are dropped once the decoded data
+    exceeds `max_bytes`.
+
+    If the template's directory has a compiled bundle (see `clickshot.bundle`)
+    that's up to date with the PNG, the template is mapped from the bundle
+    instead of being decoded.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._entries: "OrderedDict[_Key, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, path: Union[Path, str], grayscale: bool = False) -> Image:
+        key = (str(path), grayscale)
+        bundle = find_bundle(Path(path).parent)
+        signature = _get_signature(path, bundle)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.signature == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.image
+
+        image = None
+        if bundle is not None:
+            image = bundle.get(Path(path).name, grayscale, source=Path(path))
+
+        if image is None:
+            # Grayscale templates are converted the same way as the screenshots
+            if grayscale:
+                image = self.load(path).to_grayscale()
+            else:
+                image = Image.load(path)
+
+        with self._lock:
+            self.misses += 1
+            self._remove(key)
+            self._entries[key] = _Entry(signature, image)
+            self.current_bytes += image.data.nbytes
+            self._evict()
+
+        return image
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            current_bytes=self.current_bytes,
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _remove(self, key: _Key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry.image.data.nbytes
+
+    def _evict(self) -> None:
+        # Always keep the most recent template, even if it exceeds the budget
+        while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self.current_bytes -= entry.image.data.nbytes
+            self.evictions += 1
+
+
+def _get_signature(
+    path: Union[Path, str], bundle: Optional[TemplateBundle]
+) -> Signature:
+    bundle_signature = None if bundle is None else bundle.signature
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        # The PNG doesn't need to exist if the bundle has the template
+        if bundle is None or Path(path).name not in bundle:
+            raise
+        return (None, bundle_signature)
+
+    return ((stat.st_mtime_ns, stat.st_size), bundle_signature)
+
+
+# Shared by every Locater in the process
+template_cache = TemplateCache()
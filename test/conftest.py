@@ -1,7 +1,53 @@
 import sys
 from unittest import mock
 
+import pytest
+
+
+# The pynput controllers are subclassed, so super() needs real methods to call
+class Controller(mock.MagicMock):
+    def press(self, *args):
+        pass
+
+    def release(self, *args):
+        pass
+
+    def scroll(self, *args):
+        pass
+
+    @property
+    def position(self):
+        return getattr(self, "_position", (0, 0))
+
+    @position.setter
+    def position(self, position):
+        self._position = position
+
+
 # Mock out modules that require a graphical interface
-sys.modules["pynput.mouse"] = mock.Mock()
-sys.modules["pynput.keyboard"] = mock.Mock()
+sys.modules["pynput.mouse"] = mock.Mock(Controller=Controller)
+sys.modules["pynput.keyboard"] = mock.Mock(Controller=Controller)
 sys.modules["mss.linux"] = mock.Mock()
+
+
+@pytest.fixture(autouse=True)
+def close_backends():
+    # Backends are shared, so mocks patched into one test mustn't leak into another
+    from clickshot import backend, capture, recording
+
+    capture.close_all()
+    backend.close_all()
+    yield
+    capture.close_all()
+    backend.close_all()
+    recording.stop()
+
+
+@pytest.fixture
+def registry():
+    from clickshot.metrics import metrics, MetricsRegistry
+
+    registry = MetricsRegistry()
+    metrics.add_sink(registry)
+    yield registry
+    metrics.remove_sink(registry)
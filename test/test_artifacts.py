@@ -0,0 +1,117 @@
+import os
+from pathlib import Path
+
+import cv2
+from hamcrest import assert_that, is_
+import numpy
+import pytest
+
+from clickshot.artifacts import ArtifactWriter, screenshot_path, UniqueNames
+from clickshot.image import Image
+
+
+@pytest.fixture
+def writer():
+    writer = ArtifactWriter()
+    yield writer
+    writer.close()
+
+
+class TestUniqueNames:
+    def test_unused_path_is_kept(self, tmp_path):
+        path = UniqueNames().reserve(tmp_path / "name.png")
+
+        assert_that(path, is_(tmp_path / "name.png"))
+
+    def test_existing_files_are_skipped(self, tmp_path):
+        (tmp_path / "name.png").touch()
+        (tmp_path / "name_2.png").touch()
+
+        path = UniqueNames().reserve(tmp_path / "name.png")
+
+        assert_that(path, is_(tmp_path / "name_3.png"))
+
+    def test_reserved_paths_are_not_handed_out_again(self, tmp_path):
+        names = UniqueNames()
+
+        paths = [names.reserve(tmp_path / "name.png") for _ in range(3)]
+
+        assert_that(
+            [path.name for path in paths],
+            is_(["name.png", "name_2.png", "name_3.png"]),
+        )
+
+    def test_directory_is_only_listed_once(self, mocker, tmp_path):
+        scandir = mocker.spy(os, "scandir")
+        names = UniqueNames()
+
+        names.reserve(tmp_path / "one.png")
+        names.reserve(tmp_path / "two.png")
+
+        scandir.assert_called_once_with(tmp_path)
+
+    def test_missing_directory_has_no_files(self, tmp_path):
+        path = UniqueNames().reserve(tmp_path / "new" / "name.png")
+
+        assert_that(path, is_(tmp_path / "new" / "name.png"))
+
+
+class TestArtifactWriter:
+    def test_image_is_written_in_background(self, tmp_path, writer):
+        data = numpy.full((4, 5, 3), 7, numpy.uint8)
+
+        path = writer.save(Image(data), tmp_path / "dir" / "name.png")
+        writer.flush()
+
+        numpy.testing.assert_array_equal(cv2.imread(str(path)), data)
+        assert_that(writer.written, is_(1))
+
+    def test_image_is_copied_before_it_is_queued(self, tmp_path, writer):
+        data = numpy.full((4, 5, 3), 7, numpy.uint8)
+
+        path = writer.save(Image(data), tmp_path / "name.png")
+        data[:] = 0
+        writer.flush()
+
+        assert_that(cv2.imread(str(path))[0, 0, 0], is_(7))
+
+    def test_paths_are_unique(self, tmp_path, writer):
+        image = Image(numpy.zeros((4, 5, 3), numpy.uint8))
+
+        first = writer.save(image, tmp_path / "name.png")
+        second = writer.save(image, tmp_path / "name.png")
+        writer.flush()
+
+        assert_that(second, is_(tmp_path / "name_2.png"))
+        assert_that(first.exists() and second.exists(), is_(True))
+
+    def test_png_compression_is_applied(self, mocker, tmp_path, writer):
+        imwrite = mocker.patch("clickshot.artifacts.cv2.imwrite")
+
+        writer.save(Image(numpy.zeros((4, 5, 3), numpy.uint8)), tmp_path / "a.png", 9)
+        writer.flush()
+
+        assert_that(imwrite.call_args[0][2], is_([cv2.IMWRITE_PNG_COMPRESSION, 9]))
+
+    def test_other_formats_can_be_written(self, tmp_path, writer):
+        image = Image(numpy.zeros((4, 5, 3), numpy.uint8))
+
+        path = writer.save(image, tmp_path / "a.bmp")
+        writer.flush()
+
+        assert_that(cv2.imread(str(path)).shape, is_((4, 5, 3)))
+
+    def test_failed_write_is_a_warning(self, tmp_path, writer):
+        image = Image(numpy.zeros((4, 5, 3), numpy.uint8))
+
+        with pytest.warns(UserWarning, match="Couldn't write"):
+            writer.save(image, tmp_path / "name.unknown")
+            writer.flush()
+
+
+class TestScreenshotPath:
+    @pytest.mark.parametrize("format", [".bmp", "bmp"])
+    def test_format_is_the_suffix(self, format):
+        path = screenshot_path("screenshots", "area-ok", format)
+
+        assert_that(path, is_(Path("screenshots/area-ok.bmp")))
@@ -0,0 +1,117 @@
+from hamcrest import assert_that, is_, is_not, same_instance
+import pytest
+
+from clickshot import backend, Config, ElementConfig, Region
+
+
+@pytest.fixture
+def mss(mocker):
+    return mocker.patch("clickshot.backend.mss.mss")
+
+
+@pytest.fixture
+def Mouse(mocker):
+    return mocker.patch("clickshot.mouse.Mouse")
+
+
+class TestAcquire:
+    def test_backend_is_shared_per_display(self):
+        first = backend.acquire(":0")
+        second = backend.acquire(":0")
+
+        assert_that(second, is_(same_instance(first)))
+        assert_that(first.references, is_(2))
+
+    def test_displays_have_separate_backends(self):
+        assert_that(backend.acquire(":0"), is_not(same_instance(backend.acquire(":1"))))
+
+    def test_defaults_to_display_environment_variable(self, monkeypatch):
+        monkeypatch.setenv("DISPLAY", ":5")
+
+        assert_that(backend.acquire().display, is_(":5"))
+
+    def test_nothing_is_connected_until_used(self, mss, Mouse):
+        backend.acquire(":0")
+
+        mss.assert_not_called()
+        Mouse.assert_not_called()
+
+
+class TestBackend:
+    def test_screen_is_connected_once(self, mss):
+        shared = backend.acquire(":0")
+
+        shared.grab({"left": 0})
+        shared.monitors
+
+        mss.assert_called_once_with(display=":0")
+        mss().grab.assert_called_once_with({"left": 0})
+
+    def test_mouse_is_created_once(self, Mouse):
+        shared = backend.acquire(":0")
+
+        assert_that(shared.mouse, is_(same_instance(shared.mouse)))
+        Mouse.assert_called_once_with()
+
+
+class TestUseScreen:
+    def test_factory_opens_screen_instead_of_mss(self, mocker, mss):
+        factory = mocker.Mock()
+        backend.use_screen(factory)
+
+        backend.acquire(":0").grab({"left": 0})
+
+        mss.assert_not_called()
+        factory.assert_called_once_with(":0")
+        factory().grab.assert_called_once_with({"left": 0})
+
+    def test_open_screens_are_replaced(self, mocker, mss):
+        shared = backend.acquire(":0")
+        shared.grab({})
+        factory = mocker.Mock()
+
+        backend.use_screen(factory)
+        shared.grab({})
+
+        mss().close.assert_called_once_with()
+        factory().grab.assert_called_once_with({})
+
+    def test_none_goes_back_to_mss(self, mocker, mss):
+        backend.use_screen(mocker.Mock())
+        backend.use_screen(None)
+
+        backend.acquire(":0").grab({})
+
+        mss.assert_called_once_with(display=":0")
+
+
+class TestRelease:
+    def test_backend_is_closed_by_last_release(self, mss):
+        first = backend.acquire(":0")
+        backend.acquire(":0")
+        first.grab({})
+
+        backend.release(first)
+        mss().close.assert_not_called()
+
+        backend.release(first)
+        mss().close.assert_called_once_with()
+        assert_that(backend.acquire(":0"), is_not(same_instance(first)))
+
+
+class TestRegion:
+    def test_elements_share_one_connection(self, mss, Mouse):
+        region = Region("region", Config("img", "scr"))
+        region.configure([ElementConfig(f"element{i}") for i in range(150)])
+
+        mss.assert_not_called()
+        Mouse.assert_not_called()
+        assert_that(backend.acquire().references, is_(2 * 150 + 1))
+
+    def test_close_releases_backend(self, mss):
+        region = Region("region", Config("img", "scr"))
+        region.configure([ElementConfig("one"), ElementConfig("two")])
+
+        region.release_backends()
+
+        assert_that(backend.acquire().references, is_(1))
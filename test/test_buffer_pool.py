@@ -0,0 +1,62 @@
+from hamcrest import assert_that, is_, is_not, same_instance
+import numpy
+
+from clickshot.buffer_pool import BufferPool, PoolStats, total_bytes
+
+
+class TestGet:
+    def test_buffer_has_requested_shape_and_dtype(self):
+        buffer = BufferPool().get((3, 4), numpy.float32)
+
+        assert_that(buffer.shape, is_((3, 4)))
+        assert_that(buffer.dtype, is_(numpy.dtype(numpy.float32)))
+
+    def test_buffer_is_reused_for_same_shape(self):
+        pool = BufferPool()
+
+        first = pool.get((3, 4))
+        second = pool.get((3, 4))
+
+        assert_that(second, is_(same_instance(first)))
+        assert_that(pool.stats(), is_(PoolStats(1, 1, 12)))
+
+    def test_dtype_is_part_of_key(self):
+        pool = BufferPool()
+
+        first = pool.get((3, 4), numpy.uint8)
+        second = pool.get((3, 4), numpy.float32)
+
+        assert_that(second, is_not(same_instance(first)))
+        assert_that(pool.stats(), is_(PoolStats(2, 2, 60)))
+
+    def test_least_recently_used_shape_is_dropped(self):
+        pool = BufferPool(max_buffers=2)
+
+        first = pool.get((1,))
+        pool.get((2,))
+        pool.get((1,))
+        pool.get((3,))
+
+        assert_that(pool.get((1,)), is_(same_instance(first)))
+        assert_that(pool.stats(), is_(PoolStats(2, 3, 4)))
+
+    def test_clear_drops_all_buffers(self):
+        pool = BufferPool()
+        first = pool.get((3, 4))
+
+        pool.clear()
+
+        assert_that(pool.get((3, 4)), is_not(same_instance(first)))
+        assert_that(pool.stats(), is_(PoolStats(1, 2, 12)))
+
+
+class TestTotalBytes:
+    def test_counts_every_pool(self):
+        before = total_bytes()
+        first = BufferPool()
+        second = BufferPool()
+
+        first.get((10,))
+        second.get((20,))
+
+        assert_that(total_bytes() - before, is_(30))
@@ -0,0 +1,167 @@
+import cv2
+from hamcrest import assert_that, is_, is_not, none, same_instance
+import numpy
+import pytest
+
+from clickshot.bundle import compile_bundle, find_bundle, main, TemplateBundle
+from clickshot.image import Image
+from clickshot.template_cache import TemplateCache
+
+
+def write_image(path, size=(40, 64), seed=0):
+    random = numpy.random.RandomState(seed)
+    data = random.randint(0, 256, (size[0], size[1], 3)).astype(numpy.uint8)
+    cv2.imwrite(str(path), data)
+    return path
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    write_image(tmp_path / "large.png")
+    write_image(tmp_path / "small.png", size=(5, 7), seed=1)
+    return tmp_path
+
+
+class TestCompile:
+    def test_bundle_is_written_to_image_dir(self, image_dir):
+        path = compile_bundle(image_dir)
+
+        assert_that(path, is_(image_dir / "templates.bundle"))
+        assert_that(len(TemplateBundle(path)), is_(2))
+
+    def test_templates_match_decoded_images(self, image_dir):
+        bundle = TemplateBundle(compile_bundle(image_dir))
+        expected = Image.load(image_dir / "large.png")
+
+        numpy.testing.assert_array_equal(bundle.get("large.png").data, expected.data)
+        numpy.testing.assert_array_equal(
+            bundle.get("large.png", grayscale=True).data, expected.to_grayscale().data
+        )
+
+    def test_templates_are_memory_mapped(self, image_dir):
+        bundle = TemplateBundle(compile_bundle(image_dir))
+
+        data = bundle.get("small.png").data
+
+        assert_that(isinstance(data.base, numpy.memmap), is_(True))
+        assert_that(data.flags.writeable, is_(False))
+
+    def test_pyramid_levels_are_included(self, image_dir):
+        bundle = TemplateBundle(compile_bundle(image_dir, pyramid_levels=3))
+        expected = Image.load(image_dir / "large.png")
+
+        template = bundle.get("large.png")
+
+        # The template is only large enough to be halved twice
+        assert_that(sorted(template.pyramid), is_([2, 4]))
+        numpy.testing.assert_array_equal(
+            template.pyramid[4].data, expected._downscale(4).data
+        )
+        assert_that(bundle.get("small.png").pyramid, is_({}))
+
+    def test_templates_come_with_their_norm(self, image_dir):
+        bundle = TemplateBundle(compile_bundle(image_dir))
+        expected = Image.load(image_dir / "small.png").data.astype(float)
+
+        template = bundle.get("small.png")
+
+        assert_that(template.norm, is_(numpy.sum(expected * expected)))
+
+    def test_grayscale_templates_come_with_their_norm(self, image_dir):
+        bundle = TemplateBundle(compile_bundle(image_dir))
+        gray = Image.load(image_dir / "small.png").to_grayscale()
+        expected = gray.data.astype(float)
+
+        template = bundle.get("small.png", grayscale=True)
+
+        assert_that(template.norm, is_(numpy.sum(expected * expected)))
+
+    def test_command_line_compiles_each_dir(self, image_dir, capsys):
+        main([str(image_dir)])
+
+        assert_that((image_dir / "templates.bundle").exists(), is_(True))
+        output = capsys.readouterr().out
+        assert_that(output, is_(f"{image_dir / 'templates.bundle'}: 2 templates\n"))
+
+
+class TestGet:
+    def test_missing_template_is_none(self, image_dir):
+        bundle = TemplateBundle(compile_bundle(image_dir))
+
+        assert_that(bundle.get("missing.png"), is_(none()))
+
+    def test_edited_template_is_none(self, image_dir):
+        bundle = TemplateBundle(compile_bundle(image_dir))
+
+        write_image(image_dir / "large.png", seed=2)
+
+        template = bundle.get("large.png", source=image_dir / "large.png")
+        assert_that(template, is_(none()))
+
+    def test_template_without_png_is_used(self, image_dir):
+        bundle = TemplateBundle(compile_bundle(image_dir))
+
+        (image_dir / "large.png").unlink()
+
+        assert_that(
+            bundle.get("large.png", source=image_dir / "large.png"), is_not(none())
+        )
+
+    def test_invalid_file_is_rejected(self, tmp_path):
+        (tmp_path / "templates.bundle").write_bytes(b"not a bundle at all")
+
+        with pytest.raises(ValueError):
+            TemplateBundle(tmp_path / "templates.bundle")
+
+
+class TestFindBundle:
+    def test_no_bundle_is_none(self, tmp_path):
+        assert_that(find_bundle(tmp_path), is_(none()))
+
+    def test_bundle_is_opened_once(self, image_dir):
+        compile_bundle(image_dir)
+
+        assert_that(find_bundle(image_dir), is_(same_instance(find_bundle(image_dir))))
+
+
+class TestTemplateCache:
+    def test_bundle_is_preferred_to_png(self, mocker, image_dir):
+        compile_bundle(image_dir)
+        load = mocker.spy(Image, "load")
+
+        template = TemplateCache().load(image_dir / "large.png")
+
+        load.assert_not_called()
+        assert_that(isinstance(template.data.base, numpy.memmap), is_(True))
+
+    def test_edited_png_is_preferred_to_bundle(self, image_dir):
+        compile_bundle(image_dir)
+        write_image(image_dir / "large.png", seed=2)
+
+        template = TemplateCache().load(image_dir / "large.png")
+
+        numpy.testing.assert_array_equal(
+            template.data, Image.load(image_dir / "large.png").data
+        )
+
+    def test_loaded_template_has_bundled_norm(self, image_dir):
+        compile_bundle(image_dir)
+        expected = Image.load(image_dir / "large.png").data.astype(float)
+
+        template = TemplateCache().load(image_dir / "large.png")
+
+        assert_that(template.norm, is_(numpy.sum(expected * expected)))
+
+    def test_png_is_optional_with_bundle(self, image_dir):
+        compile_bundle(image_dir)
+        (image_dir / "large.png").unlink()
+
+        template = TemplateCache().load(image_dir / "large.png", grayscale=True)
+
+        assert_that(template.data.shape, is_((40, 64)))
+
+    def test_template_missing_from_both_raises_error(self, image_dir):
+        compile_bundle(image_dir)
+
+        with pytest.raises(FileNotFoundError):
+            TemplateCache().load(image_dir / "missing.png")
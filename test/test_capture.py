@@ -0,0 +1,99 @@
+import threading
+
+from hamcrest import assert_that, is_, is_not, same_instance
+import pytest
+
+from clickshot import capture
+from clickshot.capture import CaptureService
+
+
+@pytest.fixture
+def grab_frame(mocker):
+    ScreenGrabber = mocker.patch("clickshot.capture.ScreenGrabber")
+    count = iter(range(1000000))
+    ScreenGrabber().grab_frame.side_effect = lambda: (next(count), {"left": 0})
+    return ScreenGrabber().grab_frame
+
+
+@pytest.fixture
+def service(grab_frame):
+    service = CaptureService(fps=1000, buffer_frames=3)
+    yield service
+    service.close()
+
+
+def wait_for_grabs(service, count):
+    with service._condition:
+        service._condition.wait_for(lambda: service.grabs >= count, timeout=5)
+
+
+class TestCaptureService:
+    def test_thread_is_started_on_first_use(self, service, grab_frame):
+        assert_that(service.running, is_(False))
+
+        frame = service.latest()
+
+        assert_that(service.running, is_(True))
+        assert_that(frame.monitor, is_({"left": 0}))
+
+    def test_only_recent_frames_are_kept(self, service):
+        service.start()
+        wait_for_grabs(service, 5)
+
+        frames = service.frames_since(0)
+
+        assert_that(len(frames), is_(3))
+        assert_that(frames[-1].image > frames[0].image, is_(True))
+
+    def test_frames_since_excludes_older_frames(self, service):
+        service.start()
+        wait_for_grabs(service, 5)
+        newest = service.latest()
+
+        assert_that(service.frames_since(newest.timestamp), is_([]))
+
+    def test_stop_ends_thread(self, service):
+        service.start()
+        thread = service._thread
+
+        service.stop()
+
+        assert_that(thread.is_alive(), is_(False))
+        assert_that(service.running, is_(False))
+
+    def test_grab_error_is_raised(self, service, grab_frame):
+        grab_frame.side_effect = OSError("No display")
+
+        with pytest.raises(OSError):
+            service.latest()
+
+    def test_latest_returns_none_if_nothing_grabbed(self, service, grab_frame):
+        started = threading.Event()
+        grab_frame.side_effect = lambda: (started.wait(), {})
+
+        assert_that(service.latest(timeout_seconds=0.01), is_(None))
+        started.set()
+
+
+class TestAcquire:
+    def test_service_is_shared(self, grab_frame):
+        first = capture.acquire(10, display=":0")
+        second = capture.acquire(10, display=":0")
+
+        assert_that(second, is_(same_instance(first)))
+
+    def test_settings_have_separate_services(self, grab_frame):
+        first = capture.acquire(10, display=":0")
+
+        assert_that(capture.acquire(20, display=":0"), is_not(same_instance(first)))
+
+    def test_last_release_stops_service(self, grab_frame):
+        service = capture.acquire(1000, display=":0")
+        capture.acquire(1000, display=":0")
+        service.start()
+
+        capture.release(service)
+        assert_that(service.running, is_(True))
+
+        capture.release(service)
+        assert_that(service.running, is_(False))
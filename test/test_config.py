@@ -1,6 +1,6 @@
 from hamcrest import assert_that, is_
 
-from clickshot import Config
+from clickshot import Config, PollPolicy
 
 
 class TestConfig:
@@ -10,6 +10,20 @@ class TestConfig:
         assert_that(config.image_dir, is_("/images/"))
         assert_that(config.screenshot_dir, is_("/screenshots/"))
         assert_that(config.timeout_seconds, is_(30))
+        assert_that(config.frame_ttl_seconds, is_(0.0))
+        assert_that(config.capture_fps, is_(0.0))
+        assert_that(config.capture_buffer_frames, is_(8))
+        assert_that(config.match_pyramid_levels, is_(0))
+        assert_that(config.hint_padding_pixels, is_(32))
+        assert_that(config.skip_unchanged_frames, is_(True))
+        assert_that(config.poll_policy, is_(PollPolicy()))
+        assert_that(config.match_workers, is_(1))
+        assert_that(config.grayscale, is_(False))
+        assert_that(config.verify_colour, is_(True))
+        assert_that(config.screenshot_format, is_(".png"))
+        assert_that(config.screenshot_png_compression, is_(1))
+        assert_that(config.match_engine, is_("auto"))
+        assert_that(config.location_cache_path, is_(""))
 
     def test_config_can_be_loaded_from_dict(self):
         config_dict = {
@@ -1,9 +1,18 @@
+import asyncio
 import pytest
 from unittest import mock
 from hamcrest import assert_that, is_, has_item, contains_string
 from pathlib import Path
 
-from clickshot import Button, Config, ElementConfig, ElementNotFoundError, Rect, Region
+from clickshot import (
+    Button,
+    Config,
+    ElementConfig,
+    ElementNotFoundError,
+    PollPolicy,
+    Rect,
+    Region,
+)
 from clickshot.element import Element
 
 
@@ -13,6 +22,11 @@ def config():
     config.image_dir = "images/"
     config.screenshot_dir = "screenshots/"
     config.timeout_seconds = 30
+    config.poll_policy = PollPolicy()
+    config.capture_fps = 0.0
+    config.screenshot_format = ".png"
+    config.screenshot_png_compression = 1
+    config.location_cache_path = ""
     return config
 
 
@@ -27,7 +41,7 @@ def region(config):
 
 class TestClick:
     def test_element_is_clicked(self, mocker, region):
-        Mouse = mocker.patch("clickshot.element.Mouse")
+        Mouse = mocker.patch("clickshot.mouse.Mouse")
         Locater = mocker.patch("clickshot.element.Locater")
         Locater().locate.return_value = Rect(left=0, top=15, width=10, height=20)
 
@@ -40,7 +54,7 @@ class TestClick:
         Mouse().click.assert_called_with(button=Button.left, count=1)
 
     def test_exception_raised_if_element_not_found(self, mocker, region):
-        mocker.patch("clickshot.element.Mouse")
+        mocker.patch("clickshot.mouse.Mouse")
         retry_with_timeout = mocker.patch("clickshot.element.retry_with_timeout")
         retry_with_timeout.side_effect = ElementNotFoundError()
 
@@ -51,7 +65,7 @@ class TestClick:
             element.click()
 
     def test_default_timeout_is_30(self, mocker, region):
-        mocker.patch("clickshot.element.Mouse")
+        mocker.patch("clickshot.mouse.Mouse")
         retry_with_timeout = mocker.patch("clickshot.element.retry_with_timeout")
 
         element = Element(ElementConfig(name="my_element"), region)
@@ -59,10 +73,12 @@ class TestClick:
 
         element.click()
 
-        retry_with_timeout.assert_called_with(mocker.ANY, 30, log=mocker.ANY)
+        retry_with_timeout.assert_called_with(
+            mocker.ANY, 30, log=mocker.ANY, policy=mocker.ANY, stats=mocker.ANY
+        )
 
     def test_custom_timeout_can_be_set(self, mocker, region):
-        mocker.patch("clickshot.element.Mouse")
+        mocker.patch("clickshot.mouse.Mouse")
         retry_with_timeout = mocker.patch("clickshot.element.retry_with_timeout")
 
         element = Element(ElementConfig(name="my_element"), region)
@@ -70,10 +86,12 @@ class TestClick:
 
         element.click(timeout_seconds=50)
 
-        retry_with_timeout.assert_called_with(mocker.ANY, 50, log=mocker.ANY)
+        retry_with_timeout.assert_called_with(
+            mocker.ANY, 50, log=mocker.ANY, policy=mocker.ANY, stats=mocker.ANY
+        )
 
     def test_screenshot_saved_if_element_not_found(self, mocker, region):
-        mocker.patch("clickshot.element.Mouse")
+        mocker.patch("clickshot.mouse.Mouse")
         retry_with_timeout = mocker.patch("clickshot.element.retry_with_timeout")
         retry_with_timeout.side_effect = ElementNotFoundError()
 
@@ -86,7 +104,7 @@ class TestClick:
         element.save_last_screenshot.assert_called()
 
     def test_screenshot_saved_if_image_file_not_found(self, mocker, region):
-        mocker.patch("clickshot.element.Mouse")
+        mocker.patch("clickshot.mouse.Mouse")
         retry_with_timeout = mocker.patch("clickshot.element.retry_with_timeout")
         retry_with_timeout.side_effect = FileNotFoundError()
 
@@ -99,7 +117,7 @@ class TestClick:
         element.save_last_screenshot.assert_called()
 
     def test_click_offset_is_applied(self, mocker, region):
-        Mouse = mocker.patch("clickshot.element.Mouse")
+        Mouse = mocker.patch("clickshot.mouse.Mouse")
         Locater = mocker.patch("clickshot.element.Locater")
         Locater().locate.return_value = Rect(left=0, top=15, width=10, height=20)
 
@@ -112,7 +130,7 @@ class TestClick:
         Mouse().click.assert_called_with(button=Button.left, count=1)
 
     def test_click_parameters_are_applied(self, mocker, region):
-        Mouse = mocker.patch("clickshot.element.Mouse")
+        Mouse = mocker.patch("clickshot.mouse.Mouse")
         Locater = mocker.patch("clickshot.element.Locater")
         Locater().locate.return_value = Rect(left=0, top=15, width=10, height=20)
 
@@ -125,7 +143,7 @@ class TestClick:
         Mouse().click.assert_called_with(button=Button.right, count=2)
 
     def test_failsafe_aborts_click_attempt(self, mocker, region):
-        Mouse = mocker.patch("clickshot.element.Mouse")
+        Mouse = mocker.patch("clickshot.mouse.Mouse")
         position_mock = mocker.PropertyMock(return_value=(0, 0))
         type(Mouse()).position = position_mock
 
@@ -140,7 +158,7 @@ class TestClick:
                 element.click()
 
     def test_mouse_is_moved_away_from_failsafe(self, mocker, region):
-        Mouse = mocker.patch("clickshot.element.Mouse")
+        Mouse = mocker.patch("clickshot.mouse.Mouse")
         position_mock = mocker.PropertyMock(return_value=(0, 0))
         type(Mouse()).position = position_mock
 
@@ -155,7 +173,7 @@ class TestClick:
 
 class TestIsVisible:
     def test_returns_true_if_element_is_found(self, mocker, region):
-        mocker.patch("clickshot.element.Mouse")
+        mocker.patch("clickshot.mouse.Mouse")
         Locater = mocker.patch("clickshot.element.Locater")
         Locater().locate.return_value = Rect(left=0, top=15, width=10, height=20)
         element = Element(ElementConfig(name="my_element"), region)
@@ -164,11 +182,14 @@ class TestIsVisible:
 
         assert_that(result, is_(True))
         Locater().locate.assert_called_with(
-            Path("images/my_region-my_element.png"), region._boundary
+            Path("images/my_region-my_element.png"),
+            region._boundary,
+            shared_frame=False,
+            since=mocker.ANY,
         )
 
     def test_returns_false_if_element_not_found(self, mocker, region):
-        mocker.patch("clickshot.element.Mouse")
+        mocker.patch("clickshot.mouse.Mouse")
         retry_with_timeout = mocker.patch("clickshot.element.retry_with_timeout")
         retry_with_timeout.side_effect = ElementNotFoundError()
         element = Element(ElementConfig(name="my_element"), region)
@@ -178,25 +199,29 @@ class TestIsVisible:
         assert_that(result, is_(False))
 
     def test_default_timeout_is_0(self, mocker, region):
-        mocker.patch("clickshot.element.Mouse")
+        mocker.patch("clickshot.mouse.Mouse")
         retry_with_timeout = mocker.patch("clickshot.element.retry_with_timeout")
         element = Element(ElementConfig(name="my_element"), region)
 
         element.is_visible()
 
-        retry_with_timeout.assert_called_with(mocker.ANY, 0, log=mocker.ANY)
+        retry_with_timeout.assert_called_with(
+            mocker.ANY, 0, log=mocker.ANY, policy=mocker.ANY, stats=mocker.ANY
+        )
 
     def test_custom_timeout_can_be_set(self, mocker, region):
-        mocker.patch("clickshot.element.Mouse")
+        mocker.patch("clickshot.mouse.Mouse")
         retry_with_timeout = mocker.patch("clickshot.element.retry_with_timeout")
         element = Element(ElementConfig(name="my_element"), region)
 
         element.is_visible(timeout_seconds=15)
 
-        retry_with_timeout.assert_called_with(mocker.ANY, 15, log=mocker.ANY)
+        retry_with_timeout.assert_called_with(
+            mocker.ANY, 15, log=mocker.ANY, policy=mocker.ANY, stats=mocker.ANY
+        )
 
     def test_failsafe_aborts_is_visible_attempt(self, mocker, region):
-        Mouse = mocker.patch("clickshot.element.Mouse")
+        Mouse = mocker.patch("clickshot.mouse.Mouse")
         position_mock = mocker.PropertyMock(return_value=(0, 0))
         type(Mouse()).position = position_mock
 
@@ -211,7 +236,7 @@ class TestIsVisible:
         assert_that(result, is_(False))
 
     def test_mouse_is_moved_away_from_failsafe(self, mocker, region):
-        Mouse = mocker.patch("clickshot.element.Mouse")
+        Mouse = mocker.patch("clickshot.mouse.Mouse")
         position_mock = mocker.PropertyMock(return_value=(0, 0))
         type(Mouse()).position = position_mock
 
@@ -227,7 +252,7 @@ class TestIsVisible:
 
 class TestWaitUntilVisible:
     def test_returns_if_element_found(self, mocker, region):
-        mocker.patch("clickshot.element.Mouse")
+        mocker.patch("clickshot.mouse.Mouse")
         Locater = mocker.patch("clickshot.element.Locater")
         Locater().locate.return_value = Rect(left=0, top=15, width=10, height=20)
         element = Element(ElementConfig(name="my_element"), region)
@@ -235,11 +260,14 @@ class TestWaitUntilVisible:
         element.wait_until_visible()
 
         Locater().locate.assert_called_with(
-            Path("images/my_region-my_element.png"), region._boundary
+            Path("images/my_region-my_element.png"),
+            region._boundary,
+            shared_frame=False,
+            since=mocker.ANY,
         )
 
     def test_exception_raised_if_element_not_found(self, mocker, region):
-        mocker.patch("clickshot.element.Mouse")
+        mocker.patch("clickshot.mouse.Mouse")
         retry_with_timeout = mocker.patch("clickshot.element.retry_with_timeout")
         retry_with_timeout.side_effect = ElementNotFoundError()
         element = Element(ElementConfig(name="my_element"), region)
@@ -249,7 +277,7 @@ class TestWaitUntilVisible:
             element.wait_until_visible()
 
     def test_screenshot_saved_if_element_not_found(self, mocker, region):
-        mocker.patch("clickshot.element.Mouse")
+        mocker.patch("clickshot.mouse.Mouse")
         retry_with_timeout = mocker.patch("clickshot.element.retry_with_timeout")
         retry_with_timeout.side_effect = ElementNotFoundError()
         element = Element(ElementConfig(name="my_element"), region)
@@ -261,7 +289,7 @@ class TestWaitUntilVisible:
         element.save_last_screenshot.assert_called()
 
     def test_screenshot_saved_if_image_file_not_found(self, mocker, region):
-        mocker.patch("clickshot.element.Mouse")
+        mocker.patch("clickshot.mouse.Mouse")
         retry_with_timeout = mocker.patch("clickshot.element.retry_with_timeout")
         retry_with_timeout.side_effect = FileNotFoundError()
         element = Element(ElementConfig(name="my_element"), region)
@@ -273,22 +301,26 @@ class TestWaitUntilVisible:
         element.save_last_screenshot.assert_called()
 
     def test_default_timeout_is_30(self, mocker, region):
-        mocker.patch("clickshot.element.Mouse")
+        mocker.patch("clickshot.mouse.Mouse")
         retry_with_timeout = mocker.patch("clickshot.element.retry_with_timeout")
         element = Element(ElementConfig(name="my_element"), region)
 
         element.wait_until_visible()
 
-        retry_with_timeout.assert_called_with(mocker.ANY, 30, log=mocker.ANY)
+        retry_with_timeout.assert_called_with(
+            mocker.ANY, 30, log=mocker.ANY, policy=mocker.ANY, stats=mocker.ANY
+        )
 
     def test_custom_timeout_can_be_set(self, mocker, region):
-        mocker.patch("clickshot.element.Mouse")
+        mocker.patch("clickshot.mouse.Mouse")
         retry_with_timeout = mocker.patch("clickshot.element.retry_with_timeout")
         element = Element(ElementConfig(name="my_element"), region)
 
         element.wait_until_visible(timeout_seconds=15)
 
-        retry_with_timeout.assert_called_with(mocker.ANY, 15, log=mocker.ANY)
+        retry_with_timeout.assert_called_with(
+            mocker.ANY, 15, log=mocker.ANY, policy=mocker.ANY, stats=mocker.ANY
+        )
 
 
 class TestSaveLastScreenshot:
@@ -296,12 +328,15 @@ class TestSaveLastScreenshot:
         screenshot = mock.Mock()
         Locater = mocker.patch("clickshot.element.Locater")
         Locater().last_screenshot = screenshot
-        screenshot.save.return_value = "screenshots/my_region-my-element.png"
+        artifact_writer = mocker.patch("clickshot.element.artifact_writer")
+        artifact_writer.save.return_value = "screenshots/my_region-my-element.png"
 
         element = Element(ElementConfig(name="my_element"), region)
         element.save_last_screenshot()
 
-        screenshot.save.assert_called_with(Path("screenshots/my_region-my_element.png"))
+        artifact_writer.save.assert_called_with(
+            screenshot, Path("screenshots/my_region-my_element.png"), 1
+        )
 
         stdout = capsys.readouterr().out
         assert_that(
@@ -312,6 +347,18 @@ class TestSaveLastScreenshot:
             contains_string("Screenshot: screenshots/my_region-my-element.png\n"),
         )
 
+    def test_format_can_be_given_without_dot(self, mocker, config, region):
+        config.screenshot_format = "bmp"
+        mocker.patch("clickshot.element.Locater")
+        artifact_writer = mocker.patch("clickshot.element.artifact_writer")
+
+        element = Element(ElementConfig(name="my_element"), region)
+        element.save_last_screenshot()
+
+        artifact_writer.save.assert_called_with(
+            mocker.ANY, Path("screenshots/my_region-my_element.bmp"), 1
+        )
+
     def test_screenshot_not_saved_if_it_is_none(self, mocker, region):
         Locater = mocker.patch("clickshot.element.Locater")
         Locater().last_screenshot = None
@@ -325,3 +372,240 @@ class TestStr:
         element = Element(ElementConfig(name="my_element"), region)
 
         assert_that(str(element), is_("<Element name='my_element'>"))
+
+
+class TestHintStats:
+    def test_hint_stats_come_from_locater(self, mocker, region):
+        Locater = mocker.patch("clickshot.element.Locater")
+
+        element = Element(ElementConfig(name="my_element"), region)
+
+        assert_that(element.hint_stats, is_(Locater().hint_stats))
+
+
+class TestPollPolicy:
+    def test_poll_policy_is_passed_to_retry(self, mocker, config, region):
+        mocker.patch("clickshot.mouse.Mouse")
+        retry_with_timeout = mocker.patch("clickshot.element.retry_with_timeout")
+        config.poll_policy = PollPolicy(interval_seconds=0.5)
+        element = Element(ElementConfig(name="my_element"), region)
+
+        element.is_visible()
+
+        retry_with_timeout.assert_called_with(
+            mocker.ANY,
+            0,
+            log=mocker.ANY,
+            policy=PollPolicy(interval_seconds=0.5),
+            stats=element.last_retry_stats,
+        )
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestLocateAll:
+    def test_returns_every_location(self, mocker, region):
+        mocker.patch("clickshot.mouse.Mouse")
+        Locater = mocker.patch("clickshot.element.Locater")
+        rects = [Rect(left=0, top=15, width=10, height=20), Rect(30, 15, 10, 20)]
+        Locater().locate_occurrences.return_value = rects
+        element = Element(ElementConfig(name="my_element"), region)
+
+        result = element.locate_all()
+
+        assert_that(result, is_(rects))
+        Locater().locate_occurrences.assert_called_with(
+            Path("images/my_region-my_element.png"), region._boundary
+        )
+
+    def test_waits_for_first_location(self, mocker, region):
+        mocker.patch("clickshot.mouse.Mouse")
+        Locater = mocker.patch("clickshot.element.Locater")
+        Locater().locate_occurrences.side_effect = [[], [Rect(0, 15, 10, 20)]]
+        element = Element(ElementConfig(name="my_element"), region)
+
+        result = element.locate_all(timeout_seconds=10)
+
+        assert_that(result, is_([Rect(0, 15, 10, 20)]))
+
+    def test_returns_empty_list_if_element_not_found(self, mocker, region):
+        mocker.patch("clickshot.mouse.Mouse")
+        Locater = mocker.patch("clickshot.element.Locater")
+        Locater().locate_occurrences.return_value = []
+        element = Element(ElementConfig(name="my_element"), region)
+
+        assert_that(element.locate_all(), is_([]))
+
+    def test_failsafe_aborts_locate_all(self, mocker, region):
+        Mouse = mocker.patch("clickshot.mouse.Mouse")
+        Locater = mocker.patch("clickshot.element.Locater")
+        Locater().locate_occurrences.return_value = []
+        element = Element(ElementConfig(name="my_element"), region)
+        Mouse().position = (0, 0)
+        element._move_away_from_failsafe = mocker.Mock()
+
+        with pytest.warns(UserWarning, match="Aborted"):
+            result = element.locate_all(timeout_seconds=10)
+
+        assert_that(result, is_([]))
+        Locater().locate_occurrences.assert_called_once()
+
+
+class TestSince:
+    def test_wait_searches_frames_since_it_started(self, mocker, region):
+        mocker.patch("clickshot.mouse.Mouse")
+        mocker.patch("clickshot.element.time").monotonic.return_value = 12.5
+        Locater = mocker.patch("clickshot.element.Locater")
+        Locater().locate.return_value = Rect(left=0, top=15, width=10, height=20)
+        element = Element(ElementConfig(name="my_element"), region)
+
+        element.wait_until_visible()
+
+        assert_that(Locater().locate.call_args[1]["since"], is_(12.5))
+
+    def test_click_only_searches_latest_frame(self, mocker, region):
+        mocker.patch("clickshot.mouse.Mouse")
+        Locater = mocker.patch("clickshot.element.Locater")
+        Locater().locate.return_value = Rect(left=0, top=15, width=10, height=20)
+        element = Element(ElementConfig(name="my_element"), region)
+
+        element.click()
+
+        assert_that(Locater().locate.call_args[1]["since"], is_(None))
+
+
+class TestMetrics:
+    def test_found_wait_is_recorded(self, mocker, region, registry):
+        mocker.patch("clickshot.mouse.Mouse")
+        Locater = mocker.patch("clickshot.element.Locater")
+        Locater().locate.side_effect = [
+            ElementNotFoundError,
+            Rect(left=0, top=15, width=10, height=20),
+        ]
+        element = Element(ElementConfig(name="my_element"), region)
+
+        element.wait_until_visible()
+
+        assert_that(registry.counters, is_({"waits_total": 1.0}))
+        assert_that(registry.histograms["wait_attempts"].sum, is_(2))
+        assert_that(registry.histograms["time_to_found_seconds"].count, is_(1))
+
+    def test_timed_out_wait_is_recorded(self, mocker, region, registry):
+        mocker.patch("clickshot.mouse.Mouse")
+        Locater = mocker.patch("clickshot.element.Locater")
+        Locater().locate.side_effect = ElementNotFoundError
+        element = Element(ElementConfig(name="my_element"), region)
+
+        assert_that(element.is_visible(), is_(False))
+
+        assert_that(
+            registry.counters, is_({"waits_total": 1.0, "waits_timed_out_total": 1.0})
+        )
+        assert_that(registry.histograms["wait_attempts"].sum, is_(1))
+        assert_that("time_to_found_seconds" in registry.histograms, is_(False))
+
+    def test_mouse_action_is_timed(self, mocker, region, registry):
+        mocker.patch("clickshot.mouse.Mouse")
+        Locater = mocker.patch("clickshot.element.Locater")
+        Locater().locate.return_value = Rect(left=0, top=15, width=10, height=20)
+        element = Element(ElementConfig(name="my_element"), region)
+
+        element.click()
+
+        assert_that(registry.histograms["mouse_seconds"].count, is_(1))
+
+
+class TestAsync:
+    def test_element_is_clicked(self, mocker, region):
+        Mouse = mocker.patch("clickshot.mouse.Mouse")
+        Locater = mocker.patch("clickshot.element.Locater")
+        Locater().locate.return_value = Rect(left=0, top=15, width=10, height=20)
+        element = Element(ElementConfig(name="my_element"), region)
+
+        run(element.click_async(button=Button.right, count=2))
+
+        assert_that(Mouse().position, is_((5, 25)))
+        Mouse().click.assert_called_with(button=Button.right, count=2)
+
+    def test_shared_frames_are_used(self, mocker, region):
+        mocker.patch("clickshot.mouse.Mouse")
+        Locater = mocker.patch("clickshot.element.Locater")
+        Locater().locate.return_value = Rect(left=0, top=15, width=10, height=20)
+        element = Element(ElementConfig(name="my_element"), region)
+
+        result = run(element.is_visible_async())
+
+        assert_that(result, is_(True))
+        Locater().locate.assert_called_with(
+            Path("images/my_region-my_element.png"),
+            region._boundary,
+            shared_frame=True,
+            since=mocker.ANY,
+        )
+
+    def test_is_visible_returns_false_if_element_not_found(self, mocker, region):
+        mocker.patch("clickshot.mouse.Mouse")
+        Locater = mocker.patch("clickshot.element.Locater")
+        Locater().locate.side_effect = ElementNotFoundError()
+        element = Element(ElementConfig(name="my_element"), region)
+
+        result = run(element.is_visible_async())
+
+        assert_that(result, is_(False))
+
+    def test_screenshot_saved_if_element_not_found(self, mocker, region):
+        mocker.patch("clickshot.mouse.Mouse")
+        retry = mocker.patch("clickshot.element.retry_with_timeout_async")
+        retry.side_effect = ElementNotFoundError()
+        element = Element(ElementConfig(name="my_element"), region)
+        element.save_last_screenshot = mocker.Mock()
+
+        with pytest.raises(ElementNotFoundError):
+            run(element.wait_until_visible_async())
+
+        element.save_last_screenshot.assert_called()
+        retry.assert_called_with(
+            mocker.ANY, 30, policy=mocker.ANY, stats=element.last_retry_stats
+        )
+
+    def test_screenshot_not_saved_if_cancelled(self, mocker, region):
+        mocker.patch("clickshot.mouse.Mouse")
+        Locater = mocker.patch("clickshot.element.Locater")
+        Locater().locate.side_effect = ElementNotFoundError()
+        element = Element(ElementConfig(name="my_element"), region)
+        element.save_last_screenshot = mocker.Mock()
+
+        async def cancel_wait():
+            task = asyncio.ensure_future(element.wait_until_visible_async())
+            await asyncio.sleep(0.1)
+            task.cancel()
+            await task
+
+        with pytest.raises(asyncio.CancelledError):
+            run(cancel_wait())
+
+        element.save_last_screenshot.assert_not_called()
+
+
+class TestGrayscale:
+    def test_element_can_override_grayscale(self, mocker):
+        Locater = mocker.patch("clickshot.element.Locater")
+        region = Region("my_region", Config(image_dir="images", grayscale=False))
+
+        Element(ElementConfig(name="my_element", grayscale=True), region)
+
+        assert_that(Locater.call_args[0][0].grayscale, is_(True))
+
+    def test_element_uses_region_grayscale_by_default(self, mocker):
+        Locater = mocker.patch("clickshot.element.Locater")
+        region = Region("my_region", Config(image_dir="images", grayscale=True))
+
+        Element(ElementConfig(name="my_element"), region)
+
+        assert_that(Locater.call_args[0][0].grayscale, is_(True))
@@ -0,0 +1,188 @@
+import cv2
+from hamcrest import assert_that, is_, is_not, same_instance
+import numpy
+import pytest
+
+from clickshot import fft
+
+
+@pytest.fixture
+def screen():
+    random = numpy.random.RandomState(0)
+    noise = random.randint(0, 256, (30, 40, 3)).astype(numpy.uint8)
+    return cv2.resize(noise, (320, 240), interpolation=cv2.INTER_LINEAR)
+
+
+class Template:
+    def __init__(self, data):
+        self.data = data
+
+
+class TestMatch:
+    @pytest.mark.parametrize("grayscale", [False, True])
+    def test_result_is_same_as_opencv(self, screen, grayscale):
+        if grayscale:
+            screen = cv2.cvtColor(screen, cv2.COLOR_BGR2GRAY)
+        template = screen[77:113, 123:163].copy()
+
+        result = fft.match(screen, fft.template_spectrum(template, screen.shape))
+
+        expected = cv2.matchTemplate(screen, template, cv2.TM_SQDIFF_NORMED)
+        assert_that(result.shape, is_(expected.shape))
+        numpy.testing.assert_allclose(result, expected, atol=1e-5)
+        assert_that(cv2.minMaxLoc(result)[2], is_((123, 77)))
+
+    def test_big_windows_do_not_overflow(self, screen):
+        template = screen[10:230, 10:310].copy()
+
+        result = fft.match(screen, fft.template_spectrum(template, screen.shape))
+
+        expected = cv2.matchTemplate(screen, template, cv2.TM_SQDIFF_NORMED)
+        numpy.testing.assert_allclose(result, expected, atol=1e-5)
+
+    def test_windows_without_contrast_score_one(self, screen):
+        screen[:50, :60] = 0
+        template = screen[100:120, 100:130].copy()
+
+        result = fft.match(screen, fft.template_spectrum(template, screen.shape))
+
+        assert_that(result[0, 0], is_(1.0))
+
+    def test_scores_are_not_negative(self, screen):
+        # Rounding errors put this exact match slightly below 0
+        template = screen[:10, :10].copy()
+
+        result = fft.match(screen, fft.template_spectrum(template, screen.shape))
+
+        assert_that(result[0, 0], is_(0.0))
+        assert_that(result.min(), is_(0.0))
+
+    def test_norm_can_be_provided(self, screen):
+        template = screen[77:113, 123:163]
+
+        spectrum = fft.template_spectrum(template, screen.shape, norm=12.5)
+
+        assert_that(spectrum.norm, is_(12.5))
+
+
+class TestSpectrumCache:
+    def test_spectrum_is_reused_for_same_template_and_size(self, screen):
+        cache = fft.SpectrumCache()
+        template = Template(screen[77:113, 123:163])
+
+        first = cache.get(template, template.data, screen.shape)
+        second = cache.get(template, template.data, screen.shape)
+
+        assert_that(second, is_(same_instance(first)))
+        assert_that((cache.hits, cache.misses), is_((1, 1)))
+
+    def test_spectrum_depends_on_image_size(self, screen):
+        cache = fft.SpectrumCache()
+        template = Template(screen[77:113, 123:163])
+
+        first = cache.get(template, template.data, screen.shape)
+        second = cache.get(template, template.data, (100, 100, 3))
+
+        assert_that(second, is_not(same_instance(first)))
+
+    def test_images_with_same_padded_size_share_spectra(self, screen):
+        cache = fft.SpectrumCache()
+        template = Template(screen[77:113, 123:163])
+
+        first = cache.get(template, template.data, (239, 319, 3))
+        second = cache.get(template, template.data, screen.shape)
+
+        assert_that(second, is_(same_instance(first)))
+
+    def test_least_recently_used_spectra_are_dropped(self, screen):
+        spectrum_bytes = fft.template_spectrum(screen[:10, :10], screen.shape).nbytes
+        cache = fft.SpectrumCache(max_bytes=2 * spectrum_bytes)
+        first, second, third = [
+            Template(screen[i:i + 10, i:i + 10]) for i in (0, 10, 20)
+        ]
+
+        cache.get(first, first.data, screen.shape)
+        cache.get(second, second.data, screen.shape)
+        cache.get(first, first.data, screen.shape)
+        cache.get(third, third.data, screen.shape)
+        cache.get(first, first.data, screen.shape)
+        cache.get(second, second.data, screen.shape)
+
+        assert_that((cache.hits, cache.misses), is_((2, 4)))
+        assert_that(cache.nbytes, is_(2 * spectrum_bytes))
+
+    def test_spectra_bigger_than_limit_are_not_kept(self, screen):
+        cache = fft.SpectrumCache(max_bytes=1000)
+        template = Template(screen[:10, :10])
+
+        cache.get(template, template.data, screen.shape)
+        cache.get(template, template.data, screen.shape)
+
+        assert_that((cache.hits, cache.misses), is_((0, 2)))
+        assert_that(cache.nbytes, is_(0))
+
+    def test_spectra_of_a_dozen_templates_in_a_720p_region_are_kept(self):
+        cache = fft.SpectrumCache()
+        templates = [
+            Template(numpy.full((20, 30, 3), i, numpy.uint8)) for i in range(12)
+        ]
+
+        for _ in range(2):
+            for template in templates:
+                cache.get(template, template.data, (720, 1280, 3))
+
+        assert_that((cache.hits, cache.misses), is_((12, 12)))
+
+    def test_caches_are_shared_by_limit(self):
+        default = fft.shared_cache(fft.MAX_CACHED_BYTES)
+
+        assert_that(default, is_(same_instance(fft.spectrum_cache)))
+        assert_that(fft.shared_cache(1000), is_(same_instance(fft.shared_cache(1000))))
+        assert_that(fft.shared_cache(1000).max_bytes, is_(1000))
+
+
+class TestImageSpectra:
+    def test_spectra_are_reused_for_same_image(self, mocker, screen):
+        cache = fft.SpectrumCache()
+        image = Template(screen)
+        spectrum = fft.template_spectrum(screen[:10, :10], screen.shape)
+        channel_spectra = mocker.spy(fft, "channel_spectra")
+
+        first = cache.image_spectra(image, image.data, spectrum)
+        second = cache.image_spectra(image, image.data, spectrum)
+
+        assert_that(second, is_(same_instance(first)))
+        channel_spectra.assert_called_once()
+
+    def test_image_spectra_count_towards_limit(self, screen):
+        template = Template(screen[:10, :10])
+        spectrum = fft.template_spectrum(template.data, screen.shape)
+        cache = fft.SpectrumCache(max_bytes=spectrum.nbytes)
+        image = Template(screen)
+
+        cache.get(template, template.data, screen.shape)
+        cache.image_spectra(image, image.data, spectrum)
+        cache.get(template, template.data, screen.shape)
+
+        assert_that(cache.misses, is_(2))
+        assert_that(cache.nbytes, is_(spectrum.nbytes))
+
+    def test_spectra_are_calculated_for_new_image(self, screen):
+        cache = fft.SpectrumCache()
+        first = Template(screen)
+        second = Template(screen.copy())
+        spectrum = fft.template_spectrum(screen[:10, :10], screen.shape)
+
+        first_spectra = cache.image_spectra(first, first.data, spectrum)
+        second_spectra = cache.image_spectra(second, second.data, spectrum)
+
+        assert_that(second_spectra, is_not(same_instance(first_spectra)))
+
+    def test_given_spectra_match_like_calculated_ones(self, screen):
+        template = screen[77:113, 123:163].copy()
+        spectrum = fft.template_spectrum(template, screen.shape)
+        channels = fft.channel_spectra(screen, spectrum.dft_shape)
+
+        result = fft.match(screen, spectrum, channels)
+
+        numpy.testing.assert_allclose(result, fft.match(screen, spectrum))
@@ -1,7 +1,12 @@
+import cv2
 from hamcrest import assert_that, is_
+import itertools
+import numpy
 from pathlib import Path
 import pytest
 
+from clickshot import ElementNotFoundError, Rect
+from clickshot import image
 from clickshot.image import Image
 
 
@@ -68,3 +73,226 @@ class TestSave:
 
         assert_that(path, is_(Path("/dir/image_name_3.png")))
         cv2.imwrite.assert_called_with("/dir/image_name_3.png", mocker.ANY)
+
+
+class TestToGrayscale:
+    def test_image_is_converted_from_bgr(self):
+        image = Image(numpy.array([[[0, 0, 255], [255, 0, 0]]], numpy.uint8))
+
+        result = image.to_grayscale()
+
+        numpy.testing.assert_array_equal(result.data, [[76, 29]])
+
+
+class TestCrop:
+    def test_cropped_image_is_a_view(self):
+        image = Image(numpy.arange(4 * 5 * 3, dtype=numpy.uint8).reshape(4, 5, 3))
+
+        cropped = image.crop(Rect(left=1, top=2, width=3, height=2))
+
+        assert_that(cropped.width, is_(3))
+        assert_that(cropped.height, is_(2))
+        assert_that(numpy.shares_memory(cropped.data, image.data), is_(True))
+        numpy.testing.assert_array_equal(cropped.data, image.data[2:4, 1:4])
+
+
+@pytest.fixture
+def screen():
+    # Smooth random image, so that downscaled copies still resemble each other
+    random = numpy.random.RandomState(0)
+    noise = random.randint(0, 256, (30, 40, 3)).astype(numpy.uint8)
+    return Image(cv2.resize(noise, (320, 240), interpolation=cv2.INTER_LINEAR))
+
+
+class TestMatchTemplate:
+    @pytest.mark.parametrize("pyramid_levels", [0, 1, 2])
+    def test_template_is_found(self, screen, pyramid_levels):
+        template = screen.crop(Rect(left=123, top=77, width=40, height=36))
+
+        result = screen.match_template(template, pyramid_levels=pyramid_levels)
+
+        assert_that(result, is_(Rect(left=123, top=77, width=40, height=36)))
+
+    @pytest.mark.parametrize("pyramid_levels", [0, 1, 2])
+    def test_raises_error_if_template_not_found(self, screen, pyramid_levels):
+        template = Image(numpy.zeros((36, 40, 3), numpy.uint8))
+
+        with pytest.raises(ElementNotFoundError):
+            screen.match_template(template, pyramid_levels=pyramid_levels)
+
+    @pytest.mark.parametrize("workers", [2, 3, 8])
+    def test_parallel_match_is_identical(self, screen, workers):
+        template = screen.crop(Rect(left=123, top=77, width=40, height=36))
+
+        result = screen.match_template(template, workers=workers)
+
+        assert_that(result, is_(Rect(left=123, top=77, width=40, height=36)))
+
+    @pytest.mark.parametrize("top", [0, 100, 203])
+    def test_parallel_match_covers_band_edges(self, screen, top):
+        template = screen.crop(Rect(left=50, top=top, width=40, height=37))
+
+        result = screen.match_template(template, workers=4)
+
+        assert_that(result, is_(Rect(left=50, top=top, width=40, height=37)))
+
+    def test_parallel_match_uses_first_of_equal_matches(self, screen):
+        data = numpy.full((200, 100, 3), 50, numpy.uint8)
+        data[20:30, 10:20] = 200
+        data[150:160, 10:20] = 200
+        template = Image(data[20:30, 10:20].copy())
+
+        result = Image(data).match_template(template, workers=4)
+
+        assert_that(result, is_(Rect(left=10, top=20, width=10, height=10)))
+
+    def test_result_buffer_is_reused(self, screen):
+        template = screen.crop(Rect(left=123, top=77, width=40, height=36))
+        screen.match_template(template)
+        stats = image._get_result_pool().stats()
+
+        screen.match_template(template)
+
+        assert_that(image._get_result_pool().stats(), is_(stats))
+
+    def test_small_image_is_not_split(self, mocker, screen):
+        template = screen.crop(Rect(left=123, top=77, width=40, height=36))
+        small_screen = screen.crop(Rect(left=100, top=60, width=100, height=60))
+        ThreadPoolExecutor = mocker.patch("clickshot.image.futures.ThreadPoolExecutor")
+
+        result = small_screen.match_template(template, workers=4)
+
+        assert_that(result, is_(Rect(left=23, top=17, width=40, height=36)))
+        ThreadPoolExecutor.assert_not_called()
+
+    def test_small_template_is_matched_at_full_resolution(self, mocker, screen):
+        template = screen.crop(Rect(left=123, top=77, width=10, height=10))
+        resize = mocker.spy(cv2, "resize")
+
+        result = screen.match_template(template, pyramid_levels=2)
+
+        assert_that(result, is_(Rect(left=123, top=77, width=10, height=10)))
+        resize.assert_not_called()
+
+    def test_falls_back_to_full_search_if_coarse_search_fails(self, mocker, screen):
+        template = screen.crop(Rect(left=123, top=77, width=40, height=36))
+        mocker.patch.object(Image, "_match_coarse_to_fine").return_value = (
+            1.0,
+            (0, 0),
+        )
+
+        result = screen.match_template(template, pyramid_levels=2)
+
+        assert_that(result, is_(Rect(left=123, top=77, width=40, height=36)))
+
+
+class TestMatchEngine:
+    @pytest.mark.parametrize("engine", ["spatial", "fft"])
+    def test_engines_find_the_same_location(self, screen, engine):
+        template = screen.crop(Rect(left=123, top=77, width=40, height=36))
+
+        result = screen.match_template(template, engine=engine)
+
+        assert_that(result, is_(Rect(left=123, top=77, width=40, height=36)))
+
+    def test_auto_uses_fft_for_colour_templates(self, mocker, screen):
+        match = mocker.spy(image.fft, "match")
+
+        screen.match_template(screen.crop(Rect(left=12, top=7, width=8, height=8)))
+
+        match.assert_called_once()
+
+    def test_auto_uses_spatial_for_small_grayscale_templates(self, mocker, screen):
+        match = mocker.spy(image.fft, "match")
+        gray = screen.to_grayscale()
+
+        gray.match_template(gray.crop(Rect(left=12, top=7, width=40, height=36)))
+
+        match.assert_not_called()
+
+    def test_auto_uses_spatial_for_few_locations(self, mocker, screen):
+        match = mocker.spy(image.fft, "match")
+        window = screen.crop(Rect(left=100, top=70, width=70, height=50))
+
+        window.match_template(screen.crop(Rect(left=123, top=77, width=40, height=36)))
+
+        match.assert_not_called()
+
+    def test_image_is_transformed_once_for_several_templates(self, mocker, screen):
+        channel_spectra = mocker.spy(image.fft, "channel_spectra")
+        templates = [
+            Image(screen.data[top:top + 36, 123:163].copy()) for top in (7, 77)
+        ]
+
+        for template in templates:
+            screen.match_template(template, engine="fft")
+
+        # One call for each template, and one for the screen
+        assert_that(channel_spectra.call_count, is_(3))
+
+    def test_unknown_engine_is_rejected(self, screen):
+        template = screen.crop(Rect(left=123, top=77, width=40, height=36))
+
+        with pytest.raises(ValueError):
+            screen.match_template(template, engine="other")
+
+
+@pytest.fixture
+def tiled_screen():
+    random = numpy.random.RandomState(1)
+    icon = random.randint(0, 256, (10, 8, 3)).astype(numpy.uint8)
+    data = numpy.full((60, 80, 3), 30, numpy.uint8)
+    for top, left in [(40, 5), (5, 50), (5, 20)]:
+        data[top:top + 10, left:left + 8] = icon
+    return Image(data), Image(icon)
+
+
+class TestMatchTemplateAll:
+    def test_every_match_is_found_in_reading_order(self, tiled_screen):
+        screen, icon = tiled_screen
+
+        result = screen.match_template_all(icon)
+
+        assert_that(
+            result,
+            is_(
+                [
+                    Rect(left=20, top=5, width=8, height=10),
+                    Rect(left=50, top=5, width=8, height=10),
+                    Rect(left=5, top=40, width=8, height=10),
+                ]
+            ),
+        )
+
+    def test_overlapping_matches_are_collapsed(self, screen):
+        template = screen.crop(Rect(left=123, top=77, width=40, height=36))
+
+        result = screen.match_template_all(template, threshold=0.05)
+
+        assert_that(result, is_([Rect(left=123, top=77, width=40, height=36)]))
+
+    def test_overlapping_ties_are_collapsed(self):
+        screen = Image(numpy.zeros((20, 20, 3), numpy.uint8))
+        screen.data[5:15, 5:15] = 255
+        template = Image(numpy.full((4, 4, 3), 255, numpy.uint8))
+
+        result = screen.match_template_all(template)
+
+        assert_that(len(result) > 0, is_(True))
+        for first, second in itertools.combinations(result, 2):
+            assert_that(
+                abs(first.left - second.left) >= 4 or abs(first.top - second.top) >= 4,
+                is_(True),
+            )
+
+    def test_nothing_is_found_if_template_is_missing(self, tiled_screen):
+        screen, icon = tiled_screen
+
+        result = screen.match_template_all(Image(255 - icon.data))
+
+        assert_that(result, is_([]))
+
+    def test_nothing_is_found_if_template_is_larger(self, tiled_screen):
+        screen, icon = tiled_screen
+
+        assert_that(icon.match_template_all(screen), is_([]))
@@ -0,0 +1,46 @@
+import subprocess
+import sys
+
+from hamcrest import assert_that, is_, is_not, matches_regexp, same_instance
+
+from clickshot.lazy import lazy_import
+
+
+class TestLazyImport:
+    def test_module_is_imported_on_first_use(self):
+        module = lazy_import("json")
+
+        assert_that(module.dumps([1]), is_("[1]"))
+
+    def test_patching_only_affects_stand_in(self, mocker):
+        import json
+
+        module = lazy_import("json")
+        mocker.patch.object(module, "dumps", return_value="patched")
+
+        assert_that(module.dumps([1]), is_("patched"))
+        assert_that(json.dumps, is_not(same_instance(module.dumps)))
+
+
+class TestImportClickshot:
+    def test_slow_modules_are_not_imported(self):
+        script = (
+            "import sys, clickshot; "
+            "print(sorted({'cv2', 'numpy', 'mss', 'pynput', 'asyncio', "
+            "'pkg_resources', 'sqlite3'} & set(sys.modules)))"
+        )
+
+        output = subprocess.check_output([sys.executable, "-c", script])
+
+        assert_that(output.strip(), is_(b"[]"))
+
+    def test_version_is_available(self):
+        import clickshot
+
+        assert_that(clickshot.__version__, matches_regexp(r"^\d+\.\d+"))
+
+    def test_pynput_classes_are_imported_on_first_use(self):
+        import clickshot
+        from clickshot import mouse
+
+        assert_that(clickshot.Mouse, is_(same_instance(mouse.Mouse)))
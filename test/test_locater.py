@@ -1,49 +1,430 @@
-from hamcrest import assert_that, is_
+import time
+
+import cv2
+from hamcrest import assert_that, close_to, is_
+import numpy
 import pytest
 
-from clickshot import ElementNotFoundError, Rect
+from clickshot import Config, ElementNotFoundError, fft, Rect
+from clickshot.capture import Frame
+from clickshot.image import Image as RealImage
 from clickshot.locater import Locater
+from clickshot.screen_grabber import ScreenGrabber
+from clickshot.snapshot import frame_snapshot
+from clickshot.template_cache import TemplateCache
+from mss.screenshot import ScreenShot as PixelArray, Size
+
+
+@pytest.fixture
+def screen(mocker):
+    random = numpy.random.RandomState(0)
+    data = random.randint(0, 256, (200, 300, 3)).astype(numpy.uint8)
+    ScreenGrabber = mocker.patch("clickshot.locater.ScreenGrabber")
+    # A new image each grab, like the real grabber
+    ScreenGrabber().grab.side_effect = lambda rect: RealImage(data)
+    return data
+
+
+@pytest.fixture
+def template(mocker, screen):
+    template = RealImage(screen[50:60, 100:120].copy())
+    mocker.patch("clickshot.locater.template_cache").load.return_value = template
+    return template
 
 
 class TestLocate:
     def test_returns_location_if_element_is_found(self, mocker):
         Image = mocker.patch("clickshot.locater.Image")
         screenshot = Image("Screenshot")
+        screenshot.data = numpy.zeros((4, 3, 3), numpy.uint8)
         screenshot.match_template.return_value = Rect(left=4, top=5, width=6, height=7)
 
         ScreenGrabber = mocker.patch("clickshot.locater.ScreenGrabber")
         ScreenGrabber().grab.return_value = screenshot
 
         template = Image("Template")
-        Image.load.return_value = template
+        template_cache = mocker.patch("clickshot.locater.template_cache")
+        template_cache.load.return_value = template
 
         result = Locater().locate("image", Rect(left=1, top=2, width=3, height=4))
 
         assert_that(result, is_(Rect(left=4, top=5, width=6, height=7)))
         ScreenGrabber().grab.assert_called_with(Rect(left=1, top=2, width=3, height=4))
-        Image.load.assert_called_with("image")
-        screenshot.match_template.assert_called_with(template)
+        template_cache.load.assert_called_with("image", grayscale=False)
+        screenshot.match_template.assert_called_with(
+            template,
+            pyramid_levels=0,
+            workers=1,
+            engine="auto",
+            spectra=fft.spectrum_cache,
+        )
 
     def test_raises_error_if_element_is_not_found(self, mocker):
         Image = mocker.patch("clickshot.locater.Image")
         screenshot = Image("Screenshot")
+        screenshot.data = numpy.zeros((4, 3, 3), numpy.uint8)
         screenshot.match_template.side_effect = ElementNotFoundError
 
         ScreenGrabber = mocker.patch("clickshot.locater.ScreenGrabber")
         ScreenGrabber().grab.return_value = screenshot
+        mocker.patch("clickshot.locater.template_cache")
 
         with pytest.raises(ElementNotFoundError):
             Locater().locate("image", Rect(left=1, top=2, width=3, height=4))
 
-    def test_raises_error_if_image_file_doesnt_exist(self, mocker):
-        mocker.patch("clickshot.locater.ScreenGrabber")
-        Image = mocker.patch("clickshot.locater.Image")
-        Image.load.side_effect = FileNotFoundError
+    def test_raises_error_if_image_file_doesnt_exist(self, mocker, screen):
+        template_cache = mocker.patch("clickshot.locater.template_cache")
+        template_cache.load.side_effect = FileNotFoundError
 
         with pytest.raises(FileNotFoundError):
             Locater().locate("image", Rect(left=1, top=2, width=3, height=4))
 
 
+class TestLocateOccurrences:
+    def test_every_occurrence_is_found(self, mocker, screen):
+        screen[150:160, 200:220] = screen[50:60, 100:120]
+        mocker.patch("clickshot.locater.template_cache").load.return_value = RealImage(
+            screen[50:60, 100:120].copy()
+        )
+
+        result = Locater().locate_occurrences("image", None)
+
+        assert_that(
+            result,
+            is_(
+                [
+                    Rect(left=100, top=50, width=20, height=10),
+                    Rect(left=200, top=150, width=20, height=10),
+                ]
+            ),
+        )
+
+
+class TestLocateAll:
+    def test_all_templates_are_matched_against_one_grab(self, mocker):
+        Image = mocker.patch("clickshot.locater.Image")
+        screenshot = Image("Screenshot")
+        screenshot.data = numpy.zeros((4, 3, 3), numpy.uint8)
+        screenshot.match_template.side_effect = [
+            Rect(left=4, top=5, width=6, height=7),
+            ElementNotFoundError,
+            Rect(left=8, top=9, width=10, height=11),
+        ]
+
+        ScreenGrabber = mocker.patch("clickshot.locater.ScreenGrabber")
+        ScreenGrabber().grab.return_value = screenshot
+        mocker.patch("clickshot.locater.template_cache")
+
+        result = Locater().locate_all(
+            ["image1", "image2", "image3"], Rect(left=1, top=2, width=3, height=4)
+        )
+
+        assert_that(
+            result,
+            is_(
+                {
+                    "image1": Rect(left=4, top=5, width=6, height=7),
+                    "image3": Rect(left=8, top=9, width=10, height=11),
+                }
+            ),
+        )
+        ScreenGrabber().grab.assert_called_once_with(
+            Rect(left=1, top=2, width=3, height=4)
+        )
+
+    def test_raises_error_if_image_file_doesnt_exist(self, mocker, screen):
+        template_cache = mocker.patch("clickshot.locater.template_cache")
+        template_cache.load.side_effect = FileNotFoundError
+
+        with pytest.raises(FileNotFoundError):
+            Locater().locate_all(["image"], Rect(left=1, top=2, width=3, height=4))
+
+
+class TestMatchOptions:
+    def test_match_options_are_configurable(self, mocker):
+        Image = mocker.patch("clickshot.locater.Image")
+        screenshot = Image("Screenshot")
+        screenshot.data = numpy.zeros((4, 3, 3), numpy.uint8)
+        ScreenGrabber = mocker.patch("clickshot.locater.ScreenGrabber")
+        ScreenGrabber().grab.return_value = screenshot
+        template_cache = mocker.patch("clickshot.locater.template_cache")
+
+        Locater(
+            Config(
+                match_pyramid_levels=2,
+                match_workers=4,
+                match_engine="fft",
+                spectrum_cache_bytes=1000,
+            )
+        ).locate("image", Rect(left=1, top=2, width=3, height=4))
+
+        screenshot.match_template.assert_called_with(
+            template_cache.load(),
+            pyramid_levels=2,
+            workers=4,
+            engine="fft",
+            spectra=fft.shared_cache(1000),
+        )
+        assert_that(fft.shared_cache(1000).max_bytes, is_(1000))
+
+
+class TestHint:
+    def test_search_starts_near_last_location(self, mocker, template):
+        locater = Locater(Config(hint_padding_pixels=5))
+        locater.locate("image", None)
+        match_template = mocker.spy(RealImage, "match_template")
+
+        result = locater.locate("image", None)
+
+        assert_that(result, is_(Rect(left=100, top=50, width=20, height=10)))
+        match_template.assert_called_once()
+        searched = match_template.call_args[0][0]
+        assert_that((searched.width, searched.height), is_((30, 20)))
+        assert_that(locater.hint_stats.hits, is_(1))
+        assert_that(locater.hint_stats.misses, is_(0))
+
+    def test_whole_region_is_searched_if_not_near_last_location(
+        self, mocker, screen, template
+    ):
+        locater = Locater(Config(hint_padding_pixels=5))
+        locater.locate("image", None)
+        screen[150:160, 200:220] = template.data
+        screen[50:60, 100:120] = 0
+
+        result = locater.locate("image", None)
+
+        assert_that(result, is_(Rect(left=200, top=150, width=20, height=10)))
+        assert_that(locater.hint_stats.hits, is_(0))
+        assert_that(locater.hint_stats.misses, is_(1))
+        assert_that(locater.hint_stats.hit_rate, is_(0.0))
+
+    def test_hint_can_be_disabled(self, mocker, template):
+        locater = Locater(Config(hint_padding_pixels=None))
+        locater.locate("image", None)
+        match_template = mocker.spy(RealImage, "match_template")
+
+        locater.locate("image", None)
+
+        searched = match_template.call_args[0][0]
+        assert_that((searched.width, searched.height), is_((300, 200)))
+        assert_that(locater.hint_stats.hit_rate, is_(0.0))
+
+
+class TestLocationCache:
+    @pytest.fixture
+    def config(self, tmp_path):
+        return Config(
+            hint_padding_pixels=5, location_cache_path=str(tmp_path / "locations.db")
+        )
+
+    @pytest.fixture
+    def image_path(self, tmp_path):
+        path = tmp_path / "region-element.png"
+        path.write_bytes(b"template")
+        return path
+
+    def test_first_search_starts_near_location_from_earlier_run(
+        self, mocker, template, config, image_path
+    ):
+        Locater(config).locate(image_path, None)
+        match_template = mocker.spy(RealImage, "match_template")
+
+        result = Locater(config).locate(image_path, None)
+
+        assert_that(result, is_(Rect(left=100, top=50, width=20, height=10)))
+        searched = match_template.call_args[0][0]
+        assert_that((searched.width, searched.height), is_((30, 20)))
+
+    def test_location_is_only_stored_when_it_changes(
+        self, mocker, template, config, image_path
+    ):
+        locater = Locater(config)
+        put = mocker.spy(locater._locations, "put")
+
+        locater.locate(image_path, None)
+        locater.locate(image_path, None)
+
+        put.assert_called_once()
+
+    def test_location_is_stored_for_each_boundary(
+        self, mocker, template, config, image_path
+    ):
+        Locater(config).locate(image_path, None)
+        match_template = mocker.spy(RealImage, "match_template")
+
+        Locater(config).locate(image_path, Rect(left=0, top=0, width=300, height=200))
+
+        searched = match_template.call_args[0][0]
+        assert_that((searched.width, searched.height), is_((300, 200)))
+
+    def test_cache_is_off_by_default(self, template):
+        assert_that(Locater()._locations, is_(None))
+
+
+class TestUnchangedFrames:
+    @pytest.fixture
+    def missing_template(self, mocker, screen):
+        template = RealImage(numpy.full((10, 20, 3), 7, numpy.uint8))
+        mocker.patch("clickshot.locater.template_cache").load.return_value = template
+        return template
+
+    def test_match_is_skipped_if_frame_is_unchanged(self, mocker, missing_template):
+        locater = Locater()
+        match_template = mocker.spy(RealImage, "match_template")
+
+        for _ in range(3):
+            with pytest.raises(ElementNotFoundError):
+                locater.locate("image", None)
+
+        match_template.assert_called_once()
+        assert_that(locater.skipped_matches, is_(2))
+
+    def test_template_is_matched_again_if_frame_changes(
+        self, mocker, screen, missing_template
+    ):
+        locater = Locater()
+        with pytest.raises(ElementNotFoundError):
+            locater.locate("image", None)
+
+        screen[50:60, 100:120] = 7
+        result = locater.locate("image", None)
+
+        assert_that(result, is_(Rect(left=100, top=50, width=20, height=10)))
+
+    def test_changes_in_crops_of_shared_frames_are_noticed(
+        self, mocker, missing_template
+    ):
+        frame = numpy.zeros((300, 400, 3), numpy.uint8)
+        ScreenGrabber = mocker.patch("clickshot.locater.ScreenGrabber")
+        ScreenGrabber().grab.side_effect = lambda rect: RealImage(frame[10:210, 10:310])
+        locater = Locater()
+        with pytest.raises(ElementNotFoundError):
+            locater.locate("image", None)
+
+        frame[60:70, 110:130] = 7
+        result = locater.locate("image", None)
+
+        assert_that(result, is_(Rect(left=100, top=50, width=20, height=10)))
+
+    def test_template_is_matched_again_if_template_changes(
+        self, mocker, missing_template
+    ):
+        template_cache = mocker.Mock()
+        template_cache.load.return_value = missing_template
+        locater = Locater(templates=template_cache)
+        with pytest.raises(ElementNotFoundError):
+            locater.locate("image", None)
+
+        template_cache.load.return_value = RealImage(missing_template.data.copy())
+        match_template = mocker.spy(RealImage, "match_template")
+        with pytest.raises(ElementNotFoundError):
+            locater.locate("image", None)
+
+        match_template.assert_called_once()
+
+    def test_skipping_can_be_disabled(self, mocker, missing_template):
+        locater = Locater(Config(skip_unchanged_frames=False))
+        match_template = mocker.spy(RealImage, "match_template")
+
+        for _ in range(3):
+            with pytest.raises(ElementNotFoundError):
+                locater.locate("image", None)
+
+        assert_that(match_template.call_count, is_(3))
+        assert_that(locater.skipped_matches, is_(0))
+
+
+class TestGrayscale:
+    @pytest.fixture
+    def red_template(self):
+        data = numpy.full((10, 20, 3), 255, numpy.uint8)
+        data[2:8, 2:18] = (0, 0, 255)
+        return RealImage(data)
+
+    @pytest.fixture
+    def grey_screen(self, mocker, red_template):
+        # Red and this grey look the same in grayscale
+        data = numpy.zeros((100, 100, 3), numpy.uint8)
+        data[40:50, 30:50] = 255
+        data[42:48, 32:48] = 76
+        ScreenGrabber = mocker.patch("clickshot.locater.ScreenGrabber")
+        ScreenGrabber().grab.return_value = RealImage(data)
+        return ScreenGrabber
+
+    @pytest.fixture
+    def templates(self, mocker, red_template):
+        templates = mocker.Mock()
+        templates.load.side_effect = (
+            lambda path, grayscale=False: red_template.to_grayscale()
+            if grayscale
+            else red_template
+        )
+        return templates
+
+    def test_grayscale_template_is_matched(self, mocker, template, templates):
+        templates.load.side_effect = (
+            lambda path, grayscale=False: template.to_grayscale()
+            if grayscale
+            else template
+        )
+        locater = Locater(Config(grayscale=True), templates=templates)
+
+        result = locater.locate("image", None)
+
+        assert_that(result, is_(Rect(left=100, top=50, width=20, height=10)))
+        templates.load.assert_any_call("image", grayscale=True)
+
+    def test_false_positive_is_rejected_by_colour_check(self, grey_screen, templates):
+        locater = Locater(Config(grayscale=True), templates=templates)
+
+        with pytest.raises(ElementNotFoundError):
+            locater.locate("image", None)
+
+    def test_colour_check_can_be_disabled(self, mocker, grey_screen, templates):
+        locater = Locater(
+            Config(grayscale=True, verify_colour=False), templates=templates
+        )
+
+        result = locater.locate("image", None)
+
+        assert_that(result, is_(Rect(left=30, top=40, width=20, height=10)))
+        grey_screen.assert_called_with(frame_ttl_seconds=0.0, grayscale=True)
+
+    def test_colour_check_is_applied_to_every_occurrence(
+        self, grey_screen, templates
+    ):
+        locater = Locater(Config(grayscale=True), templates=templates)
+
+        assert_that(locater.locate_occurrences("image", None), is_([]))
+
+    def test_screen_is_grabbed_in_colour_for_colour_check(self, grey_screen):
+        Locater(Config(grayscale=True))
+
+        grey_screen.assert_called_with(frame_ttl_seconds=0.0, grayscale=False)
+
+
+class TestTemplateCache:
+    def test_shared_template_cache_is_used_by_default(self, mocker, screen):
+        template_cache = mocker.patch("clickshot.locater.template_cache")
+        template_cache.load.return_value = RealImage(screen[:10, :10].copy())
+
+        Locater().locate("image", Rect(left=1, top=2, width=3, height=4))
+
+        template_cache.load.assert_called_with("image", grayscale=False)
+
+    def test_custom_template_cache_can_be_used(self, mocker, screen):
+        template_cache = mocker.patch("clickshot.locater.template_cache")
+        custom_cache = mocker.Mock()
+        custom_cache.load.return_value = RealImage(screen[:10, :10].copy())
+
+        Locater(templates=custom_cache).locate(
+            "image", Rect(left=1, top=2, width=3, height=4)
+        )
+
+        custom_cache.load.assert_called_with("image", grayscale=False)
+        template_cache.load.assert_not_called()
+
+
 class TestLastScreenshot:
     def test_last_screenshot_is_none_by_default(self):
         locater = Locater()
@@ -53,9 +434,11 @@ class TestLastScreenshot:
     def test_last_screenshot_is_updated_by_locate(self, mocker):
         Image = mocker.patch("clickshot.locater.Image")
         screenshot = Image("Screenshot")
+        screenshot.data = numpy.zeros((4, 3, 3), numpy.uint8)
 
         ScreenGrabber = mocker.patch("clickshot.locater.ScreenGrabber")
         ScreenGrabber().grab.return_value = screenshot
+        mocker.patch("clickshot.locater.template_cache")
 
         locater = Locater()
         locater.locate("image", Rect(left=1, top=2, width=3, height=4))
@@ -67,14 +450,159 @@ class TestLastScreenshot:
     ):
         Image = mocker.patch("clickshot.locater.Image")
         screenshot = Image("Screenshot")
+        screenshot.data = numpy.zeros((4, 3, 3), numpy.uint8)
 
         ScreenGrabber = mocker.patch("clickshot.locater.ScreenGrabber")
         ScreenGrabber().grab.return_value = screenshot
 
-        Image.load.side_effect = FileNotFoundError
+        template_cache = mocker.patch("clickshot.locater.template_cache")
+        template_cache.load.side_effect = FileNotFoundError
 
         locater = Locater()
         with pytest.raises(FileNotFoundError):
             locater.locate("image", Rect(left=1, top=2, width=3, height=4))
 
         assert_that(locater.last_screenshot, is_(screenshot))
+
+
+class TestCapture:
+    @pytest.fixture
+    def capture(self, mocker, screen):
+        mocker.patch("clickshot.locater.ScreenGrabber").return_value.crop_frame = (
+            lambda image, monitor, rect: image
+        )
+        return mocker.patch("clickshot.capture.acquire").return_value
+
+    @pytest.fixture
+    def blank(self):
+        return RealImage(numpy.zeros((200, 300, 3), numpy.uint8))
+
+    def test_capture_is_off_by_default(self, mocker, screen):
+        acquire = mocker.patch("clickshot.capture.acquire")
+
+        Locater()
+
+        acquire.assert_not_called()
+
+    def test_latest_frame_is_used_instead_of_grabbing(
+        self, mocker, capture, screen, template
+    ):
+        capture.latest.return_value = Frame(time.monotonic(), RealImage(screen), {})
+        locater = Locater(Config(capture_fps=10))
+
+        result = locater.locate("image", None)
+
+        assert_that(result, is_(Rect(left=100, top=50, width=20, height=10)))
+        locater._grabber.grab.assert_not_called()
+
+    def test_screen_is_grabbed_if_latest_frame_is_older_than_last_input(
+        self, mocker, capture, template, blank
+    ):
+        capture.latest.return_value = Frame(time.monotonic(), blank, {})
+        frame_snapshot.invalidate()
+        locater = Locater(Config(capture_fps=10))
+        locater._grabber.grab.return_value = RealImage(template.data)
+
+        result = locater.locate("image", None)
+
+        assert_that(result, is_(Rect(left=0, top=0, width=20, height=10)))
+        locater._grabber.grab.assert_called_once_with(None)
+
+    def test_wait_finds_element_in_earlier_frame(
+        self, capture, screen, template, blank
+    ):
+        capture.frames_since.return_value = [
+            Frame(1.0, RealImage(screen), {}),
+            Frame(2.0, blank, {}),
+        ]
+        locater = Locater(Config(capture_fps=10))
+
+        result = locater.locate("image", None, since=0.5)
+
+        assert_that(result, is_(Rect(left=100, top=50, width=20, height=10)))
+        capture.frames_since.assert_called_with(0.5)
+
+    def test_later_attempts_only_search_newer_frames(self, capture, template, blank):
+        capture.frames_since.return_value = [Frame(1.0, blank, {})]
+        locater = Locater(Config(capture_fps=10))
+
+        with pytest.raises(ElementNotFoundError):
+            locater.locate("image", None, since=0.5)
+        capture.frames_since.return_value = [Frame(2.0, blank, {})]
+        with pytest.raises(ElementNotFoundError):
+            locater.locate("image", None, since=0.5)
+
+        capture.frames_since.assert_called_with(1.0)
+
+    def test_close_releases_capture(self, mocker, capture):
+        release = mocker.patch("clickshot.capture.release")
+        locater = Locater(Config(capture_fps=10))
+
+        locater.close()
+
+        release.assert_called_once_with(capture)
+
+
+class TestMetrics:
+    def test_phases_are_timed(self, screen, template, registry):
+        Locater().locate("image", None)
+
+        for name in ["grab_seconds", "template_load_seconds", "match_seconds"]:
+            assert_that(registry.histograms[name].count, is_(1))
+
+    def test_match_score_is_recorded(self, screen, template, registry):
+        Locater().locate("image", None)
+
+        assert_that(registry.histograms["match_score"].max, is_(close_to(0, 1e-6)))
+
+
+class TestHiDPI:
+    # Renders a dialog at the given scale, as a HiDPI monitor would
+    @staticmethod
+    def render(scale):
+        screen = numpy.full((200 * scale, 300 * scale, 3), 240, numpy.uint8)
+        top_left = (100 * scale, 50 * scale)
+        bottom_right = (160 * scale, 75 * scale)
+        cv2.rectangle(screen, top_left, bottom_right, (200, 120, 0), -1)
+        cv2.putText(
+            screen,
+            "OK",
+            (115 * scale, 70 * scale),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.6 * scale,
+            (255, 255, 255),
+            scale,
+            cv2.LINE_AA,
+        )
+        return screen
+
+    @pytest.mark.parametrize(
+        "boundary", [None, Rect(left=81, top=30, width=120, height=60)]
+    )
+    @pytest.mark.parametrize("frame_ttl_seconds", [0.0, 10.0])
+    def test_template_cut_from_screenshot_is_found_on_hidpi_monitor(
+        self, mocker, tmp_path, boundary, frame_ttl_seconds
+    ):
+        frame_snapshot.invalidate()
+        native = self.render(2)
+        bgra = cv2.cvtColor(native, cv2.COLOR_BGR2BGRA)
+        mss = mocker.patch("clickshot.backend.mss.mss")
+        mss().monitors = [{"left": 0, "top": 0, "width": 300, "height": 200}]
+        mss().grab.side_effect = lambda monitor: PixelArray(
+            bgra.tobytes(), monitor, Size(600, 400)
+        )
+        # Templates are cut from screenshots, which are at the logical size
+        screenshot = ScreenGrabber().grab()
+        path = screenshot.crop(Rect(left=95, top=45, width=70, height=35)).save(
+            tmp_path / "button.png"
+        )
+
+        # Shared frames are kept at the native size, and only cropped parts are
+        # resized
+        config = Config(frame_ttl_seconds=frame_ttl_seconds)
+        locater = Locater(config, templates=TemplateCache())
+        result = locater.locate(path, boundary, shared_frame=True)
+
+        origin = boundary or Rect(left=0, top=0, width=300, height=200)
+        expected = Rect(left=95 - origin.left, top=45 - origin.top, width=70, height=35)
+        assert_that(result, is_(expected))
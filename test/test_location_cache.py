@@ -0,0 +1,128 @@
+import sqlite3
+
+from hamcrest import assert_that, is_, none
+import pytest
+
+from clickshot import location_cache, Rect
+from clickshot.location_cache import LocationCache
+
+
+@pytest.fixture
+def template(tmp_path):
+    path = tmp_path / "region-element.png"
+    path.write_bytes(b"template")
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = LocationCache(tmp_path / "locations.db")
+    yield cache
+    cache.close()
+
+
+RECT = Rect(left=1, top=2, width=3, height=4)
+
+
+class TestLocationCache:
+    def test_stored_location_is_returned(self, cache, template):
+        cache.put("region-element", template, "screen 300x200", RECT)
+
+        result = cache.get("region-element", template, "screen 300x200")
+
+        assert_that(result, is_(RECT))
+        assert_that((cache.hits, cache.misses), is_((1, 0)))
+
+    def test_locations_are_kept_across_processes(self, tmp_path, cache, template):
+        cache.put("region-element", template, "screen 300x200", RECT)
+
+        other = LocationCache(tmp_path / "locations.db")
+        result = other.get("region-element", template, "screen 300x200")
+        other.close()
+
+        assert_that(result, is_(RECT))
+
+    def test_location_depends_on_geometry(self, cache, template):
+        cache.put("region-element", template, "screen 300x200", RECT)
+
+        result = cache.get("region-element", template, "screen 600x400")
+
+        assert_that(result, is_(none()))
+        assert_that(cache.misses, is_(1))
+
+    def test_location_is_not_used_once_template_changes(self, cache, template):
+        cache.put("region-element", template, "screen 300x200", RECT)
+
+        template.write_bytes(b"edited template")
+
+        assert_that(
+            cache.get("region-element", template, "screen 300x200"), is_(none())
+        )
+
+    def test_locations_for_old_templates_are_replaced(self, cache, template):
+        cache.put("region-element", template, "screen 300x200", RECT)
+        template.write_bytes(b"edited template")
+
+        cache.put("region-element", template, "screen 300x200", RECT)
+
+        assert_that(len(cache), is_(1))
+
+    def test_missing_templates_are_not_stored(self, tmp_path, cache):
+        missing = tmp_path / "missing.png"
+
+        cache.put("missing", missing, "screen 300x200", RECT)
+
+        assert_that(len(cache), is_(0))
+        assert_that(cache.get("missing", missing, "screen 300x200"), is_(none()))
+
+    def test_least_recently_stored_locations_are_dropped(self, cache, template):
+        cache.max_entries = 2
+        for name in ["first", "second", "third"]:
+            cache.put(name, template, "screen 300x200", RECT)
+
+        assert_that(len(cache), is_(2))
+        assert_that(cache.get("first", template, "screen 300x200"), is_(none()))
+        assert_that(cache.get("third", template, "screen 300x200"), is_(RECT))
+
+    def test_database_uses_write_ahead_logging(self, tmp_path, cache):
+        connection = sqlite3.connect(str(tmp_path / "locations.db"))
+
+        mode = connection.execute("PRAGMA journal_mode").fetchone()[0]
+        connection.close()
+
+        assert_that(mode, is_("wal"))
+
+    def test_errors_are_warnings(self, cache, template):
+        cache.close()
+
+        with pytest.warns(UserWarning):
+            cache.put("region-element", template, "screen 300x200", RECT)
+        with pytest.warns(UserWarning):
+            result = cache.get("region-element", template, "screen 300x200")
+
+        assert_that(result, is_(none()))
+
+
+class TestOpenCache:
+    def test_cache_is_shared(self, tmp_path):
+        first = location_cache.open_cache(tmp_path / "locations.db")
+
+        second = location_cache.open_cache(tmp_path / "locations.db")
+
+        assert_that(second, is_(first))
+
+    def test_none_is_returned_if_cache_cant_be_opened(self, tmp_path):
+        (tmp_path / "file").write_text("")
+
+        with pytest.warns(UserWarning):
+            cache = location_cache.open_cache(tmp_path / "file" / "locations.db")
+
+        assert_that(cache, is_(none()))
+
+
+class TestGeometry:
+    def test_geometry_describes_boundary_and_size(self):
+        boundary = Rect(left=10, top=20, width=150, height=100)
+
+        assert_that(location_cache.geometry(boundary, 300, 200), is_("10,20 300x200"))
+        assert_that(location_cache.geometry(None, 300, 200), is_("screen 300x200"))
@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+
+from hamcrest import assert_that, contains_string, has_entries, is_
+import pytest
+
+from clickshot.metrics import (
+    CallbackSink,
+    Histogram,
+    Metrics,
+    MetricsRegistry,
+    PrometheusFileSink,
+)
+
+
+class TestHistogram:
+    def test_values_are_counted_in_buckets(self):
+        histogram = Histogram(buckets=[1, 10])
+
+        for value in [0.5, 1, 5, 50]:
+            histogram.observe(value)
+
+        assert_that(histogram.counts, is_([2, 1, 1]))
+        assert_that(histogram.count, is_(4))
+        assert_that(histogram.sum, is_(56.5))
+        assert_that(histogram.min, is_(0.5))
+        assert_that(histogram.max, is_(50))
+
+    def test_mean_is_zero_without_values(self):
+        assert_that(Histogram().mean, is_(0.0))
+
+
+class TestMetricsRegistry:
+    def test_counters_are_incremented(self):
+        registry = MetricsRegistry()
+
+        registry.increment("waits_total")
+        registry.increment("waits_total", 2)
+
+        assert_that(registry.counters, is_({"waits_total": 3.0}))
+
+    def test_histograms_use_buckets_for_their_name(self):
+        registry = MetricsRegistry()
+
+        registry.observe("grab_seconds", 0.02)
+        registry.observe("wait_attempts", 3)
+
+        assert_that(registry.histograms["grab_seconds"].counts[3], is_(1))
+        assert_that(registry.histograms["wait_attempts"].counts[2], is_(1))
+
+    def test_prometheus_text_format(self):
+        registry = MetricsRegistry()
+        registry.increment("waits_total")
+        registry.observe("match_score", 0.005)
+
+        text = registry.to_prometheus()
+
+        assert_that(text, contains_string("# TYPE clickshot_waits_total counter\n"))
+        assert_that(text, contains_string("clickshot_waits_total 1\n"))
+        assert_that(text, contains_string('clickshot_match_score_bucket{le="0.001"} 0'))
+        assert_that(text, contains_string('clickshot_match_score_bucket{le="0.01"} 1'))
+        assert_that(text, contains_string('clickshot_match_score_bucket{le="+Inf"} 1'))
+        assert_that(text, contains_string("clickshot_match_score_count 1\n"))
+
+
+class TestPrometheusFileSink:
+    # Sinks would otherwise write their files again when the tests exit
+    @pytest.fixture(autouse=True)
+    def atexit(self, mocker):
+        return mocker.patch("clickshot.metrics.atexit")
+
+    def test_file_is_written_on_first_measurement(self, tmp_path):
+        sink = PrometheusFileSink(tmp_path / "clickshot.prom")
+
+        sink.increment("waits_total")
+
+        text = (tmp_path / "clickshot.prom").read_text()
+        assert_that(text, contains_string("clickshot_waits_total 1\n"))
+
+    def test_file_is_only_rewritten_after_interval(self, tmp_path):
+        sink = PrometheusFileSink(tmp_path / "clickshot.prom", min_interval_seconds=60)
+
+        sink.increment("waits_total")
+        sink.increment("waits_total")
+
+        text = (tmp_path / "clickshot.prom").read_text()
+        assert_that(text, contains_string("clickshot_waits_total 1\n"))
+
+        sink.flush()
+
+        text = (tmp_path / "clickshot.prom").read_text()
+        assert_that(text, contains_string("clickshot_waits_total 2\n"))
+
+    def test_file_is_written_at_exit(self, atexit, tmp_path):
+        sink = PrometheusFileSink(tmp_path / "clickshot.prom", min_interval_seconds=60)
+        sink.increment("waits_total")
+        sink.increment("waits_total")
+
+        atexit.register.assert_called_once_with(sink.flush)
+        atexit.register.call_args[0][0]()
+
+        text = (tmp_path / "clickshot.prom").read_text()
+        assert_that(text, contains_string("clickshot_waits_total 2\n"))
+
+    def test_closed_sink_is_not_written_at_exit(self, atexit, tmp_path):
+        sink = PrometheusFileSink(tmp_path / "clickshot.prom")
+
+        sink.close()
+
+        atexit.unregister.assert_called_once_with(sink.flush)
+        assert_that((tmp_path / "clickshot.prom").exists(), is_(True))
+
+    def test_file_is_written_once_by_concurrent_measurements(self, mocker, tmp_path):
+        sink = PrometheusFileSink(tmp_path / "clickshot.prom", min_interval_seconds=60)
+        threads = [
+            threading.Thread(target=sink.increment, args=("waits_total",))
+            for _ in range(8)
+        ]
+        monotonic = time.monotonic
+
+        def slow_monotonic():
+            time.sleep(0.01)
+            return monotonic()
+
+        mocker.patch("clickshot.metrics.time.monotonic", side_effect=slow_monotonic)
+        replace = mocker.patch("clickshot.metrics.os.replace", side_effect=os.replace)
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert_that(replace.call_count, is_(1))
+        assert_that(list(tmp_path.iterdir()), is_([tmp_path / "clickshot.prom"]))
+
+    def test_write_errors_are_warnings(self, tmp_path):
+        sink = PrometheusFileSink(tmp_path / "missing" / "clickshot.prom")
+
+        with pytest.warns(UserWarning, match="Couldn't write metrics"):
+            sink.increment("waits_total")
+
+        assert_that(sink.counters, has_entries(waits_total=1.0))
+
+
+class TestMetrics:
+    def test_measurements_are_sent_to_every_sink(self, mocker):
+        callback = mocker.Mock()
+        registry = MetricsRegistry()
+        metrics = Metrics()
+        metrics.add_sink(CallbackSink(callback))
+        metrics.add_sink(registry)
+
+        metrics.increment("waits_total")
+        metrics.observe("match_score", 0.5)
+
+        callback.assert_has_calls(
+            [
+                mocker.call("counter", "waits_total", 1.0),
+                mocker.call("histogram", "match_score", 0.5),
+            ]
+        )
+        assert_that(registry.counters, has_entries(waits_total=1.0))
+
+    def test_removed_sinks_are_not_used(self, mocker):
+        callback = mocker.Mock()
+        sink = CallbackSink(callback)
+        metrics = Metrics()
+        metrics.add_sink(sink)
+
+        metrics.remove_sink(sink)
+        metrics.increment("waits_total")
+
+        callback.assert_not_called()
+        assert_that(metrics.enabled, is_(False))
+
+    def test_timer_records_duration(self, mocker):
+        mocker.patch("clickshot.metrics.time.perf_counter", side_effect=[1.0, 1.25])
+        registry = MetricsRegistry()
+        metrics = Metrics()
+        metrics.add_sink(registry)
+
+        with metrics.timer("grab_seconds"):
+            pass
+
+        assert_that(registry.histograms["grab_seconds"].sum, is_(0.25))
+
+    def test_timer_records_duration_if_block_raises(self):
+        registry = MetricsRegistry()
+        metrics = Metrics()
+        metrics.add_sink(registry)
+
+        with pytest.raises(ValueError):
+            with metrics.timer("grab_seconds"):
+                raise ValueError
+
+        assert_that(registry.histograms["grab_seconds"].count, is_(1))
+
+    def test_timer_does_nothing_without_sinks(self, mocker):
+        perf_counter = mocker.patch("clickshot.metrics.time.perf_counter")
+
+        with Metrics().timer("grab_seconds"):
+            pass
+
+        perf_counter.assert_not_called()
@@ -0,0 +1,50 @@
+from hamcrest import assert_that, is_
+import pytest
+
+from clickshot import Mouse, Keyboard
+from clickshot.snapshot import FrameSnapshot
+
+
+@pytest.fixture
+def snapshot(mocker):
+    snapshot = mocker.Mock(spec=FrameSnapshot)
+    mocker.patch("clickshot.mouse.frame_snapshot", snapshot)
+    mocker.patch("clickshot.keyboard.frame_snapshot", snapshot)
+    return snapshot
+
+
+class TestMouse:
+    @pytest.mark.parametrize(
+        "action", [lambda m: m.press("b"), lambda m: m.release("b")],
+    )
+    def test_button_actions_invalidate_snapshot(self, snapshot, action):
+        action(Mouse())
+
+        snapshot.invalidate.assert_called_once()
+
+    def test_scrolling_invalidates_snapshot(self, snapshot):
+        Mouse().scroll(0, 1)
+
+        snapshot.invalidate.assert_called_once()
+
+    def test_moving_invalidates_snapshot(self, snapshot):
+        mouse = Mouse()
+        mouse.position = (1, 2)
+
+        assert_that(mouse.position, is_((1, 2)))
+        snapshot.invalidate.assert_called_once()
+
+    def test_reading_position_doesnt_invalidate_snapshot(self, snapshot):
+        Mouse().position
+
+        snapshot.invalidate.assert_not_called()
+
+
+class TestKeyboard:
+    @pytest.mark.parametrize(
+        "action", [lambda k: k.press("a"), lambda k: k.release("a")],
+    )
+    def test_key_actions_invalidate_snapshot(self, snapshot, action):
+        action(Keyboard())
+
+        snapshot.invalidate.assert_called_once()
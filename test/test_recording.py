@@ -0,0 +1,242 @@
+import threading
+
+import cv2
+from hamcrest import assert_that, is_, is_not
+from mss.screenshot import ScreenShot
+import numpy
+import pytest
+
+from clickshot import backend, Config, ElementNotFoundError, Rect, recording
+from clickshot.locater import Locater
+from clickshot.recording import Recording, RecordingScreen, ReplayScreen
+from clickshot.screen_grabber import ScreenGrabber
+from clickshot.template_cache import TemplateCache
+
+
+# Stands in for mss, showing whichever frame is current
+class FakeScreen:
+    def __init__(self, frames):
+        self.frames = frames
+        self.current = 0
+        height, width = frames[0].shape[:2]
+        self.monitors = [{"left": 0, "top": 0, "width": width, "height": height}]
+        self.closed = False
+
+    def grab(self, monitor):
+        bgra = cv2.cvtColor(self.frames[self.current], cv2.COLOR_BGR2BGRA)
+        return ScreenShot(bgra.tobytes(), monitor)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def frames():
+    random = numpy.random.RandomState(0)
+    return [random.randint(0, 256, (60, 80, 3)).astype(numpy.uint8) for _ in range(3)]
+
+
+@pytest.fixture
+def screen(frames):
+    return FakeScreen(frames)
+
+
+def to_bgr(pixels):
+    bgra = numpy.frombuffer(pixels.raw, numpy.uint8).reshape(
+        pixels.height, pixels.width, 4
+    )
+    return cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR)
+
+
+def record(screen, path, video=False):
+    frames = Recording(path, video)
+    recorder = RecordingScreen(screen, frames)
+    for current in [0, 0, 1, 2]:
+        screen.current = current
+        recorder.grab(screen.monitors[0])
+    recorder.close()
+    frames.close()
+    return frames
+
+
+class TestRecording:
+    def test_unchanged_frames_are_only_recorded_once(self, tmp_path, screen):
+        frames = record(screen, tmp_path)
+
+        assert_that(frames.frames, is_(3))
+        assert_that(len(list(tmp_path.glob("*.png"))), is_(3))
+
+    def test_frames_are_dropped_while_writer_is_behind(
+        self, mocker, tmp_path, frames
+    ):
+        writing = threading.Event()
+        finish = threading.Event()
+
+        def write(timestamp, frame):
+            writing.set()
+            finish.wait()
+
+        frames_recording = Recording(tmp_path, max_queued_frames=1)
+        mocker.patch.object(frames_recording, "_write", side_effect=write)
+        bgra = [cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA) for frame in frames]
+
+        frames_recording.add(bgra[0])
+        writing.wait()
+        frames_recording.add(bgra[1])
+        frames_recording.add(bgra[2])
+        frames_recording.add(bgra[2])
+        finish.set()
+        frames_recording.close()
+
+        assert_that(frames_recording.dropped, is_(2))
+        assert_that(frames_recording._write.call_count, is_(2))
+
+
+class TestRecordingScreen:
+    def test_grabs_are_passed_through(self, tmp_path, screen, frames):
+        recorder = RecordingScreen(screen, Recording(tmp_path))
+
+        pixels = recorder.grab({"left": 10, "top": 20, "width": 30, "height": 15})
+        recorder.close()
+        recorder.recording.close()
+
+        assert_that((pixels.width, pixels.height), is_((30, 15)))
+        numpy.testing.assert_array_equal(to_bgr(pixels), frames[0][20:35, 10:40])
+
+    def test_close_closes_screen_but_not_recording(self, tmp_path, screen):
+        recorder = RecordingScreen(screen, Recording(tmp_path))
+
+        recorder.close()
+
+        assert_that(screen.closed, is_(True))
+        assert_that(recorder.recording._thread, is_not(None))
+        recorder.recording.close()
+
+
+class TestReplayScreen:
+    @pytest.mark.parametrize("video", [False, True])
+    def test_frames_are_replayed_exactly(self, tmp_path, screen, frames, video):
+        record(screen, tmp_path, video)
+        replay = ReplayScreen(tmp_path, realtime=False)
+
+        replayed = [to_bgr(replay.grab(screen.monitors[0])) for _ in range(4)]
+        replay.close()
+
+        assert_that(replay.monitors, is_(screen.monitors))
+        for replayed_frame, frame in zip(replayed, frames + frames[-1:]):
+            numpy.testing.assert_array_equal(replayed_frame, frame)
+
+    def test_video_can_go_back(self, tmp_path, screen, frames):
+        record(screen, tmp_path, video=True)
+        replay = ReplayScreen(tmp_path, realtime=False)
+        for _ in range(3):
+            replay.grab(screen.monitors[0])
+
+        replay.grabs = 0
+        pixels = replay.grab(screen.monitors[0])
+        replay.close()
+
+        numpy.testing.assert_array_equal(to_bgr(pixels), frames[0])
+
+    def test_frames_are_replayed_at_recorded_times(self, mocker, tmp_path, screen):
+        monotonic = mocker.patch("clickshot.recording.time").monotonic
+        monotonic.side_effect = [0, 1, 2, 3, 4]
+        record(screen, tmp_path)
+        times = [entry["time"] for entry in ReplayScreen(tmp_path)._frames]
+        assert_that(times, is_([1, 3, 4]))
+
+        replay = ReplayScreen(tmp_path)
+        monotonic.side_effect = [10, 10.5, 13.5, 20]
+        grabbed = [replay._next_index() for _ in range(4)]
+
+        assert_that(grabbed, is_([0, 0, 1, 2]))
+
+    def test_monitor_is_cropped_at_native_resolution(self, tmp_path, screen, frames):
+        record(screen, tmp_path)
+        replay = ReplayScreen(tmp_path, realtime=False)
+        replay._monitors = [{"left": 0, "top": 0, "width": 40, "height": 30}]
+
+        pixels = replay.grab({"left": 5, "top": 10, "width": 10, "height": 5})
+
+        assert_that((pixels.width, pixels.height), is_((20, 10)))
+        numpy.testing.assert_array_equal(to_bgr(pixels), frames[0][20:30, 10:30])
+
+    def test_monitor_outside_recording_is_rejected(self, tmp_path, screen):
+        record(screen, tmp_path)
+        replay = ReplayScreen(tmp_path)
+
+        with pytest.raises(ValueError):
+            replay.grab({"left": 70, "top": 0, "width": 20, "height": 10})
+
+    def test_recording_without_frames_is_rejected(self, tmp_path, screen):
+        RecordingScreen(screen, Recording(tmp_path)).recording.close()
+
+        with pytest.raises(ValueError):
+            ReplayScreen(tmp_path)
+
+
+class TestReplay:
+    def test_elements_are_located_in_replayed_frames(self, tmp_path, screen, frames):
+        record(screen, tmp_path / "recording")
+        template_path = tmp_path / "template.png"
+        cv2.imwrite(str(template_path), frames[1][30:45, 40:60])
+
+        recording.replay(tmp_path / "recording", realtime=False)
+        locater = Locater(
+            Config(skip_unchanged_frames=False), templates=TemplateCache()
+        )
+
+        with pytest.raises(ElementNotFoundError):
+            locater.locate(template_path, None)
+        rect = locater.locate(template_path, None)
+        locater.close()
+
+        assert_that(rect, is_(Rect(left=40, top=30, width=20, height=15)))
+
+    def test_record_wraps_display(self, mocker, tmp_path, screen, frames):
+        mocker.patch("clickshot.backend.mss.mss", return_value=screen)
+
+        recording.record(tmp_path)
+        grabber = ScreenGrabber()
+        image = grabber.grab(Rect(left=10, top=20, width=30, height=15))
+        grabber.close()
+        recording.stop()
+
+        numpy.testing.assert_array_equal(image.data, frames[0][20:35, 10:40])
+        assert_that(len(list(tmp_path.glob("*.png"))), is_(1))
+
+    def test_screens_opened_again_continue_recording(
+        self, mocker, tmp_path, screen, frames
+    ):
+        mocker.patch("clickshot.backend.mss.mss", return_value=screen)
+        recording.record(tmp_path, display=":0")
+        shared = backend.acquire(":0")
+
+        shared.grab(screen.monitors[0])
+        shared.close_screen()
+        screen.current = 1
+        shared.grab(screen.monitors[0])
+        recording.stop()
+
+        replay = ReplayScreen(tmp_path, realtime=False)
+        for frame in frames[:2]:
+            numpy.testing.assert_array_equal(
+                to_bgr(replay.grab(screen.monitors[0])), frame
+            )
+
+    def test_other_displays_are_not_recorded(self, mocker, tmp_path, screen):
+        mocker.patch("clickshot.backend.mss.mss", return_value=screen)
+        recording.record(tmp_path, display=":0")
+
+        backend.acquire(":1").grab(screen.monitors[0])
+        recording.stop()
+
+        assert_that(list(tmp_path.glob("*.png")), is_([]))
+
+    def test_stop_goes_back_to_display(self, tmp_path, screen):
+        record(screen, tmp_path)
+        recording.replay(tmp_path)
+
+        recording.stop()
+
+        assert_that(backend._screen_factory, is_(None))
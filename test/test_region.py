@@ -1,8 +1,9 @@
 import pytest
-from hamcrest import assert_that, is_
+import sys
+from hamcrest import assert_that, has_item, is_, is_not, contains_string
 from pathlib import Path
 
-from clickshot import Config, Rect, Region, ElementConfig
+from clickshot import Config, ElementNotFoundError, Rect, Region, ElementConfig
 
 
 @pytest.fixture
@@ -10,9 +11,8 @@ def default_config():
     return Config("img", "scr")
 
 
-def mock_stack(mocker, path):
-    stack_item = mocker.Mock(filename=str(path / "somefile.py"))
-    return ["", stack_item]
+def mock_calling_dir(mocker, path):
+    mocker.patch("clickshot.region._get_calling_dir").return_value = path
 
 
 class TestRegion:
@@ -47,6 +47,16 @@ class TestRegion:
 
         assert_that(region.test.name, is_("test"))
 
+    def test_close_button_can_be_an_element(self, default_config):
+        region = Region("dialog", default_config)
+
+        assert_that(region.close.name, is_("close"))
+
+    def test_count_can_be_an_element(self, default_config):
+        region = Region("dialog", default_config)
+
+        assert_that(region.count.name, is_("count"))
+
     def test_the_default_config_paths_are_subdirectories_of_the_caller(self):
         region = Region("area", Config())
         this_dir = Path(__file__).parent
@@ -57,9 +67,7 @@ class TestRegion:
     def test_system_image_dir_is_used(self, mocker, tmp_path):
         (tmp_path / "images" / "Darwin").mkdir(parents=True)
         mocker.patch("clickshot.region.platform.system").return_value = "Darwin"
-        mocker.patch("clickshot.region.inspect.stack").return_value = mock_stack(
-            mocker, tmp_path
-        )
+        mock_calling_dir(mocker, tmp_path)
 
         region = Region("area", Config())
 
@@ -70,9 +78,7 @@ class TestRegion:
         (tmp_path / "images" / "Darwin-19.4.0").mkdir(parents=True)
         mocker.patch("clickshot.region.platform.system").return_value = "Darwin"
         mocker.patch("clickshot.region.platform.release").return_value = "19.4.0"
-        mocker.patch("clickshot.region.inspect.stack").return_value = mock_stack(
-            mocker, tmp_path
-        )
+        mock_calling_dir(mocker, tmp_path)
 
         region = Region("area", Config())
 
@@ -87,12 +93,191 @@ class TestRegion:
         mocker.patch("clickshot.region.platform.system").return_value = "Darwin"
         mocker.patch("clickshot.region.platform.release").return_value = "19.4.0"
         mocker.patch("clickshot.region.platform.mac_ver").return_value = ("10.15.4",)
-        mocker.patch("clickshot.region.inspect.stack").return_value = mock_stack(
-            mocker, tmp_path
-        )
+        mock_calling_dir(mocker, tmp_path)
 
         region = Region("area", Config())
 
         assert_that(
             region._config.image_dir, is_(str(tmp_path / "images" / "Darwin-10.15.4"))
         )
+
+    def test_image_dir_is_only_probed_once(self, mocker, tmp_path):
+        (tmp_path / "images" / "Linux").mkdir(parents=True)
+        mocker.patch("clickshot.region.platform.system").return_value = "Linux"
+        mock_calling_dir(mocker, tmp_path)
+        exists = mocker.spy(Path, "exists")
+
+        first = Region("area1", Config())
+        second = Region("area2", Config())
+
+        assert_that(second._config.image_dir, is_(first._config.image_dir))
+        assert_that(exists.call_count, is_(2))
+
+    def test_calling_dir_is_found_once(self, mocker):
+        _getframe = mocker.spy(sys, "_getframe")
+
+        Region("area", Config())
+
+        _getframe.assert_called_once_with(1)
+
+    def test_calling_dir_is_not_found_if_dirs_are_configured(self, mocker):
+        _getframe = mocker.spy(sys, "_getframe")
+
+        Region("area", Config("img", "scr"))
+
+        _getframe.assert_not_called()
+
+
+class TestLocateAll:
+    @pytest.fixture
+    def region(self, default_config):
+        return Region("area", default_config, boundary=Rect(0, 0, 100, 100))
+
+    def test_all_elements_are_located_in_one_grab(self, mocker, region):
+        Locater = mocker.patch("clickshot.region.Locater")
+        Locater().locate_all.return_value = {
+            region.ok.image_path: Rect(1, 2, 3, 4),
+            region.cancel.image_path: Rect(5, 6, 7, 8),
+        }
+
+        result = region.locate_all(["ok", "cancel"])
+
+        assert_that(result, is_({"ok": Rect(1, 2, 3, 4), "cancel": Rect(5, 6, 7, 8)}))
+        Locater().locate_all.assert_called_once_with(
+            mocker.ANY, Rect(0, 0, 100, 100)
+        )
+        assert_that(
+            list(Locater().locate_all.call_args[0][0]),
+            is_([region.ok.image_path, region.cancel.image_path]),
+        )
+
+    def test_missing_elements_are_left_out(self, mocker, region):
+        Locater = mocker.patch("clickshot.region.Locater")
+        Locater().locate_all.return_value = {region.ok.image_path: Rect(1, 2, 3, 4)}
+
+        result = region.locate_all(["ok", "cancel"])
+
+        assert_that(result, is_({"ok": Rect(1, 2, 3, 4)}))
+
+    def test_only_missing_elements_are_retried(self, mocker, region):
+        mocker.patch("clickshot.retry.time").monotonic.side_effect = [0, 1, 2, 3]
+        Locater = mocker.patch("clickshot.region.Locater")
+        Locater().locate_all.side_effect = [
+            {region.ok.image_path: Rect(1, 2, 3, 4)},
+            {region.cancel.image_path: Rect(5, 6, 7, 8)},
+        ]
+
+        result = region.locate_all(["ok", "cancel"], timeout_seconds=10)
+
+        assert_that(result, is_({"ok": Rect(1, 2, 3, 4), "cancel": Rect(5, 6, 7, 8)}))
+        assert_that(
+            list(Locater().locate_all.call_args[0][0]),
+            is_([region.cancel.image_path]),
+        )
+
+    def test_mouse_is_moved_away_from_failsafe(self, mocker, region):
+        Mouse = mocker.patch("clickshot.mouse.Mouse")
+        position_mock = mocker.PropertyMock(return_value=(0, 0))
+        type(Mouse()).position = position_mock
+        Locater = mocker.patch("clickshot.region.Locater")
+        Locater().locate_all.return_value = {region.ok.image_path: Rect(1, 2, 3, 4)}
+
+        region.locate_all(["ok"])
+
+        assert_that(position_mock.mock_calls, has_item(mocker.call((10, 10))))
+
+    def test_failsafe_aborts_attempts(self, mocker, region):
+        mocker.patch("clickshot.retry.time").monotonic.return_value = 0
+        Mouse = mocker.patch("clickshot.mouse.Mouse")
+        type(Mouse()).position = mocker.PropertyMock(return_value=(0, 0))
+        Locater = mocker.patch("clickshot.region.Locater")
+        Locater().locate_all.return_value = {}
+
+        with pytest.warns(UserWarning, match="Aborted"):
+            result = region.locate_all(["ok"], timeout_seconds=10)
+
+        assert_that(result, is_({}))
+        Locater().locate_all.assert_called_once()
+
+
+class TestCountVisible:
+    def test_every_location_is_counted(self, mocker, default_config):
+        Locater = mocker.patch("clickshot.element.Locater")
+        Locater().locate_occurrences.return_value = [Rect(1, 2, 3, 4), Rect(5, 6, 7, 8)]
+        region = Region("area", default_config)
+
+        assert_that(region.count_visible("icon"), is_(2))
+
+    def test_missing_element_counts_zero(self, mocker, default_config):
+        Locater = mocker.patch("clickshot.element.Locater")
+        Locater().locate_occurrences.return_value = []
+        region = Region("area", default_config)
+
+        assert_that(region.count_visible("icon"), is_(0))
+
+    def test_count_element_can_be_counted(self, mocker, default_config):
+        Locater = mocker.patch("clickshot.element.Locater")
+        Locater().locate_occurrences.return_value = [Rect(1, 2, 3, 4)]
+        region = Region("area", default_config)
+
+        assert_that(region.count_visible("count"), is_(1))
+        assert_that(region.count.name, is_("count"))
+
+
+class TestWaitAll:
+    @pytest.fixture
+    def region(self, default_config):
+        return Region("area", default_config)
+
+    def test_returns_if_all_elements_found(self, mocker, region):
+        Locater = mocker.patch("clickshot.region.Locater")
+        Locater().locate_all.return_value = {
+            region.ok.image_path: Rect(1, 2, 3, 4),
+            region.cancel.image_path: Rect(5, 6, 7, 8),
+        }
+
+        result = region.wait_all(["ok", "cancel"])
+
+        assert_that(result, is_({"ok": Rect(1, 2, 3, 4), "cancel": Rect(5, 6, 7, 8)}))
+
+    def test_default_timeout_is_used(self, mocker, region):
+        mocker.patch("clickshot.region.Locater")
+        retry_with_timeout = mocker.patch("clickshot.region.retry_with_timeout")
+
+        region.wait_all(["ok"])
+
+        retry_with_timeout.assert_called_with(
+            mocker.ANY, 30, log=True, policy=mocker.ANY
+        )
+
+    def test_missing_elements_are_reported(self, mocker, region, capsys):
+        mocker.patch("clickshot.retry.time").monotonic.side_effect = [0, 1, 2]
+        Locater = mocker.patch("clickshot.region.Locater")
+        Locater().locate_all.return_value = {region.ok.image_path: Rect(1, 2, 3, 4)}
+        artifact_writer = mocker.patch("clickshot.region.artifact_writer")
+        artifact_writer.save.return_value = "scr/area.png"
+
+        with pytest.raises(ElementNotFoundError, match="Not found: cancel"):
+            region.wait_all(["ok", "cancel"], timeout_seconds=1)
+
+        artifact_writer.save.assert_called_with(
+            Locater().last_screenshot, Path("scr/area.png"), 1
+        )
+        stdout = capsys.readouterr().out
+        assert_that(stdout, contains_string("Expected Image: img/area-cancel.png\n"))
+        assert_that(stdout, is_not(contains_string("area-ok.png")))
+        assert_that(stdout, contains_string("Screenshot: scr/area.png\n"))
+
+    def test_failsafe_aborts_wait(self, mocker, region):
+        mocker.patch("clickshot.retry.time").monotonic.return_value = 0
+        Mouse = mocker.patch("clickshot.mouse.Mouse")
+        type(Mouse()).position = mocker.PropertyMock(return_value=(0, 0))
+        Locater = mocker.patch("clickshot.region.Locater")
+        Locater().locate_all.return_value = {}
+        mocker.patch("clickshot.region.artifact_writer")
+
+        with pytest.raises(ElementNotFoundError, match="Not found: ok"):
+            with pytest.warns(UserWarning, match="Aborted"):
+                region.wait_all(["ok"], timeout_seconds=10)
+
+        Locater().locate_all.assert_called_once()
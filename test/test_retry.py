@@ -1,7 +1,16 @@
-from hamcrest import assert_that, is_
+import asyncio
+from hamcrest import assert_that, is_, is_not
 import pytest
+import threading
 
-from clickshot.retry import retry_with_timeout, RetryAbort
+from clickshot import retry
+from clickshot.retry import (
+    retry_with_timeout,
+    retry_with_timeout_async,
+    PollPolicy,
+    RetryAbort,
+    RetryStats,
+)
 
 
 class NormalTestError(Exception):
@@ -13,22 +22,32 @@ class AbortedTestError(Exception):
 
 
 class Timer:
-    def __init__(self):
+    def __init__(self, step=0.1):
         self.time = 0
+        self.step = step
 
     def increment(self):
-        self.time += 0.1
+        self.time += self.step
         return self.time
 
+    def sleep(self, seconds):
+        self.time += seconds
+
 
 @pytest.fixture
 def time_mock(mocker):
     timer = Timer()
     mock = mocker.patch("clickshot.retry.time")
     mock.monotonic.side_effect = timer.increment
+    mock.sleep.side_effect = timer.sleep
     return timer
 
 
+@pytest.fixture
+def sleep(time_mock):
+    return retry.time.sleep
+
+
 class TestRetry:
     def test_returns_if_no_exception(self, mocker):
         method = mocker.Mock(return_value=42)
@@ -113,3 +132,165 @@ class TestRetry:
         retry_with_timeout(method, 30)
 
         assert_that(capsys.readouterr().out, is_(""))
+
+
+def fail_until(time_mock, seconds):
+    def side_effect():
+        if time_mock.time < seconds:
+            raise NormalTestError
+        return 42
+
+    return side_effect
+
+
+class TestPollPolicy:
+    def test_slow_attempts_do_not_sleep_by_default(self, mocker, sleep, time_mock):
+        method = mocker.Mock(side_effect=fail_until(time_mock, 1))
+
+        retry_with_timeout(method, 30)
+
+        sleep.assert_not_called()
+
+    def test_quick_attempts_are_spaced_out_by_default(self, mocker, sleep, time_mock):
+        time_mock.step = 0.01
+        method = mocker.Mock(side_effect=fail_until(time_mock, 0.2))
+
+        retry_with_timeout(method, 30)
+
+        # Each attempt took 0.01s of the 0.05s tick
+        assert_that(sleep.call_args_list, is_([mocker.call(pytest.approx(0.04))] * 3))
+
+    def test_can_poll_without_sleeping(self, mocker, sleep, time_mock):
+        time_mock.step = 0.01
+        method = mocker.Mock(side_effect=fail_until(time_mock, 0.2))
+
+        retry_with_timeout(method, 30, policy=PollPolicy(min_tick_seconds=0))
+
+        sleep.assert_not_called()
+
+    def test_sleeps_for_fixed_interval(self, mocker, sleep, time_mock):
+        method = mocker.Mock(side_effect=fail_until(time_mock, 1))
+
+        retry_with_timeout(method, 30, policy=PollPolicy(interval_seconds=0.5))
+
+        assert_that(sleep.call_args_list, is_([mocker.call(0.5)] * 2))
+
+    def test_interval_backs_off_up_to_maximum(self, mocker, sleep, time_mock):
+        method = mocker.Mock(side_effect=fail_until(time_mock, 2))
+        policy = PollPolicy(interval_seconds=0.25, backoff=2, max_interval_seconds=1)
+
+        retry_with_timeout(method, 30, policy=policy)
+
+        assert_that(
+            sleep.call_args_list,
+            is_([mocker.call(0.25), mocker.call(0.5), mocker.call(1)]),
+        )
+
+    def test_sleeps_until_minimum_tick(self, mocker, sleep, time_mock):
+        method = mocker.Mock(side_effect=fail_until(time_mock, 1))
+
+        retry_with_timeout(method, 30, policy=PollPolicy(min_tick_seconds=0.5))
+
+        # The attempt itself took 0.1s of the tick
+        assert_that(sleep.call_args_list, is_([mocker.call(pytest.approx(0.4))] * 2))
+
+    def test_does_not_sleep_past_timeout(self, mocker, sleep, time_mock):
+        method = mocker.Mock(side_effect=NormalTestError)
+
+        with pytest.raises(NormalTestError):
+            retry_with_timeout(method, 2, policy=PollPolicy(interval_seconds=5))
+
+        assert_that(sleep.call_args_list, is_([mocker.call(pytest.approx(1.8))]))
+        assert_that(method.call_count, is_(2))
+
+    def test_sub_second_timeout(self, mocker, time_mock):
+        method = mocker.Mock(side_effect=NormalTestError)
+
+        with pytest.raises(NormalTestError):
+            retry_with_timeout(method, 0.25, policy=PollPolicy(min_tick_seconds=0))
+
+        assert_that(method.call_count, is_(3))
+
+
+class TestRetryStats:
+    def test_attempts_and_sleeps_are_recorded(self, mocker, time_mock):
+        method = mocker.Mock(side_effect=fail_until(time_mock, 1))
+        stats = RetryStats()
+
+        retry_with_timeout(
+            method, 30, policy=PollPolicy(interval_seconds=0.5), stats=stats
+        )
+
+        assert_that(stats.attempts, is_(3))
+        assert_that(stats.failures, is_(2))
+        assert_that(stats.sleep_seconds, is_(1.0))
+        assert_that(stats.elapsed_seconds, is_(pytest.approx(1.5)))
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestRetryAsync:
+    def test_returns_if_no_exception(self, mocker):
+        method = mocker.Mock(return_value=42)
+
+        result = run(retry_with_timeout_async(method, 30))
+
+        assert_that(result, is_(42))
+
+    def test_method_runs_in_executor(self, mocker):
+        method = mocker.Mock(side_effect=threading.current_thread)
+
+        result = run(retry_with_timeout_async(method, 30))
+
+        assert_that(result, is_not(threading.current_thread()))
+
+    def test_raises_if_exception_after_timeout(self, mocker, time_mock):
+        method = mocker.Mock(side_effect=NormalTestError)
+
+        with pytest.raises(NormalTestError):
+            run(retry_with_timeout_async(method, 1))
+
+    def test_raises_if_abort_is_raised(self, mocker, time_mock):
+        method = mocker.Mock(side_effect=RetryAbort(AbortedTestError()))
+
+        with pytest.raises(AbortedTestError):
+            run(retry_with_timeout_async(method, 30))
+
+    def test_sleeps_asynchronously_between_attempts(self, mocker, time_mock):
+        async def fake_sleep(delay):
+            time_mock.sleep(delay)
+
+        sleep = mocker.patch("clickshot.retry.asyncio.sleep", side_effect=fake_sleep)
+        method = mocker.Mock(side_effect=fail_until(time_mock, 1))
+
+        run(
+            retry_with_timeout_async(
+                method, 30, policy=PollPolicy(interval_seconds=0.5)
+            )
+        )
+
+        assert_that(sleep.call_args_list, is_([mocker.call(0.5)] * 2))
+
+    def test_can_be_cancelled(self, mocker):
+        method = mocker.Mock(side_effect=NormalTestError)
+
+        async def cancel_wait():
+            task = asyncio.ensure_future(
+                retry_with_timeout_async(
+                    method, 30, policy=PollPolicy(interval_seconds=10)
+                )
+            )
+            await asyncio.sleep(0.1)
+            task.cancel()
+            await task
+
+        with pytest.raises(asyncio.CancelledError):
+            run(cancel_wait())
+
+        method.assert_called_once()
@@ -1,10 +1,12 @@
+import cv2
 from hamcrest import assert_that, is_
 import numpy
 import pytest
 
 from clickshot import Rect
 from clickshot.screen_grabber import ScreenGrabber
-from mss.screenshot import ScreenShot as PixelArray
+from clickshot.snapshot import frame_snapshot
+from mss.screenshot import ScreenShot as PixelArray, Size
 
 
 @pytest.fixture
@@ -27,7 +29,7 @@ def rgb_array():
 
 class TestGrab:
     def test_returns_rgb_image_from_mss(self, mocker, pixels, rgb_array):
-        mss = mocker.patch("clickshot.screen_grabber.mss")
+        mss = mocker.patch("clickshot.backend.mss.mss")
         mss().grab.return_value = pixels
         grabber = ScreenGrabber()
 
@@ -36,7 +38,7 @@ class TestGrab:
         numpy.testing.assert_array_equal(image.data, rgb_array)
 
     def test_passes_rect_parameter_to_mss(self, mocker, pixels):
-        mss = mocker.patch("clickshot.screen_grabber.mss")
+        mss = mocker.patch("clickshot.backend.mss.mss")
         mss().grab.return_value = pixels
 
         grabber = ScreenGrabber()
@@ -45,7 +47,7 @@ class TestGrab:
         mss().grab.assert_called_with({"left": 0, "top": 1, "width": 2, "height": 3})
 
     def test_defaults_to_all_monitors(self, mocker, pixels):
-        mss = mocker.patch("clickshot.screen_grabber.mss")
+        mss = mocker.patch("clickshot.backend.mss.mss")
         mss().grab.return_value = pixels
         mss().monitors = [{"left": 0, "top": 1, "width": 200, "height": 300}]
 
@@ -56,8 +58,19 @@ class TestGrab:
             {"left": 0, "top": 1, "width": 200, "height": 300}
         )
 
+    def test_returns_grayscale_image(self, mocker, pixels, rgb_array):
+        mss = mocker.patch("clickshot.backend.mss.mss")
+        mss().grab.return_value = pixels
+        grabber = ScreenGrabber(grayscale=True)
+
+        image = grabber.grab(Rect(left=0, top=1, width=2, height=3))
+
+        numpy.testing.assert_array_equal(
+            image.data, cv2.cvtColor(rgb_array, cv2.COLOR_BGR2GRAY)
+        )
+
     def test_resizes_from_hidpi_monitor(self, mocker, pixels, rgb_array):
-        mss = mocker.patch("clickshot.screen_grabber.mss")
+        mss = mocker.patch("clickshot.backend.mss.mss")
         mss().grab.return_value = pixels
 
         resized_image_data = numpy.array([[24]])
@@ -73,3 +86,138 @@ class TestGrab:
         numpy.testing.assert_array_equal(image.data, resized_image_data)
         numpy.testing.assert_array_equal(resize.call_args[0][0], rgb_array)
         assert_that(resize.call_args[0][1], is_((2, 1)))
+
+    def test_reuses_buffer_between_grabs(self, mocker, pixels, rgb_array):
+        mss = mocker.patch("clickshot.backend.mss.mss")
+        mss().grab.return_value = pixels
+        grabber = ScreenGrabber()
+
+        first = grabber.grab(Rect(left=0, top=1, width=2, height=3))
+        second = grabber.grab(Rect(left=0, top=1, width=2, height=3))
+
+        assert_that(numpy.shares_memory(first.data, second.data), is_(True))
+        numpy.testing.assert_array_equal(second.data, rgb_array)
+
+    def test_buffers_are_not_shared_between_grabbers(self, mocker, pixels):
+        mss = mocker.patch("clickshot.backend.mss.mss")
+        mss().grab.return_value = pixels
+
+        first = ScreenGrabber().grab(Rect(left=0, top=1, width=2, height=3))
+        second = ScreenGrabber().grab(Rect(left=0, top=1, width=2, height=3))
+
+        assert_that(numpy.shares_memory(first.data, second.data), is_(False))
+
+
+class TestSharedFrame:
+    @pytest.fixture(autouse=True)
+    def invalidate_snapshot(self):
+        frame_snapshot.invalidate()
+        yield
+        frame_snapshot.invalidate()
+
+    @pytest.fixture
+    def mss(self, mocker, pixels):
+        mss = mocker.patch("clickshot.backend.mss.mss")
+        mss().grab.return_value = pixels
+        mss().monitors = [{"left": 0, "top": 0, "width": 2, "height": 3}]
+        return mss
+
+    def test_grabs_whole_screen_once(self, mss, rgb_array):
+        grabber = ScreenGrabber(frame_ttl_seconds=10)
+
+        grabber.grab(Rect(left=0, top=1, width=2, height=2))
+        image = grabber.grab(Rect(left=1, top=0, width=1, height=2))
+
+        mss().grab.assert_called_once_with(
+            {"left": 0, "top": 0, "width": 2, "height": 3}
+        )
+        numpy.testing.assert_array_equal(image.data, rgb_array[0:2, 1:2])
+
+    def test_hidpi_frame_is_kept_at_native_size(self, mocker, mss):
+        random = numpy.random.RandomState(0)
+        native = random.randint(0, 256, (6, 4, 4)).astype(numpy.uint8)
+        mss().grab.return_value = PixelArray(
+            native.tobytes(), mss().monitors[0], Size(4, 6)
+        )
+        resize = mocker.spy(cv2, "resize")
+        grabber = ScreenGrabber(frame_ttl_seconds=10)
+
+        frame, _ = grabber.grab_frame()
+        image = grabber.grab(Rect(left=1, top=1, width=1, height=2))
+
+        assert_that(frame.data.shape, is_((6, 4, 3)))
+        assert_that(resize.call_args[0][0].shape, is_((4, 2, 3)))
+        logical = cv2.resize(cv2.cvtColor(native, cv2.COLOR_BGRA2BGR), (2, 3))
+        numpy.testing.assert_array_equal(image.data, logical[1:3, 1:2])
+
+    def test_frame_is_shared_between_grabbers(self, mss):
+        ScreenGrabber(frame_ttl_seconds=10).grab()
+        ScreenGrabber(frame_ttl_seconds=10).grab()
+
+        mss().grab.assert_called_once()
+
+    def test_frame_is_grabbed_again_when_expired(self, mocker, mss):
+        time = mocker.patch("clickshot.snapshot.time")
+        time.monotonic.side_effect = [0, 0, 5, 11, 11]
+        grabber = ScreenGrabber(frame_ttl_seconds=10)
+
+        grabber.grab()
+        grabber.grab()
+        assert_that(mss().grab.call_count, is_(1))
+
+        grabber.grab()
+        assert_that(mss().grab.call_count, is_(2))
+
+    def test_frame_is_grabbed_again_when_invalidated(self, mss):
+        grabber = ScreenGrabber(frame_ttl_seconds=10)
+
+        grabber.grab()
+        frame_snapshot.invalidate()
+        grabber.grab()
+
+        assert_that(mss().grab.call_count, is_(2))
+
+    def test_rect_outside_frame_is_grabbed_directly(self, mss):
+        grabber = ScreenGrabber(frame_ttl_seconds=10)
+
+        grabber.grab(Rect(left=1, top=1, width=2, height=2))
+
+        mss().grab.assert_called_with({"left": 1, "top": 1, "width": 2, "height": 2})
+
+    def test_shared_frame_is_converted_to_grayscale(self, mss, rgb_array):
+        ScreenGrabber(frame_ttl_seconds=10).grab()
+        image = ScreenGrabber(frame_ttl_seconds=10, grayscale=True).grab()
+
+        mss().grab.assert_called_once()
+        numpy.testing.assert_array_equal(
+            image.data, cv2.cvtColor(rgb_array, cv2.COLOR_BGR2GRAY)
+        )
+
+    def test_grayscale_crop_reuses_buffer(self, mss):
+        grabber = ScreenGrabber(frame_ttl_seconds=10, grayscale=True)
+
+        first = grabber.grab(Rect(left=0, top=1, width=2, height=2))
+        second = grabber.grab(Rect(left=0, top=0, width=2, height=2))
+
+        assert_that(numpy.shares_memory(first.data, second.data), is_(True))
+        assert_that(grabber.buffers.stats().allocations, is_(1))
+
+    def test_direct_grab_does_not_overwrite_shared_frame(self, mss, rgb_array):
+        shared = ScreenGrabber(frame_ttl_seconds=10).grab()
+        grabber = ScreenGrabber(frame_ttl_seconds=10)
+
+        mss().grab.return_value = PixelArray(
+            [255] * 4 * 2 * 2, {"left": 1, "top": 1, "width": 2, "height": 2}
+        )
+        grabber.grab(Rect(left=1, top=1, width=2, height=2))
+        grabber.grab(Rect(left=1, top=1, width=2, height=2))
+
+        numpy.testing.assert_array_equal(shared.data, rgb_array)
+
+    def test_frame_is_not_shared_by_default(self, mss):
+        grabber = ScreenGrabber()
+
+        grabber.grab()
+        grabber.grab()
+
+        assert_that(mss().grab.call_count, is_(2))
@@ -0,0 +1,77 @@
+from hamcrest import assert_that, is_
+import pytest
+import threading
+
+from clickshot.snapshot import FrameSnapshot
+
+
+@pytest.fixture
+def time(mocker):
+    time = mocker.patch("clickshot.snapshot.time")
+    time.monotonic.return_value = 0
+    return time
+
+
+class TestGet:
+    def test_frame_is_grabbed_on_first_use(self, mocker, time):
+        grab = mocker.Mock(return_value=("frame", {"left": 0}))
+
+        result = FrameSnapshot().get(1.0, grab)
+
+        assert_that(result, is_(("frame", {"left": 0})))
+        grab.assert_called_once()
+
+    def test_frame_is_reused_until_it_expires(self, mocker, time):
+        grab = mocker.Mock(side_effect=[("frame1", {}), ("frame2", {})])
+        snapshot = FrameSnapshot()
+
+        snapshot.get(1.0, grab)
+        time.monotonic.return_value = 1.0
+        assert_that(snapshot.get(1.0, grab), is_(("frame1", {})))
+
+        time.monotonic.return_value = 1.5
+        assert_that(snapshot.get(1.0, grab), is_(("frame2", {})))
+
+    def test_frame_is_grabbed_again_after_invalidation(self, mocker, time):
+        grab = mocker.Mock(side_effect=[("frame1", {}), ("frame2", {})])
+        snapshot = FrameSnapshot()
+
+        snapshot.get(1.0, grab)
+        snapshot.invalidate()
+
+        assert_that(snapshot.get(1.0, grab), is_(("frame2", {})))
+
+    def test_time_of_invalidation_is_recorded(self, time):
+        snapshot = FrameSnapshot()
+        time.monotonic.return_value = 5.0
+
+        snapshot.invalidate()
+
+        assert_that(snapshot.invalidated_at, is_(5.0))
+
+
+class TestConcurrentGet:
+    def test_callers_waiting_for_a_grab_share_it(self, mocker):
+        snapshot = FrameSnapshot()
+        grab_started = threading.Event()
+        release_grab = threading.Event()
+
+        def slow_grab():
+            grab_started.set()
+            release_grab.wait()
+            return ("frame", {})
+
+        grab = mocker.Mock(side_effect=slow_grab)
+        results = []
+        first = threading.Thread(target=lambda: results.append(snapshot.get(0, grab)))
+        first.start()
+        grab_started.wait()
+
+        second = threading.Thread(target=lambda: results.append(snapshot.get(0, grab)))
+        second.start()
+        release_grab.set()
+        first.join()
+        second.join()
+
+        assert_that(results, is_([("frame", {}), ("frame", {})]))
+        grab.assert_called_once()
@@ -0,0 +1,99 @@
+import os
+
+import cv2
+from hamcrest import assert_that, is_, is_not, same_instance
+import numpy
+import pytest
+
+from clickshot.template_cache import TemplateCache, CacheStats
+
+
+def write_image(path, value, size=(4, 5)):
+    data = numpy.full((size[0], size[1], 3), value, numpy.uint8)
+    cv2.imwrite(str(path), data)
+    return path
+
+
+class TestLoad:
+    def test_template_is_decoded(self, tmp_path):
+        path = write_image(tmp_path / "image.png", 7)
+
+        image = TemplateCache().load(path)
+
+        assert_that(image.data.shape, is_((4, 5, 3)))
+        assert_that(image.data[0, 0, 0], is_(7))
+
+    def test_template_is_only_decoded_once(self, tmp_path):
+        path = write_image(tmp_path / "image.png", 7)
+        cache = TemplateCache()
+
+        first = cache.load(path)
+        second = cache.load(path)
+
+        assert_that(second, is_(same_instance(first)))
+        assert_that(cache.stats(), is_(CacheStats(1, 1, 0, 60)))
+
+    def test_edited_template_is_decoded_again(self, tmp_path):
+        path = write_image(tmp_path / "image.png", 7)
+        cache = TemplateCache()
+        first = cache.load(path)
+
+        write_image(path, 9, size=(5, 5))
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        second = cache.load(path)
+
+        assert_that(second, is_not(same_instance(first)))
+        assert_that(second.data[0, 0, 0], is_(9))
+        assert_that(cache.stats(), is_(CacheStats(0, 2, 0, 75)))
+
+    def test_grayscale_template_is_converted_and_cached(self, tmp_path):
+        path = write_image(tmp_path / "image.png", 7)
+        cache = TemplateCache()
+
+        first = cache.load(path, grayscale=True)
+        second = cache.load(path, grayscale=True)
+
+        assert_that(first.data.shape, is_((4, 5)))
+        assert_that(second, is_(same_instance(first)))
+        numpy.testing.assert_array_equal(
+            first.data, cache.load(path).to_grayscale().data
+        )
+
+    def test_raises_error_if_template_doesnt_exist(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            TemplateCache().load(tmp_path / "missing.png")
+
+
+class TestEviction:
+    def test_least_recently_used_template_is_evicted(self, tmp_path):
+        path1 = write_image(tmp_path / "image1.png", 1)
+        path2 = write_image(tmp_path / "image2.png", 2)
+        path3 = write_image(tmp_path / "image3.png", 3)
+        cache = TemplateCache(max_bytes=120)
+
+        first = cache.load(path1)
+        cache.load(path2)
+        cache.load(path1)
+        cache.load(path3)
+
+        assert_that(cache.load(path1), is_(same_instance(first)))
+        assert_that(cache.stats(), is_(CacheStats(2, 3, 1, 120)))
+
+    def test_template_larger_than_budget_is_kept(self, tmp_path):
+        path = write_image(tmp_path / "image.png", 1)
+        cache = TemplateCache(max_bytes=10)
+
+        first = cache.load(path)
+
+        assert_that(cache.load(path), is_(same_instance(first)))
+
+    def test_clear_drops_all_templates(self, tmp_path):
+        path = write_image(tmp_path / "image.png", 1)
+        cache = TemplateCache()
+        first = cache.load(path)
+
+        cache.clear()
+
+        assert_that(cache.load(path), is_not(same_instance(first)))
+        assert_that(cache.stats().current_bytes, is_(60))